@@ -9,6 +9,12 @@ from flask_migrate import Migrate
 # Models and Database imports
 from .models import Base, User, Cloth, OutfitSuggestion, UserPreference
 from app.database import engine, SessionLocal, get_db_session, close_db_session, DATABASE_URL
+from app.services import services
+from app.metrics import metrics
+from app.pagination import NEXT_CURSOR_HEADER
+from app.json_provider import configure_json
+from app.compression import compress_response
+from app.commands import register_commands
 
 # Blueprint imports
 from app.routes.auth import auth_bp
@@ -18,7 +24,9 @@ from app.routes.chat import chat_bp
 from app.routes.upload import upload_bp
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=[NEXT_CURSOR_HEADER])
+configure_json(app)
+app.after_request(compress_response)
 
 UPLOAD_FOLDER_PATH = os.path.join(os.getcwd(), 'uploads')
 if not os.path.exists(UPLOAD_FOLDER_PATH):
@@ -41,6 +49,8 @@ app.register_blueprint(suggestion_bp)
 app.register_blueprint(chat_bp)
 app.register_blueprint(upload_bp)
 
+register_commands(app)
+
 # Database session management
 @app.teardown_request
 def teardown_db_session(exception):
@@ -58,11 +68,16 @@ def health_check():
         with session.connection() as connection:
             result = connection.execute(text("SELECT 1"))
             if result.scalar() == 1:
-                return jsonify({"status": "ok", "db_connection": "successful"}), 200
+                return jsonify({"status": "ok", "db_connection": "successful", "services": services.status()}), 200
             else:
-                return jsonify({"status": "error", "db_connection": "failed"}), 500
+                return jsonify({"status": "error", "db_connection": "failed", "services": services.status()}), 500
     except Exception as e:
-        return jsonify({"status": "error", "db_connection": f"failed: {str(e)}"}), 500
+        return jsonify({"status": "error", "db_connection": f"failed: {str(e)}", "services": services.status()}), 500
+
+# プロセス内の計測値（サービスのロード時間など）
+@app.route('/api/metrics')
+def get_metrics():
+    return jsonify(metrics.snapshot()), 200
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
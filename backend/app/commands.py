@@ -0,0 +1,173 @@
+import click
+from botocore.exceptions import ClientError
+from loguru import logger
+
+from sqlalchemy import select, text
+
+from app.database import SessionLocal, engine
+from app.images import DERIVATIVE_SIZES, derivative_key, generate_derivatives
+from app.ingest import (
+    INDEX_FAILED, INDEX_PENDING, INDEX_PROCESSING, download_original_to_tempfile, ingest_cloth_image, mark_derivatives_ready,
+)
+from app.models import Cloth, OutfitSuggestion
+from app.storage import get_s3_client, get_bucket
+
+images_cli = click.Group("images", help="画像関連のメンテナンスコマンド")
+
+
+def _exists(key: str) -> bool:
+    try:
+        get_s3_client().head_object(Bucket=get_bucket(), Key=key)
+        return True
+    except ClientError:
+        return False
+
+
+@images_cli.command("backfill")
+@click.option("--user-id", type=int, default=None, help="対象ユーザーを絞り込む")
+@click.option("--force", is_flag=True, help="既に派生画像がある場合も作り直す")
+@click.option("--batch-size", type=int, default=200, help="DBから一度に読み込む件数")
+def backfill_derivatives(user_id, force, batch_size):
+    """既存の服画像にサムネイル・中サイズのWebPを生成し、Cloth.has_derivatives を立てる。"""
+    session = SessionLocal()
+    created = skipped = failed = 0
+    try:
+        last_id = 0
+        while True:
+            query = session.query(Cloth.id, Cloth.image_url, Cloth.has_derivatives).filter(Cloth.id > last_id, Cloth.image_url.isnot(None))
+            if user_id is not None:
+                query = query.filter(Cloth.user_id == user_id)
+            rows = query.order_by(Cloth.id).limit(batch_size).all()
+            if not rows:
+                break
+            for cloth_id, image_key, has_derivatives in rows:
+                last_id = cloth_id
+                if not force and all(_exists(derivative_key(image_key, v)) for v in DERIVATIVE_SIZES):
+                    # 以前に生成した派生画像はフラグが立っていないので、ここで立てる
+                    if not has_derivatives:
+                        mark_derivatives_ready(session, cloth_id)
+                    skipped += 1
+                    continue
+                try:
+                    body = get_s3_client().get_object(Bucket=get_bucket(), Key=image_key)["Body"]
+                    generate_derivatives(image_key, body)
+                    mark_derivatives_ready(session, cloth_id)
+                    created += 1
+                except Exception as e:
+                    session.rollback()
+                    failed += 1
+                    logger.error(f"Failed to backfill derivatives for cloth {cloth_id} ({image_key}): {e}")
+    finally:
+        session.close()
+    click.echo(f"created={created} skipped={skipped} failed={failed}")
+
+
+ingest_cli = click.Group("ingest", help="画像のベクトル登録ジョブのメンテナンスコマンド")
+
+
+@ingest_cli.command("retry")
+@click.option("--status", "statuses", multiple=True, default=(INDEX_PENDING, INDEX_PROCESSING),
+              type=click.Choice([INDEX_PENDING, INDEX_PROCESSING, INDEX_FAILED]), help="対象にする index_status（複数指定可）")
+@click.option("--user-id", type=int, default=None, help="対象ユーザーを絞り込む")
+@click.option("--mark-failed", is_flag=True, help="やり直さずに failed にする")
+@click.option("--batch-size", type=int, default=200, help="DBから一度に読み込む件数")
+def retry_ingest(statuses, user_id, mark_failed, batch_size):
+    """
+    ベクトル登録ジョブをやり直す。ジョブはワーカーのスレッドプールにしか無いため、再起動や異常終了で
+    pending/processing のまま残った服は、このコマンドで MinIO の元画像から登録し直すか failed にする。
+    処理中のジョブも対象になるので、ワーカーを止めている間（デプロイ直後など）に実行すること。
+    """
+    session = SessionLocal()
+    counts = {"indexed": 0, "failed": 0, "skipped": 0}
+    try:
+        last_id = 0
+        while True:
+            query = session.query(Cloth.id, Cloth.image_url).filter(Cloth.id > last_id, Cloth.index_status.in_(statuses))
+            if user_id is not None:
+                query = query.filter(Cloth.user_id == user_id)
+            rows = query.order_by(Cloth.id).limit(batch_size).all()
+            session.rollback()
+            if not rows:
+                break
+            for cloth_id, image_key in rows:
+                last_id = cloth_id
+                status = INDEX_FAILED if mark_failed or not image_key else None
+                if status is None:
+                    try:
+                        image_path = download_original_to_tempfile(image_key)
+                    except Exception as e:
+                        logger.error(f"Failed to download the original image of cloth {cloth_id} ({image_key}): {e}")
+                        status = INDEX_FAILED
+                    else:
+                        status = ingest_cloth_image(cloth_id, image_path)
+                if status is None:
+                    counts["skipped"] += 1
+                    continue
+                if status == INDEX_FAILED:
+                    # index_status の更新で WARDROBE のバージョンも上がる（after_flush のフック）
+                    cloth = session.get(Cloth, cloth_id)
+                    if cloth is not None and cloth.index_status != INDEX_FAILED:
+                        cloth.index_status = INDEX_FAILED
+                        session.commit()
+                counts[status] += 1
+    finally:
+        session.close()
+    click.echo(" ".join(f"{k}={v}" for k, v in counts.items()))
+
+
+db_check_cli = click.Group("indexes", help="インデックスの確認コマンド")
+
+# よく使うクエリと、それぞれが使うべきインデックス
+HOT_QUERIES = {
+    "clothes_by_category": (
+        "ix_clothes_user_id_category",
+        lambda user_id: select(Cloth.id).where(Cloth.user_id == user_id, Cloth.category == "トップス").order_by(Cloth.id),
+    ),
+    "available_clothes": (
+        "ix_clothes_user_id_available",
+        # IS TRUE だとMySQLでインデックスが使われないので = を使う
+        lambda user_id: select(Cloth.id, Cloth.name).where(Cloth.user_id == user_id, Cloth.available == True),  # noqa: E712
+    ),
+    "suggestion_history": (
+        "ix_outfit_suggestions_user_id_date_id",
+        lambda user_id: select(OutfitSuggestion.id)
+        .where(OutfitSuggestion.user_id == user_id)
+        .order_by(OutfitSuggestion.suggested_date.desc(), OutfitSuggestion.id.desc())
+        .limit(51),
+    ),
+}
+
+
+def explain(statement) -> list:
+    """クエリの実行計画を行のリストで返す（SQLite は EXPLAIN QUERY PLAN、それ以外は EXPLAIN）。"""
+    sql = str(statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+    prefix = "EXPLAIN QUERY PLAN" if engine.dialect.name == "sqlite" else "EXPLAIN"
+    with engine.connect() as connection:
+        return [dict(row._mapping) for row in connection.execute(text(f"{prefix} {sql}"))]
+
+
+@db_check_cli.command("check")
+@click.option("--user-id", type=int, default=1, help="EXPLAIN に使うユーザーID")
+def check_indexes(user_id):
+    """
+    よく使うクエリを EXPLAIN し、想定した複合インデックスが使われているかを確認する。
+    使われていないクエリがあれば終了コード1で終わる。MySQLは行数が少ないと全件走査を選ぶことがあるので、
+    実データに近い件数のDBで実行すること。
+    """
+    failed = []
+    for name, (index_name, build) in HOT_QUERIES.items():
+        plan = explain(build(user_id))
+        used = any(index_name in str(row.get("key") or row.get("detail") or "") for row in plan)
+        click.echo(f"{'OK ' if used else 'NG '} {name}: expected {index_name}")
+        for row in plan:
+            click.echo(f"      {row}")
+        if not used:
+            failed.append(name)
+    if failed:
+        raise SystemExit(1)
+
+
+def register_commands(app):
+    app.cli.add_command(images_cli)
+    app.cli.add_command(ingest_cli)
+    app.cli.add_command(db_check_cli)
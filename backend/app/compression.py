@@ -0,0 +1,58 @@
+import gzip
+import os
+
+from flask import request
+
+from app.metrics import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli は任意の依存（pip install '.[speedups]'）。無ければ gzip のみ
+    brotli = None
+
+# この大きさ（バイト）未満のレスポンスは圧縮しない（ヘッダーとCPU時間の方が高くつく）
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/html", "text/css", "application/javascript"}
+
+# 優先する順（ETag の末尾にも付ける）
+CONTENT_CODINGS = ("br", "gzip") if brotli else ("gzip",)
+
+
+def _compress(data: bytes, coding: str) -> bytes:
+    if coding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def compress_response(response):
+    """
+    after_request で使う。Accept-Encoding に応じて br / gzip で本文を圧縮する。
+    ストリーミング・小さい本文・圧縮済み・対象外のMIMEタイプはそのまま返す。
+    """
+    if (
+        response.status_code < 200 or response.status_code in (204, 304)
+        or response.direct_passthrough or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+    response.vary.add("Accept-Encoding")
+    coding = request.accept_encodings.best_match(CONTENT_CODINGS)
+    if coding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    compressed = _compress(data, coding)
+    response.set_data(compressed)
+    response.headers["Content-Encoding"] = coding
+    # 圧縮後の表現は別物なので、強いETagは符号化ごとに変える（versioning.not_modified がどちらも受け付ける）
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{coding}")
+    metrics.incr("responses_compressed", coding=coding)
+    metrics.incr("response_bytes_saved", len(data) - len(compressed))
+    return response
@@ -0,0 +1,139 @@
+import os
+import uuid
+
+from loguru import logger
+
+from app.llm_cache import cached_prompt_tokens, is_cache_hit
+from app.metrics import metrics
+from app.models import Conversation
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken は任意の依存。無ければ文字数からおおよそのトークン数を見積もる
+    tiktoken = None
+
+# プロンプトに含める会話履歴（要約を含む）のトークン数の上限。超えたら古いやり取りから外す
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", "2000"))
+# 上限を超えても必ず残す直近のメッセージ数（ユーザーとAIの1往復で2つ）
+CONVERSATION_KEEP_MESSAGES = int(os.getenv("CONVERSATION_KEEP_MESSAGES", "4"))
+# true: 外したやり取りをLLMで要約に畳み込む / false: 外したやり取りは捨てる
+CONVERSATION_SUMMARIZE = os.getenv("CONVERSATION_SUMMARIZE", "true").lower() in ("1", "true", "yes")
+SUMMARY_MODEL = os.getenv("CONVERSATION_SUMMARY_MODEL", "gpt-4o-mini")
+
+# メッセージ1つごとに role などの分としてかかるトークン数（OpenAI のチャット形式のおおよその値）
+_MESSAGE_OVERHEAD = 4
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("o200k_base")
+        return len(_encoding.encode(text))
+    # 日本語はおおよそ1文字1トークン、英数字は4文字で1トークン程度
+    ascii_chars = sum(1 for char in text if ord(char) < 128)
+    return (len(text) - ascii_chars) + (ascii_chars + 3) // 4
+
+
+def message_tokens(message: dict) -> int:
+    return count_tokens(str(message.get("content") or "")) + _MESSAGE_OVERHEAD
+
+
+def get_conversation(session, conversation_id: str | None, user_id: int, slots: dict | None = None, history: list | None = None) -> Conversation | None:
+    """
+    conversation_id の会話を返す（他のユーザーの会話・存在しないIDは None）。
+    conversation_id が無ければ新しい会話を作る。クライアントから slots・history が送られてきた場合はその内容から始める。
+    """
+    if conversation_id:
+        return session.query(Conversation).filter(Conversation.id == str(conversation_id), Conversation.user_id == user_id).one_or_none()
+    conversation = Conversation(
+        id=str(uuid.uuid4()), user_id=user_id, slots=dict(slots or {}),
+        messages=[{"role": m["role"], "content": m["content"]} for m in history or [] if m.get("role") in ("user", "assistant")],
+    )
+    session.add(conversation)
+    return conversation
+
+
+def _summarize(openai_client, summary: str | None, dropped: list) -> str:
+    transcript = "\n".join(f"{'ユーザー' if m['role'] == 'user' else 'AI'}: {m['content']}" for m in dropped)
+    response = openai_client.chat.completions.create(
+        model=SUMMARY_MODEL,
+        messages=[
+            {"role": "system", "content": "あなたは服装相談の会話を要約するアシスタントです。これまでの要約と新しいやり取りを、"
+                                          "服装の提案に必要な事実（予定・場所・同行者・好み・提案済みのアイテムと反応）だけを残して、日本語で300文字以内にまとめてください。"},
+            {"role": "user", "content": f"# これまでの要約\n{summary or 'なし'}\n\n# 新しいやり取り\n{transcript}"},
+        ],
+        max_tokens=400,
+        temperature=0,
+    )
+    usage = getattr(response, "usage", None)
+    if usage is not None and not is_cache_hit(response):
+        metrics.incr("conversation_summary_tokens", usage.total_tokens)
+    return response.choices[0].message.content.strip()
+
+
+def trim_history(conversation: Conversation, budget: int = CONVERSATION_TOKEN_BUDGET) -> list:
+    """
+    要約と messages の合計が budget トークンに収まるまで、古いメッセージから外す（直近 CONVERSATION_KEEP_MESSAGES 件は残す）。
+    外したメッセージのリストを返す。DBもLLMも使わないので、要約はトランザクションを閉じてから summarize_dropped で行う。
+    """
+    messages = list(conversation.messages or [])
+    total = sum(message_tokens(m) for m in messages) + (count_tokens(conversation.summary) if conversation.summary else 0)
+    dropped = []
+    while total > budget and len(messages) > CONVERSATION_KEEP_MESSAGES:
+        message = messages.pop(0)
+        dropped.append(message)
+        total -= message_tokens(message)
+    # 先頭がAIの発言にならないよう、ユーザーの発言から始まるところで切る
+    while len(messages) > CONVERSATION_KEEP_MESSAGES and messages[0]["role"] != "user":
+        dropped.append(messages.pop(0))
+    if dropped:
+        conversation.messages = messages
+        metrics.incr("conversation_messages_compacted", len(dropped))
+    return dropped
+
+
+def summarize_dropped(openai_client, summary: str | None, dropped: list) -> str | None:
+    """
+    外したメッセージをこれまでの要約に畳み込んだ新しい要約を返す。
+    CONVERSATION_SUMMARIZE が無効・要約に失敗した場合は None（外したメッセージはそのまま捨てる）。
+    """
+    if not dropped or not CONVERSATION_SUMMARIZE or openai_client is None:
+        return None
+    try:
+        return _summarize(openai_client, summary, dropped)
+    except Exception as e:
+        logger.warning(f"会話の要約に失敗しました（古いやり取りは要約せずに外します）: {e}")
+        return None
+
+
+def history_for_prompt(conversation: Conversation) -> list:
+    """OpenAI に送る履歴（要約があれば先頭に system メッセージとして入れる）。"""
+    history = []
+    if conversation.summary:
+        history.append({"role": "system", "content": f"これまでの会話の要約: {conversation.summary}"})
+    history.extend({"role": m["role"], "content": m["content"]} for m in conversation.messages or [])
+    return history
+
+
+def record_turn(conversation: Conversation, user_message: str, response: dict, usage=None):
+    """1往復分のやり取りを messages に追加し、updated_slots を slots に反映する。プロンプトのトークン数も残す。"""
+    assistant = {"role": "assistant", "content": f"{response.get('text', '')}\n\n次の質問: {response.get('next_question', '')}"}
+    if usage is not None:
+        assistant["prompt_tokens"] = usage.prompt_tokens
+        assistant["completion_tokens"] = usage.completion_tokens
+        assistant["cached_tokens"] = cached_prompt_tokens(usage)
+        metrics.observe("propose_prompt_tokens", usage.prompt_tokens)
+    # JSON列は新しいオブジェクトを代入しないと変更が検知されない
+    conversation.messages = [*(conversation.messages or []), {"role": "user", "content": user_message}, assistant]
+    updated = {k: v for k, v in (response.get("updated_slots") or {}).items() if v not in (None, "", "null")}
+    conversation.slots = {**(conversation.slots or {}), **updated}
+
+
+def turn_usage(conversation: Conversation) -> list:
+    """ターンごとのプロンプト・生成トークン数（古いやり取りを外した後は残っている分だけ）。"""
+    return [
+        {"prompt_tokens": m.get("prompt_tokens"), "completion_tokens": m.get("completion_tokens"), "cached_tokens": m.get("cached_tokens")}
+        for m in conversation.messages or [] if m["role"] == "assistant" and "prompt_tokens" in m
+    ]
@@ -1,25 +1,102 @@
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from flask import g
+import time
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text, event
+from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.pool import QueuePool
 import os
 
+from app.metrics import metrics
+
 DATABASE_URL = os.getenv("DATABASE_URL", "mysql+mysqlconnector://outfit_user:outfit_password@db:3306/outfit_db")
 
-engine = create_engine(DATABASE_URL)
+# コネクションプールの設定（ワーカープロセスごと）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# MySQLの wait_timeout（既定8時間）より短くして、アイドル中に切られた接続を使わないようにする
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# ワーカーの起動時にあらかじめ開いておく接続数
+DB_POOL_WARMUP = int(os.getenv("DB_POOL_WARMUP", "1"))
+
+
+class TimedQueuePool(QueuePool):
+    """接続の取得にかかった時間（プールが空いて待たされた時間を含む）を計測する QueuePool。"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            metrics.incr("db_pool_checkout_errors")
+            raise
+        finally:
+            metrics.observe("db_pool_checkout_seconds", time.perf_counter() - start)
+
+
+def _engine_options(url: str) -> dict:
+    # SQLite（ローカルでの確認用）はSQLAlchemy既定のプールのままにする
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+
+def pool_status() -> dict:
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"class": type(pool).__name__}
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": DB_MAX_OVERFLOW,
+    }
+
+
+metrics.register_collector("db_pool", pool_status)
+
+
+def warm_up_pool(connections: int = DB_POOL_WARMUP) -> int:
+    """
+    接続を connections 本まで同時に開いてプールに戻す。ワーカーがリクエストを受け付ける前に呼ぶと、
+    最初のリクエストが接続確立の待ち時間を払わずに済む。開けた接続数を返す。
+    """
+    opened = []
+    try:
+        for _ in range(min(connections, DB_POOL_SIZE)):
+            connection = engine.connect()
+            opened.append(connection)
+            connection.execute(text("SELECT 1"))
+    finally:
+        for connection in opened:
+            connection.close()
+    return len(opened)
+
+# スレッドごと（gevent ワーカーではグリーンレットごと）のセッション。
+# gthread / gevent ワーカーでは1プロセスで複数のリクエストを同時に処理するので、セッションを共有しないようにする
+ScopedSession = scoped_session(SessionLocal)
+
 # リクエストごとにセッションを取得するヘルパー関数
 def get_db_session():
-    if 'db_session' not in g:
-        g.db_session = SessionLocal()
-    return g.db_session
+    return ScopedSession()
 
 # リクエストの終了時にセッションをクローズする関数
-# この関数はapp.pyでapp.teardown_requestに登録する必要がある
+# この関数はapp.pyでapp.teardown_requestに登録する必要がある。
+# スレッドはリクエストをまたいで再利用されるので、ここで必ずセッションを破棄する
 def close_db_session(exception=None):
-    session = g.pop('db_session', None)
-    if session is not None:
-        session.close()
+    ScopedSession.remove()
 
 # 初期化時にエンジンがDBに接続できるかテストする関数 (オプション)
 def test_db_connection():
@@ -29,4 +106,19 @@ def test_db_connection():
         return True
     except Exception as e:
         print(f"Database connection test failed: {e}")
-        return False
\ No newline at end of file
+        return False
+
+# ブロック内で発行されたSQLの数を数える（N+1 クエリの検出用）
+@contextmanager
+def count_queries(bind=None):
+    bind = bind or engine
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _before_cursor_execute)
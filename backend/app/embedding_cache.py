@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+
+from loguru import logger
+
+from app.metrics import metrics
+
+# メモリ上に保持するエントリ数の上限（0でキャッシュ無効）
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))
+# 指定するとワーカーの再起動後も残るSQLiteファイルにも保存する
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+
+
+def normalize_text(text: str) -> str:
+    """CLIPのトークナイザと同じく空白の連続と大文字小文字の違いを無視する。"""
+    return " ".join(text.split()).lower()
+
+
+class EmbeddingCache:
+    """
+    (モデル名, 正規化したテキスト) をキーにテキストベクトルを保持するLRUキャッシュ。
+    path を指定すると、メモリから追い出されたベクトルもSQLiteから読み戻せる。
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, path: str | None = EMBEDDING_CACHE_PATH):
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._conn_pid = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return f"{model_name}\x00{normalize_text(text)}"
+
+    def _connection(self):
+        # SQLiteの接続は fork をまたいで共有できないため、プロセスごとに開き直す
+        if self._conn is None or self._conn_pid != os.getpid():
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._conn_pid = os.getpid()
+        return self._conn
+
+    def _remember(self, key: str, vector: array):
+        # float32 の array で保持し、Pythonのfloatリストに比べてメモリ使用量を1/8程度に抑える
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get_many(self, model_name: str, texts: list[str]) -> list:
+        """texts と同じ順番でベクトル（未キャッシュは None）を返す。"""
+        if not self.enabled:
+            return [None] * len(texts)
+        results = []
+        with self._lock:
+            for text in texts:
+                key = self.make_key(model_name, text)
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                elif self.path:
+                    vector = self._load(key)
+                    if vector is not None:
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+                if vector is None:
+                    self.misses += 1
+                results.append(vector.tolist() if vector is not None else None)
+        return results
+
+    def put_many(self, model_name: str, texts: list[str], vectors: list[list]):
+        if not self.enabled:
+            return
+        with self._lock:
+            rows = []
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(model_name, text)
+                packed = array("f", vector)
+                self._remember(key, packed)
+                rows.append((key, packed.tobytes()))
+            if self.path:
+                try:
+                    conn = self._connection()
+                    conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                    conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Failed to persist embeddings: {e}")
+
+    def _load(self, key: str) -> array | None:
+        try:
+            row = self._connection().execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read persisted embedding: {e}")
+            return None
+        return array("f", row[0]) if row else None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            "persistent": bool(self.path),
+        }
+
+
+embedding_cache = EmbeddingCache()
+metrics.register_collector("embedding_cache", embedding_cache.stats)
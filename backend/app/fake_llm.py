@@ -0,0 +1,83 @@
+"""
+OpenAI の chat.completions を真似るローカルの偽クライアント。APIキーなしで /api/propose（ストリーミングを含む）の
+動作確認やベンチマークを行うために使う。LLM_BACKEND=fake でサービスレジストリの openai_client がこれに置き換わる。
+
+    LLM_BACKEND=fake FAKE_LLM_CHUNK_DELAY=0.05 flask run
+"""
+import json
+import os
+import time
+from types import SimpleNamespace
+
+# ストリーミング時のチャンクの文字数と、チャンク間の待ち時間（秒）。最初のチャンクまでは FAKE_LLM_LATENCY 秒待つ
+FAKE_LLM_CHUNK_SIZE = int(os.getenv("FAKE_LLM_CHUNK_SIZE", "8"))
+FAKE_LLM_CHUNK_DELAY = float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0.02"))
+FAKE_LLM_LATENCY = float(os.getenv("FAKE_LLM_LATENCY", "0.2"))
+
+FAKE_PROPOSAL = {
+    "text": "明日の京都は晴れて過ごしやすい一日になりそうです。\n白いシャツにベージュのチノパンを合わせた、きれいめカジュアルはいかがでしょうか？",
+    "next_question": "どなたと、どちらへお出かけになりますか？",
+    "suggestion_items": {"tops": "白いシャツ", "bottoms": "ベージュのチノパン", "shoes": "白いスニーカー"},
+    "updated_slots": {"date": "明日", "location_geo": "京都"},
+    "type": "suggestion",
+}
+
+
+def _usage(prompt: str, cached_tokens: int, content: str) -> SimpleNamespace:
+    # トークン数はおおよそ（1文字≒1トークン）でよい
+    prompt_tokens = len(prompt)
+    completion_tokens = len(content)
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+    )
+
+
+class _FakeCompletions:
+    def __init__(self, content: str):
+        self._content = content
+        self._seen_prompts = []
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """
+        OpenAI のプロンプトキャッシュを真似る。これまでの入力と先頭が一致する長さが1024トークン以上なら、
+        128トークン単位で切り捨てた分をキャッシュ済みとして数える。
+        """
+        longest = max((len(os.path.commonprefix([prompt, seen])) for seen in self._seen_prompts), default=0)
+        self._seen_prompts = [*self._seen_prompts[-31:], prompt]
+        return longest // 128 * 128 if longest >= 1024 else 0
+
+    def _usage(self, messages: list) -> SimpleNamespace:
+        prompt = "".join(f"{message.get('role')}\n{message.get('content', '')}\n" for message in messages)
+        return _usage(prompt, self._cached_tokens(prompt), self._content)
+
+    def create(self, *, model: str, messages: list, stream: bool = False, stream_options: dict | None = None, **params):
+        time.sleep(FAKE_LLM_LATENCY)
+        if not stream:
+            return SimpleNamespace(
+                id="chatcmpl-fake", model=model, usage=self._usage(messages),
+                choices=[SimpleNamespace(index=0, finish_reason="stop", message=SimpleNamespace(role="assistant", content=self._content))],
+            )
+        usage = self._usage(messages)
+        return self._stream(model, usage if (stream_options or {}).get("include_usage") else None)
+
+    def _stream(self, model: str, usage):
+        for start in range(0, len(self._content), FAKE_LLM_CHUNK_SIZE):
+            if start:
+                time.sleep(FAKE_LLM_CHUNK_DELAY)
+            yield SimpleNamespace(
+                id="chatcmpl-fake", model=model, usage=None,
+                choices=[SimpleNamespace(index=0, finish_reason=None, delta=SimpleNamespace(content=self._content[start:start + FAKE_LLM_CHUNK_SIZE]))],
+            )
+        yield SimpleNamespace(id="chatcmpl-fake", model=model, usage=None, choices=[SimpleNamespace(index=0, finish_reason="stop", delta=SimpleNamespace(content=None))])
+        if usage is not None:
+            # OpenAI と同じく、usage は choices が空の最後のチャンクで返す
+            yield SimpleNamespace(id="chatcmpl-fake", model=model, usage=usage, choices=[])
+
+
+class FakeOpenAIClient:
+    """常に同じ提案（content）を返す。stream=True ではチャンクに分けて少しずつ返す。"""
+
+    def __init__(self, content: dict | str = FAKE_PROPOSAL):
+        content = content if isinstance(content, str) else json.dumps(content, ensure_ascii=False)
+        self.chat = SimpleNamespace(completions=_FakeCompletions(content))
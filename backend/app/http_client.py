@@ -0,0 +1,82 @@
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.metrics import metrics
+
+# 外部HTTP呼び出しの共通設定
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "3.05"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "10"))
+HTTP_MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "2"))
+HTTP_BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "0.3"))
+HTTP_BACKOFF_JITTER = float(os.getenv("HTTP_BACKOFF_JITTER", "0.3"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))
+
+
+class HTTPClient:
+    """
+    プロセス内で共有する外部HTTPクライアント。
+    ホストごとにkeep-aliveの接続プールを持ち、接続・読み取りのタイムアウト、
+    ジッター付きの限定的なリトライ、ホストごとのレイテンシ計測を行う。
+    """
+
+    def __init__(self, connect_timeout: float = HTTP_CONNECT_TIMEOUT, read_timeout: float = HTTP_READ_TIMEOUT,
+                 max_retries: int = HTTP_MAX_RETRIES, pool_maxsize: int = HTTP_POOL_MAXSIZE):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.pool_maxsize = pool_maxsize
+        self._session = None
+        self._session_pid = None
+        self._lock = threading.Lock()
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            backoff_factor=HTTP_BACKOFF_FACTOR,
+            backoff_jitter=HTTP_BACKOFF_JITTER,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "HEAD"}),
+            respect_retry_after_header=True,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=self.pool_maxsize, max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        # 接続は fork をまたいで共有できないので、プロセスごとにセッションを作る
+        if self._session is None or self._session_pid != os.getpid():
+            with self._lock:
+                if self._session is None or self._session_pid != os.getpid():
+                    self._session = self._build_session()
+                    self._session_pid = os.getpid()
+        return self._session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        # URLにはAPIキーが含まれるので、計測のラベルにはホスト名だけを使う
+        host = urlsplit(url).hostname or "unknown"
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            metrics.incr("http_requests", host=host, status=type(e).__name__)
+            raise
+        finally:
+            metrics.observe("http_request_seconds", time.perf_counter() - start, host=host)
+        metrics.incr("http_requests", host=host, status=response.status_code)
+        return response
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+
+http_client = HTTPClient()
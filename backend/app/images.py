@@ -0,0 +1,105 @@
+import os
+from io import BytesIO
+
+from PIL import Image, ImageOps
+
+from app.storage import upload_stream
+
+# 派生画像の種類と長辺のピクセル数
+DERIVATIVE_SIZES = {
+    "thumb": int(os.getenv("THUMBNAIL_SIZE", "320")),
+    "medium": int(os.getenv("MEDIUM_IMAGE_SIZE", "960")),
+}
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "80"))
+
+# CLIPの入力サイズ（openai/clip-vit-base-patch32 は短辺224pxにリサイズして中央を224px角で切り抜く）
+CLIP_IMAGE_SIZE = 224
+# これを超える画素数の画像はデコードせずに拒否する（12MPのスマホ写真の約4倍）
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(50_000_000)))
+
+
+def derivative_key(image_key: str, variant: str) -> str:
+    """元画像のキーから派生画像のキーを作る（例: abc.jpg -> abc_thumb.webp）。"""
+    stem, _ = os.path.splitext(image_key)
+    return f"{stem}_{variant}.webp"
+
+
+def derivative_urls(image_key: str | None, has_derivatives: bool) -> dict:
+    """
+    一覧APIで返す派生画像のURL（元画像と同じくバケット内のキー）。
+    派生画像がまだ無い（生成前・生成に失敗した）場合は元画像のキーを返す。
+    """
+    if not image_key:
+        return {"thumbnail_url": None, "medium_url": None}
+    if not has_derivatives:
+        return {"thumbnail_url": image_key, "medium_url": image_key}
+    return {
+        "thumbnail_url": derivative_key(image_key, "thumb"),
+        "medium_url": derivative_key(image_key, "medium"),
+    }
+
+
+def open_image(source) -> Image.Image:
+    """画像を開く（ヘッダーのみ読み、ピクセルはまだデコードしない）。大きすぎる画像は ValueError。"""
+    image = Image.open(source)
+    width, height = image.size
+    if width * height > MAX_IMAGE_PIXELS:
+        image.close()
+        raise ValueError(f"画像が大きすぎます: {width}x{height}")
+    return image
+
+
+def prepare_clip_image(image: Image.Image, size: int = CLIP_IMAGE_SIZE) -> Image.Image:
+    """
+    CLIPにそのまま渡せる size x size のRGB画像を作る。
+    JPEGはdraftモードで1/2〜1/8に縮小しながらデコードするので、フル解像度の展開を避けられる。
+    EXIFの向きを反映した後、短辺を size に縮小して中央を切り抜く（CLIPProcessor と同じ手順）。
+    """
+    # draft は短辺が size を下回らない範囲で最も小さいスケールを選ぶ（JPEG以外では何もしない）
+    image.draft("RGB", (size, size))
+    # 既に size x size の画像でもEXIFで回転しているものがあるので、向きは大きさに関係なく先に反映する
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size == (size, size):
+        return image
+
+    width, height = image.size
+    scale = size / min(width, height)
+    resized = (max(size, round(width * scale)), max(size, round(height * scale)))
+    # reducing_gap を指定すると、まず整数倍の縮小（reduce）を行ってから補間するので速い
+    image = image.resize(resized, Image.Resampling.BICUBIC, reducing_gap=3.0)
+    left, top = (resized[0] - size) // 2, (resized[1] - size) // 2
+    return image.crop((left, top, left + size, top + size))
+
+
+def load_clip_image(source, size: int = CLIP_IMAGE_SIZE) -> Image.Image:
+    """画像（パス・ファイルオブジェクト）を開き、CLIP用の size x size の画像にする。"""
+    with open_image(source) as image:
+        prepared = prepare_clip_image(image, size)
+        prepared.load()
+    return prepared
+
+
+def make_derivatives(source) -> dict:
+    """画像（パスまたはファイルオブジェクト）から各サイズのWebPを作り、{variant: bytes} を返す。"""
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        results = {}
+        # 大きいサイズから順に縮小していけば、毎回元画像から縮小するより速い
+        for variant, size in sorted(DERIVATIVE_SIZES.items(), key=lambda kv: -kv[1]):
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            image.save(buffer, format="WEBP", quality=WEBP_QUALITY, method=4)
+            results[variant] = buffer.getvalue()
+    return results
+
+
+def generate_derivatives(image_key: str, source) -> dict:
+    """派生画像を作って元画像の隣にアップロードし、{variant: key} を返す。Cloth.has_derivatives は呼び出し側で更新する。"""
+    keys = {}
+    for variant, data in make_derivatives(source).items():
+        key = derivative_key(image_key, variant)
+        upload_stream(BytesIO(data), key, "image/webp")
+        keys[variant] = key
+    return keys
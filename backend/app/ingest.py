@@ -0,0 +1,392 @@
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from loguru import logger
+from sqlalchemy import update
+
+from app.database import SessionLocal
+from app.metrics import metrics
+from app.models import Cloth
+from app.services import services
+from app.storage import get_s3_client, get_bucket, upload_stream
+from app.images import generate_derivatives, load_clip_image
+from app.utils import upload_image_to_pinecone, embed_images
+from app.vector_store import cloth_metadata
+from app.versioning import bump_version, WARDROBE
+
+# 画像のベクトル化・登録を行うバックグラウンドスレッド数（ワーカープロセスごと）
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+# ジョブに渡すまでアップロード画像を置いておくディレクトリ
+INGEST_TMP_DIR = os.getenv("INGEST_TMP_DIR") or tempfile.gettempdir()
+
+# 一括登録の設定
+BULK_IMPORT_MAX_ITEMS = int(os.getenv("BULK_IMPORT_MAX_ITEMS", "500"))
+BULK_DECODE_WORKERS = int(os.getenv("BULK_DECODE_WORKERS", "4"))
+BULK_EMBED_BATCH_SIZE = int(os.getenv("BULK_EMBED_BATCH_SIZE", "16"))
+BULK_UPSERT_CHUNK_SIZE = 100
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+INDEX_PENDING = "pending"
+INDEX_PROCESSING = "processing"
+INDEX_INDEXED = "indexed"
+INDEX_FAILED = "failed"
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """プロセスごとに1つのスレッドプールを返す（fork 前に作られたものは使わない）。"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def save_upload_to_tempfile(file, extension: str = "") -> str:
+    """アップロードされたファイルをチャンク単位で一時ファイルにコピーし、そのパスを返す。"""
+    fd, path = tempfile.mkstemp(suffix=extension, prefix="upload-", dir=INGEST_TMP_DIR)
+    with os.fdopen(fd, "wb") as fp:
+        file.save(fp)
+    return path
+
+
+def upload_original(file, key: str) -> str | None:
+    """
+    アップロードされたファイル（werkzeug の FileStorage）を MinIO に送る。
+    werkzeug は受信時に既に一時ファイル（小さければメモリ）へ書き出しているので、シークできるストリームはそのまま送り、
+    ジョブは後で MinIO から元画像を読み直す（None を返す）。シークできない場合だけ一時ファイルにコピーしてから送り、
+    そのパスを返す（ジョブに渡せば処理後に削除される）。
+    """
+    stream = file.stream
+    if getattr(stream, "seekable", lambda: False)():
+        stream.seek(0)
+        upload_stream(stream, key, file.content_type)
+        return None
+    path = save_upload_to_tempfile(file, os.path.splitext(key)[1])
+    try:
+        with open(path, "rb") as fp:
+            upload_stream(fp, key, file.content_type)
+    except Exception:
+        discard_tempfile(path)
+        raise
+    return path
+
+
+def read_original(image_key: str) -> bytes:
+    """MinIO の元画像を読み込む。"""
+    return get_s3_client().get_object(Bucket=get_bucket(), Key=image_key)["Body"].read()
+
+
+def spool_to_tempfile(fileobj, extension: str = "", max_bytes: int | None = None) -> tuple[str, int]:
+    """
+    ファイルオブジェクトをチャンク単位で一時ファイルにコピーし、(パス, バイト数) を返す。
+    max_bytes を指定した場合は max_bytes+1 バイトでコピーをやめるので、バイト数が max_bytes を超えていたら上限超え。
+    """
+    limit = None if max_bytes is None else max_bytes + 1
+    fd, path = tempfile.mkstemp(suffix=extension, prefix="bulk-", dir=INGEST_TMP_DIR)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            while limit is None or size < limit:
+                chunk = fileobj.read(SPOOL_CHUNK_SIZE if limit is None else min(SPOOL_CHUNK_SIZE, limit - size))
+                if not chunk:
+                    break
+                fp.write(chunk)
+                size += len(chunk)
+    except Exception:
+        discard_tempfile(path)
+        raise
+    return path, size
+
+
+def discard_tempfile(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def download_original_to_tempfile(image_key: str) -> str:
+    """MinIO の元画像を一時ファイルにダウンロードし、そのパスを返す（ジョブの再実行用）。"""
+    fd, path = tempfile.mkstemp(suffix=os.path.splitext(image_key)[1].lower(), prefix="retry-", dir=INGEST_TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as fp:
+            get_s3_client().download_fileobj(get_bucket(), image_key, fp)
+    except Exception:
+        discard_tempfile(path)
+        raise
+    return path
+
+
+def _set_status(session, cloth: Cloth, status: str):
+    cloth.index_status = status
+    session.commit()
+
+
+def ingest_cloth_image(cloth_id: int, image_path: str | None = None) -> str | None:
+    """
+    Cloth の画像をベクトル化してベクトルストアに登録し、Cloth.vector と index_status を更新する。
+    image_path が無ければ MinIO の元画像を読む。image_path の一時ファイルは処理後に削除する。
+    最終的な index_status を返す（Cloth が無ければ None）。
+    """
+    session = SessionLocal()
+    try:
+        cloth = session.get(Cloth, cloth_id)
+        if cloth is None:
+            logger.warning(f"Ingest skipped: cloth {cloth_id} no longer exists")
+            return None
+        _set_status(session, cloth, INDEX_PROCESSING)
+
+        if image_path is None:
+            image_bytes = read_original(cloth.image_url)
+        else:
+            with open(image_path, "rb") as fp:
+                image_bytes = fp.read()
+        if cloth.image_url and _generate_derivatives_safely(cloth.image_url, BytesIO(image_bytes)):
+            cloth.has_derivatives = True
+            session.commit()
+        with metrics.timer("ingest_seconds"):
+            result = upload_image_to_pinecone(
+                image_bytes=image_bytes,
+                user_id=str(cloth.user_id),
+                item_metadata=cloth_metadata(cloth),
+                index=services["vector_store"],
+                model=services["model"],
+                processor=services["processor"],
+                image_url=cloth.image_url,
+                item_id=str(cloth.id)
+            )
+
+        if result.get("success"):
+            cloth.vector = result["vector"]
+            _set_status(session, cloth, INDEX_INDEXED)
+            metrics.incr("ingest_jobs", status=INDEX_INDEXED)
+            logger.success(f"Cloth {cloth_id} is now searchable")
+            return INDEX_INDEXED
+        else:
+            _set_status(session, cloth, INDEX_FAILED)
+            metrics.incr("ingest_jobs", status=INDEX_FAILED)
+            logger.error(f"Failed to index cloth {cloth_id}: {result.get('error')}")
+            return INDEX_FAILED
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Ingest job for cloth {cloth_id} failed: {e}")
+        metrics.incr("ingest_jobs", status=INDEX_FAILED)
+        try:
+            user_id = session.query(Cloth.user_id).filter(Cloth.id == cloth_id).scalar()
+            if user_id is not None:
+                session.query(Cloth).filter(Cloth.id == cloth_id).update({"index_status": INDEX_FAILED})
+                bump_version(session, user_id, WARDROBE)
+                session.commit()
+        except Exception:
+            session.rollback()
+        return INDEX_FAILED
+    finally:
+        session.close()
+        if image_path is not None:
+            discard_tempfile(image_path)
+
+
+def _generate_derivatives_safely(image_key: str, source) -> bool:
+    # サムネイルの生成に失敗してもベクトル登録は続ける（backfill コマンドで後から作り直せる）
+    try:
+        with metrics.timer("derivative_seconds"):
+            generate_derivatives(image_key, source)
+        return True
+    except Exception as e:
+        logger.error(f"Failed to generate derivatives for {image_key}: {e}")
+        return False
+
+
+def mark_derivatives_ready(session, cloth_id: int):
+    """派生画像を生成済みにしてコミットする（一覧APIがサムネイルのURLを返すようになるのでバージョンも上げる）。"""
+    user_id = session.query(Cloth.user_id).filter(Cloth.id == cloth_id).scalar()
+    if user_id is None:
+        return
+    session.query(Cloth).filter(Cloth.id == cloth_id).update({"has_derivatives": True})
+    bump_version(session, user_id, WARDROBE)
+    session.commit()
+
+
+def _cloth_derivatives_job(cloth_id: int, image_key: str, image_path: str):
+    try:
+        generated = _generate_derivatives_safely(image_key, image_path)
+    finally:
+        discard_tempfile(image_path)
+    if not generated:
+        return
+    session = SessionLocal()
+    try:
+        mark_derivatives_ready(session, cloth_id)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to mark derivatives of cloth {cloth_id}: {e}")
+    finally:
+        session.close()
+
+
+def _derivatives_job(image_key: str, image_path: str | None):
+    if image_path is None:
+        try:
+            source = BytesIO(read_original(image_key))
+        except Exception as e:
+            logger.error(f"Failed to read {image_key} for derivatives: {e}")
+            return
+        _generate_derivatives_safely(image_key, source)
+        return
+    try:
+        _generate_derivatives_safely(image_key, image_path)
+    finally:
+        discard_tempfile(image_path)
+
+
+def submit_derivatives(image_key: str, image_path: str | None = None):
+    """
+    派生画像（サムネイル・中サイズWebP）の生成をバックグラウンドに投入する。
+    image_path が無ければ MinIO の元画像から作る。image_path は処理後に削除する。
+    """
+    return get_executor().submit(_derivatives_job, image_key, image_path)
+
+
+def submit_cloth_ingest(cloth_id: int, image_path: str | None = None):
+    """ベクトル化ジョブをバックグラウンドに投入する。ジョブIDは Cloth のIDと同じ。"""
+    metrics.incr("ingest_jobs", status="submitted")
+    return get_executor().submit(ingest_cloth_image, cloth_id, image_path)
+
+
+def job_status(cloth: Cloth) -> dict:
+    return {
+        "job_id": cloth.id,
+        "cloth_id": cloth.id,
+        "status": cloth.index_status,
+        "searchable": cloth.index_status == INDEX_INDEXED,
+    }
+
+
+def _decode_image(path: str):
+    """画像をデコードする。Pillow はデコード中にGILを解放するのでスレッドで並列化できる。"""
+    try:
+        # CLIPの入力サイズまで縮小しておけば、全件を保持してもメモリは1枚あたり約150KBで済む
+        return load_clip_image(path), None
+    except Exception as e:
+        return None, f"画像を読み込めませんでした: {e}"
+
+
+def _upload_original(item: dict, key: str):
+    try:
+        with open(item["path"], "rb") as fp:
+            upload_stream(fp, key, item["content_type"])
+        return None
+    except Exception as e:
+        return f"画像のアップロードに失敗しました: {e}"
+
+
+def import_clothes_bulk(session, user_id: int, items: list) -> list:
+    """
+    複数の服を一括登録する。items は {"filename", "path", "content_type", "metadata"} のリスト（path は画像の一時ファイル）。
+    画像のデコードとMinIOへのアップロードはスレッドで並列に行い、Cloth行はまとめて挿入し、
+    CLIPのベクトル化はバッチ単位、ベクトルストアへの登録はチャンク単位で行う。
+    一時ファイルはこの関数が引き取る（登録できたものは派生画像の生成後、それ以外はここで削除する）。
+    戻り値は items と同じ順番のアイテムごとの結果。
+    """
+    try:
+        return _import_clothes_bulk(session, user_id, items)
+    finally:
+        for item in items:
+            if not item.get("handed_off"):
+                discard_tempfile(item["path"])
+
+
+def _import_clothes_bulk(session, user_id: int, items: list) -> list:
+    results = [{"index": i, "filename": item["filename"], "success": False} for i, item in enumerate(items)]
+
+    # 1. 必須項目のチェック
+    pending = []
+    for i, item in enumerate(items):
+        meta = item["metadata"]
+        if not meta.get("name") or not meta.get("category") or not meta.get("color"):
+            results[i]["error"] = "服の名前・カテゴリ・色は必須です"
+        else:
+            pending.append(i)
+
+    # 2. 画像のデコードとアップロードを並列に実行
+    keys = {i: f"{uuid.uuid4()}{os.path.splitext(items[i]['filename'])[1].lower()}" for i in pending}
+    with ThreadPoolExecutor(max_workers=BULK_DECODE_WORKERS, thread_name_prefix="bulk") as pool:
+        with metrics.timer("bulk_import_decode_seconds"):
+            decoded = dict(zip(pending, pool.map(_decode_image, [items[i]["path"] for i in pending])))
+        ok = [i for i in pending if decoded[i][0] is not None]
+        upload_errors = dict(zip(ok, pool.map(lambda i: _upload_original(items[i], keys[i]), ok)))
+
+    for i in pending:
+        error = decoded[i][1] or upload_errors.get(i)
+        if error:
+            results[i]["error"] = error
+    ok = [i for i in ok if not upload_errors[i]]
+
+    # 3. Cloth行をまとめて挿入してコミットする。ベクトル化は時間がかかるので、その間トランザクション（DB接続）を持ち続けない
+    clothes = {}
+    for i in ok:
+        meta = items[i]["metadata"]
+        clothes[i] = Cloth(
+            user_id=user_id,
+            name=meta["name"],
+            category=meta["category"],
+            color=meta["color"],
+            material=meta.get("material"),
+            season=meta.get("season"),
+            is_formal=str(meta.get("is_formal", "false")).lower() == "true",
+            image_url=keys[i],
+            index_status=INDEX_PROCESSING
+        )
+    session.add_all(clothes.values())
+    session.flush()
+    # コミットすると属性が失効し、読むたびにSELECTが走るので、必要な値は先に取り出しておく
+    cloth_ids = {i: clothes[i].id for i in ok}
+    metadata = {i: cloth_metadata(clothes[i]) for i in ok}
+    session.commit()
+
+    # 4. バッチ単位でベクトル化し、チャンク単位でベクトルストアに登録する（途中で落ちた行は flask ingest retry でやり直せる）
+    indexed = set()
+    try:
+        with metrics.timer("bulk_import_embed_seconds"):
+            vectors = dict(zip(ok, embed_images([decoded[i][0] for i in ok], services["model"], services["processor"], batch_size=BULK_EMBED_BATCH_SIZE)))
+        vector_store = services["vector_store"]
+        for start in range(0, len(ok), BULK_UPSERT_CHUNK_SIZE):
+            chunk = ok[start:start + BULK_UPSERT_CHUNK_SIZE]
+            try:
+                vector_store.upsert(
+                    vectors=[{"id": str(cloth_ids[i]), "values": vectors[i], "metadata": metadata[i]} for i in chunk],
+                    namespace=str(user_id)
+                )
+                indexed.update(chunk)
+            except Exception as e:
+                logger.error(f"Bulk upsert failed for {len(chunk)} items: {e}")
+    except Exception as e:
+        logger.error(f"Bulk embedding failed: {e}")
+
+    # 5. 登録結果を短いトランザクションで反映する（主キー指定の一括UPDATEはフラッシュを通らないのでバージョンは明示的に上げる）
+    if ok:
+        session.execute(update(Cloth), [
+            {"id": cloth_ids[i], "vector": vectors[i], "index_status": INDEX_INDEXED} if i in indexed
+            else {"id": cloth_ids[i], "index_status": INDEX_FAILED}
+            for i in ok
+        ])
+        bump_version(session, user_id, WARDROBE)
+        session.commit()
+    for i in ok:
+        results[i].update(success=True, cloth_id=cloth_ids[i], image_url=keys[i], indexed=i in indexed)
+
+    for i in ok:
+        get_executor().submit(_cloth_derivatives_job, cloth_ids[i], keys[i], items[i]["path"])
+        items[i]["handed_off"] = True
+    metrics.incr("bulk_import_items", len(ok), status="imported")
+    metrics.incr("bulk_import_items", len(items) - len(ok), status="failed")
+    return results
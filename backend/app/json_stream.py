@@ -0,0 +1,88 @@
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+class JsonStringFieldExtractor:
+    """
+    少しずつ届くJSONオブジェクトの文字列から、トップレベルの1つの文字列フィールド（既定では "text"）の値を
+    届いた分だけデコードして取り出す。JSON全体が揃うのを待たずに本文をクライアントへ流すために使う。
+
+        extractor = JsonStringFieldExtractor("text")
+        extractor.feed('{"te') -> ""
+        extractor.feed('xt": "こんに') -> "こんに"
+        extractor.feed('ちは\\n", "type": ...') -> "ちは\\n"
+    """
+
+    def __init__(self, field: str = "text"):
+        self.field = field
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._is_key = False
+        self._capture = False
+        self._expect_key = False
+        self._key = None
+        self._buffer = []
+        self._escape = False
+        self._unicode = None       # \\uXXXX の16進数を読んでいる途中
+        self._high_surrogate = None
+
+    def _append(self, char: str):
+        if self._capture or self._is_key:
+            self._buffer.append(char)
+
+    def _end_string(self):
+        if self._is_key:
+            self._key = "".join(self._buffer)
+        elif self._capture:
+            self._capture = False
+            self.done = True
+        self._in_string = False
+        self._buffer = []
+
+    def feed(self, chunk: str) -> str:
+        """chunk を読み進め、その中で新しく得られた対象フィールドの文字列を返す。"""
+        out = []
+        for char in chunk:
+            if self._in_string:
+                if self._unicode is not None:
+                    self._unicode += char
+                    if len(self._unicode) == 4:
+                        code = int(self._unicode, 16)
+                        self._unicode = None
+                        if 0xD800 <= code < 0xDC00:
+                            self._high_surrogate = code
+                            continue
+                        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+                        self._high_surrogate = None
+                        self._append(chr(code))
+                elif self._escape:
+                    self._escape = False
+                    if char == 'u':
+                        self._unicode = ""
+                    else:
+                        self._append(_ESCAPES.get(char, char))
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._end_string()
+                else:
+                    self._append(char)
+                if self._capture and self._buffer:
+                    out.extend(self._buffer)
+                    self._buffer = []
+            elif char == '"':
+                self._in_string = True
+                self._is_key = self._depth == 1 and self._expect_key
+                self._capture = self._depth == 1 and not self._is_key and self._key == self.field and not self.done
+            elif char in '{[':
+                self._depth += 1
+                self._expect_key = self._depth == 1 and char == '{'
+            elif char in '}]':
+                self._depth -= 1
+            elif self._depth == 1 and char == ':':
+                self._expect_key = False
+            elif self._depth == 1 and char == ',':
+                self._expect_key = True
+                self._key = None
+        return "".join(out)
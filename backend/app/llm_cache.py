@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+import threading
+
+from loguru import logger
+
+from app.cache import TTLCache
+from app.metrics import metrics
+
+# 同じプロンプト（モデル・メッセージ・パラメータが同じ）への応答を使い回す時間（秒）と件数。LLM_CACHE_ENABLED=false で無効
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "3600"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+
+# 応答の内容に影響しないのでキーに含めないパラメータ
+_UNKEYED_PARAMS = {"timeout", "extra_headers", "user"}
+
+llm_cache = TTLCache(max_entries=LLM_CACHE_MAX_ENTRIES, ttl=LLM_CACHE_TTL)
+metrics.register_collector("llm_cache", llm_cache.stats)
+
+# OpenAI 側のプロンプトキャッシュ（先頭が一致する入力トークンは usage.prompt_tokens_details.cached_tokens に数えられる）
+_prompt_cache_totals = {"requests": 0, "hits": 0, "prompt_tokens": 0, "cached_tokens": 0}
+_prompt_cache_lock = threading.Lock()
+
+
+def cached_prompt_tokens(usage) -> int:
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (getattr(details, "cached_tokens", None) or 0) if details is not None else 0
+
+
+def record_prompt_usage(usage, endpoint: str) -> dict:
+    """応答の usage から入力トークン数とプロンプトキャッシュに載った分を記録し、このリクエストの値を返す（キャッシュから返した応答は usage=None で呼ぶ）。"""
+    if usage is None:
+        return {}
+    prompt_tokens, cached = usage.prompt_tokens, cached_prompt_tokens(usage)
+    with _prompt_cache_lock:
+        _prompt_cache_totals["requests"] += 1
+        _prompt_cache_totals["hits"] += cached > 0
+        _prompt_cache_totals["prompt_tokens"] += prompt_tokens
+        _prompt_cache_totals["cached_tokens"] += cached
+    metrics.incr("llm_prompt_tokens", prompt_tokens, endpoint=endpoint)
+    metrics.incr("llm_cached_prompt_tokens", cached, endpoint=endpoint)
+    return {"cached_tokens": cached, "cached_ratio": round(cached / prompt_tokens, 3) if prompt_tokens else 0.0}
+
+
+def prompt_cache_stats() -> dict:
+    with _prompt_cache_lock:
+        totals = dict(_prompt_cache_totals)
+    return {
+        **totals,
+        "hit_rate": totals["hits"] / totals["requests"] if totals["requests"] else 0.0,
+        "cached_token_ratio": totals["cached_tokens"] / totals["prompt_tokens"] if totals["prompt_tokens"] else 0.0,
+    }
+
+
+metrics.register_collector("prompt_cache", prompt_cache_stats)
+
+
+def _normalize_content(content):
+    # 三重引用符で書いたプロンプトのインデントや行末の空白の違いは無視する（改行は残す）
+    if isinstance(content, str):
+        return "\n".join(line.strip() for line in content.strip().splitlines())
+    return content
+
+
+def make_key(params: dict) -> str:
+    """モデル・正規化したメッセージ・その他のパラメータから決まるキー（SHA-256）。"""
+    keyed = {k: v for k, v in params.items() if k not in _UNKEYED_PARAMS}
+    keyed["messages"] = [{**message, "content": _normalize_content(message.get("content"))} for message in keyed.get("messages", [])]
+    payload = json.dumps(keyed, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    """
+    キャッシュから返した応答。元の応答の属性はそのまま読めるが、cache_hit が True になる。
+    usage は元の呼び出しのものなので、トークン数の集計では数えない（is_cache_hit で判定する）。
+    """
+
+    cache_hit = True
+
+    def __init__(self, response):
+        self._response = response
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+
+def is_cache_hit(response) -> bool:
+    return getattr(response, "cache_hit", False) is True
+
+
+class _CachedCompletions:
+    def __init__(self, completions, cache: TTLCache):
+        self._completions = completions
+        self._cache = cache
+
+    def create(self, *, cache: bool = True, **params):
+        """
+        chat.completions.create と同じ引数を受け取る。同じキーの応答がキャッシュにあれば API を呼ばずに返す。
+        cache=False を渡した呼び出しと、ストリーミング・複数候補（n>1）の呼び出しはキャッシュしない。
+        """
+        if not cache or not LLM_CACHE_ENABLED or params.get("stream") or params.get("n", 1) != 1:
+            return self._completions.create(**params)
+
+        key = make_key(params)
+        model = params.get("model", "unknown")
+        cached = self._cache.get(key)
+        if cached is not None:
+            metrics.incr("llm_cache_hits", model=model)
+            usage = getattr(cached, "usage", None)
+            if usage is not None:
+                metrics.incr("llm_cache_saved_tokens", usage.total_tokens, model=model)
+            logger.debug(f"LLMの応答をキャッシュから返します ({model}, {key[:12]})")
+            return CachedResponse(cached)
+
+        metrics.incr("llm_cache_misses", model=model)
+        response = self._completions.create(**params)
+        # 途中で打ち切られた応答は使い回さない
+        if all(getattr(choice, "finish_reason", "stop") == "stop" for choice in response.choices):
+            self._cache.set(key, response)
+        return response
+
+
+class _CachedChat:
+    def __init__(self, chat, cache: TTLCache):
+        self._chat = chat
+        self.completions = _CachedCompletions(chat.completions, cache)
+
+    def __getattr__(self, name):
+        return getattr(self._chat, name)
+
+
+class CachedOpenAIClient:
+    """
+    OpenAI クライアントを包み、chat.completions.create の応答をプロセス内でキャッシュする。
+    それ以外の属性はそのまま元のクライアントに委譲する。
+    """
+
+    def __init__(self, client, cache: TTLCache = llm_cache):
+        self._client = client
+        self.chat = _CachedChat(client.chat, cache)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
@@ -0,0 +1,73 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    """プロセス内で計測値（カウンタ・タイマー・ゲージ）を集計する簡易レジストリ。"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._timers = {}
+        self._gauges = {}
+        self._collectors = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> str:
+        if not labels:
+            return name
+        label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+        return f"{name}{{{label_str}}}"
+
+    def incr(self, name: str, value: float = 1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            stat = self._timers.setdefault(key, {"count": 0, "total": 0.0, "max": 0.0})
+            stat["count"] += 1
+            stat["total"] += seconds
+            stat["max"] = max(stat["max"], seconds)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def register_collector(self, name: str, collect):
+        """snapshot() の度に呼び出され、その戻り値を name の下に格納する関数を登録する。"""
+        with self._lock:
+            self._collectors[name] = collect
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            timers = {
+                k: {**v, "avg": v["total"] / v["count"] if v["count"] else 0.0}
+                for k, v in self._timers.items()
+            }
+            result = {
+                "counters": dict(self._counters),
+                "timers": timers,
+                "gauges": dict(self._gauges),
+            }
+            collectors = list(self._collectors.items())
+        for name, collect in collectors:
+            try:
+                result[name] = collect()
+            except Exception as e:
+                result[name] = {"error": str(e)}
+        return result
+
+
+metrics = Metrics()
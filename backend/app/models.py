@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Date
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, JSON, Date, Index, Text
 from sqlalchemy.orm import relationship, declarative_base
 from sqlalchemy.sql import func
 
@@ -13,10 +13,15 @@ class User(Base):
     created_at = Column(DateTime, default=func.now())
     age = Column(Integer, nullable=True)
     gender = Column(String(50), nullable=True)
+    # ETag用のバージョン。服・好み・提案履歴を更新すると app.versioning が同じトランザクションで1つ上げる
+    wardrobe_version = Column(Integer, nullable=False, default=0, server_default='0')
+    preferences_version = Column(Integer, nullable=False, default=0, server_default='0')
+    history_version = Column(Integer, nullable=False, default=0, server_default='0')
 
     clothes = relationship("Cloth", back_populates="user")
     suggestions = relationship("OutfitSuggestion", back_populates="user")
     preferences = relationship("UserPreference", back_populates="user", uselist=False)
+    conversations = relationship("Conversation", back_populates="user")
 
 class Cloth(Base):
     __tablename__ = 'clothes'
@@ -32,9 +37,17 @@ class Cloth(Base):
     preferred = Column(Boolean, default=False)
     image_url = Column(String(255))
     vector = Column(JSON) # JSONとしてベクトルを保存。または別途ベクトルDBへ
+    index_status = Column(String(20)) # 画像のベクトル登録状況: 'pending', 'processing', 'indexed', 'failed'（画像なしはNULL）
+    has_derivatives = Column(Boolean, nullable=False, default=False, server_default='0') # サムネイル・中サイズのWebPを生成済みか
 
     user = relationship("User", back_populates="clothes")
 
+    # 一覧・検索は必ず user_id で絞り込むので、user_id を先頭にした複合インデックスを張る
+    __table_args__ = (
+        Index('ix_clothes_user_id_category', 'user_id', 'category'),
+        Index('ix_clothes_user_id_available', 'user_id', 'available'),
+    )
+
 class OutfitSuggestion(Base):
     __tablename__ = 'outfit_suggestions'
     id = Column(Integer, primary_key=True)
@@ -50,6 +63,11 @@ class OutfitSuggestion(Base):
     bottom = relationship("Cloth", foreign_keys=[bottom_id])
     shoes = relationship("Cloth", foreign_keys=[shoes_id])
 
+    # 履歴は (suggested_date, id) の降順でページングする
+    __table_args__ = (
+        Index('ix_outfit_suggestions_user_id_date_id', 'user_id', 'suggested_date', 'id'),
+    )
+
 class UserPreference(Base):
     __tablename__ = 'user_preferences'
     id = Column(Integer, primary_key=True)
@@ -59,4 +77,20 @@ class UserPreference(Base):
     disliked_colors = Column(String(255)) # 例: "赤,緑"
     disliked_styles = Column(String(255)) # 例: "カジュアル,パンク"
 
-    user = relationship("User", back_populates="preferences")
\ No newline at end of file
+    user = relationship("User", back_populates="preferences")
+
+class Conversation(Base):
+    __tablename__ = 'conversations'
+    id = Column(String(36), primary_key=True) # UUID。クライアントは conversation_id として送る
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    slots = Column(JSON) # これまでに集めたスロット（updated_slots を積み上げたもの）
+    messages = Column(JSON) # プロンプトに含める直近のやり取り [{"role", "content", ("prompt_tokens")}]
+    summary = Column(Text) # トークン数の上限を超えて messages から外した古いやり取りの要約
+    created_at = Column(DateTime, default=func.now())
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+
+    user = relationship("User", back_populates="conversations")
+
+    __table_args__ = (
+        Index('ix_conversations_user_id_updated_at', 'user_id', 'updated_at'),
+    )
@@ -0,0 +1,73 @@
+import base64
+import json
+
+# 一覧APIのページサイズ（?limit= で指定できる上限）
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# 次のページのカーソルを返すレスポンスヘッダー（最後のページでは付かない）
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def parse_limit(args, default: int = DEFAULT_PAGE_SIZE, maximum: int = MAX_PAGE_SIZE) -> int:
+    value = args.get("limit")
+    if value in (None, ""):
+        return default
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError("limit は整数で指定してください")
+    if limit < 1:
+        raise ValueError("limit は1以上で指定してください")
+    return min(limit, maximum)
+
+
+def parse_bool_arg(args, name: str) -> bool | None:
+    """?name=true/false を bool にする。指定がなければ None。"""
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    lowered = value.lower()
+    if lowered in ("true", "1"):
+        return True
+    if lowered in ("false", "0"):
+        return False
+    raise ValueError(f"{name} は true または false で指定してください")
+
+
+def encode_cursor(*values) -> str:
+    """ページの最後の行のソートキーを、クライアントがそのまま返せる不透明な文字列にする。"""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str | None, *converters) -> list | None:
+    """
+    encode_cursor の逆。converters はソートキーごとの変換関数（例: int）で、値の数も converters の数と一致する必要がある。
+    形式が不正・変換できない値のときは ValueError（呼び出し側で400にする）。
+    """
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise ValueError("cursor が不正です")
+    if not isinstance(values, list) or len(values) != len(converters):
+        raise ValueError("cursor が不正です")
+    try:
+        return [convert(value) for convert, value in zip(converters, values)]
+    except (TypeError, ValueError):
+        raise ValueError("cursor が不正です")
+
+
+def paginate(query, limit: int, cursor_of):
+    """
+    limit+1 件取得して次のページの有無を判定する。query は並び順を指定済みのもの。
+    (rows, next_cursor) を返す。next_cursor は cursor_of(最後の行) を encode_cursor したもの。
+    """
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*cursor_of(rows[-1]))
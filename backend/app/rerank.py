@@ -0,0 +1,244 @@
+import json
+import os
+from datetime import date
+
+from loguru import logger
+
+from app.llm_cache import is_cache_hit, record_prompt_usage
+from app.metrics import metrics
+
+# 検索候補からカテゴリごとに1つを選ぶ方法（/api/search/outfit の "rerank" でリクエストごとにも指定できる）
+#   llm_batch: 全カテゴリの候補を1回のLLM呼び出しでまとめて選ばせる（JSONで受け取る）
+#   llm      : カテゴリごとにLLMを呼び出す（カテゴリ数だけ呼び出しが発生する）
+#   local    : CLIPの類似度とメタデータ（色・季節・フォーマル度・お気に入り）のスコアで選ぶ（外部呼び出しなし）
+RERANK_STRATEGIES = ("llm_batch", "llm", "local")
+RERANK_STRATEGY = os.getenv("RERANK_STRATEGY", "llm_batch")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "gpt-4o")
+
+# local の各シグナルの重み。他のシグナルは一致=1・不一致=0・不明=0.5
+# 類似度は最上位の候補との差を LOCAL_SIMILARITY_SCALE で割って0〜1にする（CLIPの類似度は候補間の差が小さいため、
+# 候補内で最小〜最大に引き伸ばすとわずかな差でメタデータが効かなくなる）
+LOCAL_SIMILARITY_SCALE = float(os.getenv("LOCAL_SIMILARITY_SCALE", "0.05"))
+LOCAL_RERANK_WEIGHTS = {
+    "similarity": 1.0,
+    "color": 0.3,
+    "formality": 0.2,
+    "season": 0.15,
+    "preferred": 0.1,
+}
+
+# 要望に含まれる色の言い方と、Cloth.color に登録される色の対応
+COLOR_SYNONYMS = {
+    "白": ("白", "ホワイト", "white", "オフホワイト", "アイボリー"),
+    "黒": ("黒", "ブラック", "black"),
+    "グレー": ("グレー", "灰", "gray", "grey", "チャコール"),
+    "紺": ("紺", "ネイビー", "navy"),
+    "青": ("青", "ブルー", "blue", "水色", "デニム"),
+    "赤": ("赤", "レッド", "red", "ワイン", "ボルドー"),
+    "緑": ("緑", "グリーン", "green", "カーキ", "オリーブ"),
+    "茶": ("茶", "ブラウン", "brown", "キャメル"),
+    "ベージュ": ("ベージュ", "beige", "クリーム"),
+    "黄": ("黄", "イエロー", "yellow", "マスタード"),
+    "ピンク": ("ピンク", "pink"),
+    "紫": ("紫", "パープル", "purple", "ラベンダー"),
+}
+FORMAL_WORDS = ("フォーマル", "オフィス", "仕事", "ビジネス", "会議", "面接", "結婚式", "式典", "スーツ", "きれいめ", "上品", "formal", "office", "business")
+CASUAL_WORDS = ("カジュアル", "ラフ", "休日", "普段着", "部屋着", "リラックス", "アウトドア", "スポーツ", "casual")
+SEASON_WORDS = {
+    "春": ("春", "spring"),
+    "夏": ("夏", "summer", "暑い"),
+    "秋": ("秋", "autumn", "fall"),
+    "冬": ("冬", "winter", "寒い"),
+}
+
+
+def _record_usage(response, strategy: str):
+    # キャッシュから返した応答はAPIを呼んでいないので数えない
+    if is_cache_hit(response):
+        return
+    usage = getattr(response, "usage", None)
+    metrics.incr("rerank_llm_calls", strategy=strategy)
+    if usage is not None:
+        metrics.incr("rerank_llm_tokens", usage.total_tokens, strategy=strategy)
+        record_prompt_usage(usage, f"rerank_{strategy}")
+
+
+def select_one_with_llm(openai_client, category: str, query: str, candidates: list, timeout: float | None = None) -> tuple:
+    """
+    LLMに候補の中から要望に最も合うアイテムを1つ選ばせる。
+    (選んだ候補, status) を返す。IDが候補に無ければベクトル検索の最上位を返し、status は "fallback"。
+    """
+    # LLMへの入力（プロンプト）を作成
+    candidates_for_prompt = []
+    for i, item in enumerate(candidates):
+        meta = item.get('metadata', {})
+        candidates_for_prompt.append(
+            f"候補{i+1} (ID: {item.get('id')}):\n"
+            f"  - 説明: {meta.get('description', '説明なし')}\n"
+        )
+
+    prompt_text = (
+        f"あなたはプロのスタイリストです。ユーザーの要望に最も合う服を、以下の候補リストから1つだけ選んでください。\n\n"
+        f"## ユーザーの要望\n"
+        f"「{query}」\n\n"
+        f"## 服の候補リスト\n"
+        f"{''.join(candidates_for_prompt)}\n"
+        f"-----\n\n"
+        f"## あなたのタスク\n"
+        f"上記リストの中から最も要望に合う服の「ID」を一つだけ選び、そのIDの文字列を**完全にコピーして**回答してください。"
+        f"説明やID以外の言葉は一切含めないでください。"
+    )
+    logger.info(f"LLMへのプロンプト: {prompt_text}")
+
+    response = openai_client.chat.completions.create(
+        model=RERANK_MODEL,
+        messages=[{"role": "user", "content": prompt_text}],
+        max_tokens=60, # IDのみを返すため、トークン数は少なく設定
+        temperature=0, # 再現性を高めるために0に設定
+        timeout=timeout,
+    )
+    _record_usage(response, "llm")
+    best_item_id = response.choices[0].message.content.strip()
+    logger.success(f"LLMが選択したID ({category}): {best_item_id}")
+
+    # 選択されたIDを元に、元の検索結果から完全な情報を取得
+    best_item = next((item for item in candidates if item.get('id') == best_item_id), None)
+    # LLMがIDを正しく返さなかった場合のフォールバックとして、ベクトル検索のスコアが最も高いものを採用
+    if not best_item:
+        logger.warning(f"LLMが返したID '{best_item_id}' が候補に存在しません。ベクトル検索の最上位の結果を返します。")
+        return candidates[0], "fallback"
+    return best_item, "ok"
+
+
+BATCH_SYSTEM_PROMPT = (
+    "あなたはプロのスタイリストです。カテゴリごとに、ユーザーの要望に最も合う服を候補の中から1つずつ選んでください。\n"
+    "入力はJSONで、categories の各カテゴリに request（ユーザーの要望）と candidates（{id: 説明}）が入っています。\n"
+    "出力は {\"selections\": {\"<カテゴリ>\": \"<選んだ候補のid>\"}} の形のJSONだけにしてください。"
+    "id は候補の id を完全にコピーし、入力にあるすべてのカテゴリについて1つずつ選んでください。"
+)
+
+
+def select_all_with_llm(openai_client, queries: dict, candidates: dict, timeout: float | None = None) -> dict:
+    """
+    全カテゴリの候補を1回のLLM呼び出しで選ばせる。{category: (選んだ候補, status)} を返す。
+    返ってきたIDは候補と照合し、候補に無い・選ばれなかったカテゴリはベクトル検索の最上位にする（status は "fallback"）。
+    """
+    # 候補は {id: 説明} の形にして、候補ごとにキー名を繰り返さないようにする
+    payload = {"categories": {
+        category: {
+            "request": queries[category],
+            "candidates": {str(item.get('id')): item.get('metadata', {}).get('description', '説明なし') for item in items},
+        } for category, items in candidates.items()
+    }}
+    response = openai_client.chat.completions.create(
+        model=RERANK_MODEL,
+        messages=[
+            {"role": "system", "content": BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": json.dumps(payload, ensure_ascii=False, separators=(",", ":"))},
+        ],
+        response_format={"type": "json_object"},
+        max_tokens=30 * len(candidates) + 20, # カテゴリごとにIDを1つ返すだけなので少なくてよい
+        temperature=0,
+        timeout=timeout,
+    )
+    _record_usage(response, "llm_batch")
+
+    try:
+        selections = json.loads(response.choices[0].message.content).get("selections", {})
+    except (json.JSONDecodeError, AttributeError) as e:
+        logger.warning(f"LLMの応答をJSONとして読めませんでした: {e}")
+        selections = {}
+    if not isinstance(selections, dict):
+        selections = {}
+
+    results = {}
+    for category, items in candidates.items():
+        selected_id = selections.get(category)
+        best_item = next((item for item in items if item.get('id') == str(selected_id)), None) if selected_id is not None else None
+        if best_item is None:
+            logger.warning(f"LLMが返したID '{selected_id}' が'{category}'の候補に存在しません。ベクトル検索の最上位の結果を返します。")
+            results[category] = (items[0], "fallback")
+        else:
+            results[category] = (best_item, "ok")
+    return results
+
+
+def _color_family(text: str) -> set:
+    lowered = text.lower()
+    return {family for family, words in COLOR_SYNONYMS.items() if any(word.lower() in lowered for word in words)}
+
+
+def _wants_formal(query: str) -> bool | None:
+    lowered = query.lower()
+    if any(word.lower() in lowered for word in FORMAL_WORDS):
+        return True
+    if any(word.lower() in lowered for word in CASUAL_WORDS):
+        return False
+    return None
+
+
+def _season_of(today: date) -> str:
+    return {12: "冬", 1: "冬", 2: "冬", 3: "春", 4: "春", 5: "春", 6: "夏", 7: "夏", 8: "夏"}.get(today.month, "秋")
+
+
+def _wanted_season(query: str, today: date) -> str:
+    lowered = query.lower()
+    for season, words in SEASON_WORDS.items():
+        if any(word in lowered for word in words):
+            return season
+    return _season_of(today)
+
+
+def local_scores(query: str, candidates: list, preferred_ids: set = frozenset(), today: date | None = None) -> list:
+    """候補ごとのシグナル（0〜1）と重み付きの合計を、candidates と同じ順番で返す。"""
+    today = today or date.today()
+    scores = [item.get('score') or 0.0 for item in candidates]
+    top = max(scores)
+    wanted_colors = _color_family(query)
+    wants_formal = _wants_formal(query)
+    season = _wanted_season(query, today)
+
+    results = []
+    for item, score in zip(candidates, scores):
+        meta = item.get('metadata', {})
+        item_colors = _color_family(str(meta.get('color', '')))
+        item_season = str(meta.get('season') or 'unknown')
+        signals = {
+            "similarity": max(0.0, 1.0 - (top - score) / LOCAL_SIMILARITY_SCALE),
+            "color": 0.5 if not wanted_colors or not item_colors else float(bool(wanted_colors & item_colors)),
+            "formality": 0.5 if wants_formal is None else float(bool(meta.get('is_formal')) == wants_formal),
+            "season": 0.5 if item_season == 'unknown' else float(season in item_season),
+            "preferred": float(str(item.get('id')) in preferred_ids),
+        }
+        total = sum(LOCAL_RERANK_WEIGHTS[name] * value for name, value in signals.items())
+        results.append({"signals": signals, "total": total})
+    return results
+
+
+def select_all_locally(queries: dict, candidates: dict, preferred_ids: set = frozenset(), today: date | None = None) -> dict:
+    """
+    CLIPの類似度とメタデータのスコアで全カテゴリの候補から1つずつ選ぶ。{category: (選んだ候補, "ok")} を返す。
+    同点の場合はベクトル検索の順位が高い方を選ぶので、同じ入力には常に同じ結果を返す。
+    """
+    results = {}
+    for category, items in candidates.items():
+        scored = local_scores(queries[category], items, preferred_ids, today)
+        best = max(range(len(items)), key=lambda i: (scored[i]["total"], -i))
+        results[category] = (items[best], "ok")
+    return results
+
+
+def load_preferred_ids(ids: list) -> set:
+    """候補のうちお気に入りに登録されている服のID（ベクトルストアのメタデータには無いのでDBから読む）。"""
+    from app.database import SessionLocal
+    from app.models import Cloth
+
+    numeric_ids = [int(i) for i in ids if str(i).isdigit()]
+    if not numeric_ids:
+        return set()
+    session = SessionLocal()
+    try:
+        rows = session.query(Cloth.id).filter(Cloth.id.in_(numeric_ids), Cloth.preferred == True).all()  # noqa: E712
+        return {str(row.id) for row in rows}
+    finally:
+        session.close()
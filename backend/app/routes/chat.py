@@ -1,22 +1,21 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required
-from app.utils import initialize_services, get_weather_info
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils import get_weather_info
+from app.services import services
+from app.database import SessionLocal, get_db_session
+from app.conversation import get_conversation, trim_history, summarize_dropped, history_for_prompt, record_turn, turn_usage
+from app.metrics import metrics
+from app.llm_cache import is_cache_hit, record_prompt_usage
+from app.json_stream import JsonStringFieldExtractor
 import json
+import time
 from loguru import logger
 
 chat_bp = Blueprint('chat', __name__)
 
-try:
-    _, _, _, openai_client = initialize_services()
-except Exception as e:
-    print(f"サービス初期化エラー: {e}")
-    openai_client = None
-
-def create_iterative_system_prompt(weather_info: str = None) -> str:
-    """
-    AIに「提案」と「次の質問」を強制的に分離・生成させるためのシステムプロンプト。
-    """
-    return f"""
+# システムプロンプトは毎回同じ文字列にして、会話の先頭を固定する（OpenAI のプロンプトキャッシュは先頭一致で効く）。
+# 天気やスロットのようにリクエストごとに変わる情報は、create_context_message で最後に別のメッセージとして渡す
+SYSTEM_PROMPT = """
 あなたは、ユーザーに最適な服装を提案する、非常に優秀なファッションアドバイザーです。
 あなたのゴールは、対話を通じてユーザーの状況を完全に理解し、完璧なコーディネートを提案することです。
 
@@ -26,16 +25,15 @@ def create_iterative_system_prompt(weather_info: str = None) -> str:
 2.  **出力**: 下記のJSON形式に従って、思考の結果を出力する。
 
 # 出力形式 (必ずこのJSON形式で出力すること)
-{{
+{
   "text": "(コーデ提案を含む)ユーザーへの親しみやすいメッセージ",
   "next_question": "(次に聞くべき)ユーザーへの具体的な質問文",
-  "suggestion_items": {{
+  "suggestion_items": {
       "tops": "提案するトップスのアイテム名"（デフォルトは白の無地T）,
       "bottoms": "提案するボトムスのアイテム名"(デフォルトはジーンズ),
       "shoes": "提案する靴のアイテム名（デフォルトはスニーカー）"
-  }},
-  weather_info: "{weather_info["weather"][0]["description"]}" if weather_info else "現在の天気情報はありません",
-  "updated_slots": {{
+  },
+  "updated_slots": {
       "date": "収集した日付情報 or null",
       "location_geo": "収集した地理情報 or null",
       "location_type": "収集した場所の性質 or null",
@@ -44,66 +42,156 @@ def create_iterative_system_prompt(weather_info: str = None) -> str:
       "companion_style": "収集した相手の好み or null",
       "transport": "収集した移動手段 or null",
       "daily_plan": "収集した計画 or null"
-  }},
+  },
   "type": "suggestion" | "final_suggestion"
-}}
+}
 
 # 各フィールドの説明
 - `text`: 提案の枕詞や感想などをここに記述します。コーデ提案の内容もここに含めてください。
 - `next_question`: **必須項目。** コーデを洗練させるために、次に追加で聞きたい質問を一つだけ、ここに記述します。ユーザーが「確定」と言わない限り、必ず何か質問を入れてください。
 - `suggestion_items`: **必須項目。** トップス、ボトムス、靴を必ず提案してください。ワンピース等はtopsとbottomsに同じ名前を入れてください。
 - `updated_slots`: ユーザーから得た情報をここに更新してください。新しい情報がない場合は、nullを入れてください。
-- `weather_info`: 今日の天気情報です。コーデの提案の際に活用してください。
 - `type`: ユーザーが「確定」「それがいい」など明確な同意を示した場合のみ `"final_suggestion"` としてください。それ以外は常に `"suggestion"` です。
 
+# 現在の状況
+会話の最後（ユーザーの最新の発言の直前）に「# 現在の状況」として、当日の天気と収集済みのスロットを渡します。
+天気はコーデの提案の際に活用し、スロットは updated_slots を更新する際の元にしてください。
+
 # 例
 ユーザー発言: 「明日の夜、出かける予定です。」
 あなたの出力:
-{{
+{
   "text": "明日の夜ですね、承知いたしました。夜は少し肌寒いかもしれませんので、長袖のブラウスにきれいめのパンツを合わせたスタイルはいかがでしょうか？",
   "next_question": "どちらへお出かけになりますか？",
-  "suggestion_items": {{ "tops": "長袖のブラウス", "bottoms": "きれいめのパンツ", "shoes": "フラットシューズ" }},
-  "updated_slots": {{ "date": "明日の夜", "location_geo": null, ... }},
+  "suggestion_items": { "tops": "長袖のブラウス", "bottoms": "きれいめのパンツ", "shoes": "フラットシューズ" },
+  "updated_slots": { "date": "明日の夜", "location_geo": null, ... },
   "type": "suggestion"
-}}
+}
 """
 
-@chat_bp.route('/api/propose', methods=['POST'])
-@jwt_required()
-def propose_outfit():
-    if not openai_client:
-        return jsonify({"message": "OpenAIクライアントが初期化されていません。"}), 503
 
-    data = request.json
-    current_slots = data.get('slots', {})
-    user_message = data.get('message')
-    history = data.get('history', [])
+def describe_weather(weather_info: dict | None) -> str:
+    """get_weather_info の戻り値（日ごとの予報、または取得失敗時の {"temperature", "condition"}）を短い説明にする。"""
+    if not weather_info:
+        return "現在の天気情報はありません"
+    if weather_info.get("weather"):
+        description = weather_info["weather"][0].get("description", "")
+        temp = weather_info.get("temp")
+        # 予報APIは単位を指定していないのでケルビンで返ってくる
+        if isinstance(temp, dict) and temp.get("min") is not None and temp.get("max") is not None:
+            return f"{description}（最低 {temp['min'] - 273.15:.0f}℃ / 最高 {temp['max'] - 273.15:.0f}℃）"
+        return description
+    if weather_info.get("condition") not in (None, "不明"):
+        temperature = weather_info.get("temperature")
+        return f"{weather_info['condition']}（{temperature}℃）" if temperature is not None else weather_info["condition"]
+    return "現在の天気情報はありません"
 
-    if not user_message:
-        return jsonify({"message": "メッセージは必須です。"}), 400
-    
+
+def create_context_message(weather_info: dict | None, current_slots: dict) -> dict:
+    """リクエストごとに変わる情報（天気・スロット）をまとめた短い system メッセージ。"""
+    return {
+        "role": "system",
+        "content": f"# 現在の状況\n- 天気: {describe_weather(weather_info)}\n- スロット: {json.dumps(current_slots or {}, ensure_ascii=False)}",
+    }
+
+PROPOSE_MODEL = "gpt-4o-mini"
+
+
+def _build_propose_messages(current_slots: dict, history: list, user_message: str) -> list:
+    """スロット・会話履歴・ユーザーの発言から、OpenAI に送るメッセージのリストを作る。"""
     weather_info = get_weather_info(('Kyoto, Japan'), 1)
-    logger.info(weather_info["weather"][0]["description"])
+    logger.info(f"天気: {describe_weather(weather_info)}")
+    # 固定のシステムプロンプト → 会話履歴 → 今回の状況 → 最新の発言 の順にして、先頭ほど変わらないようにする
     messages_for_api = [
-        {"role": "system", "content": create_iterative_system_prompt(weather_info=weather_info)},
+        {"role": "system", "content": SYSTEM_PROMPT},
     ]
     # 過去の履歴をコンテキストに含める
     if history:
         messages_for_api.extend(history)
     
-    # 最新のユーザーメッセージと現在の状態を伝える
+    # 現在の状態と最新のユーザーメッセージを伝える
+    messages_for_api.append(create_context_message(weather_info, current_slots))
     messages_for_api.append({
         "role": "user",
-        "content": f"現在の情報：{current_slots}\n\nユーザーの発言：「{user_message}」"
+        "content": f"ユーザーの発言：「{user_message}」"
     })
+    return messages_for_api
+
+
+def _prepare_turn(data: dict, user_id: int, openai_client) -> tuple:
+    """
+    会話を読み込み（conversation_id が無ければ作り）、履歴をトークン数の上限に収めてから、送るメッセージを組み立てる。
+    要約・天気の取得・LLMの応答を待つ間にDB接続を握らないよう、DBの読み書きは短いトランザクションに分けて先にコミットする。
+    (conversation_id, メッセージ, 外したメッセージ数) を返す。
+    """
+    session = get_db_session()
+    conversation = get_conversation(session, data.get('conversation_id'), user_id, data.get('slots'), data.get('history'))
+    if conversation is None:
+        raise LookupError(data.get('conversation_id'))
+    dropped = trim_history(conversation)
+    conversation_id, summary = conversation.id, conversation.summary
+    session.commit()
+
+    # 外したやり取りの要約はトランザクションの外でLLMに作らせ、できたら保存し直す
+    new_summary = summarize_dropped(openai_client, summary, dropped)
+    conversation = get_conversation(session, conversation_id, user_id)
+    if new_summary is not None:
+        conversation.summary = new_summary
+    current_slots, history = dict(conversation.slots or {}), history_for_prompt(conversation)
+    session.commit()
+
+    messages_for_api = _build_propose_messages(current_slots, history, data['message'])
+    return conversation_id, messages_for_api, len(dropped)
+
+
+def _save_turn(session, conversation_id: str, user_id: int, user_message: str, result: dict, usage, cache_hit: bool = False) -> dict:
+    # キャッシュから返した応答の usage は元の呼び出しのものなので、このターンのトークン数としては記録しない
+    if cache_hit:
+        usage = None
+    conversation = get_conversation(session, conversation_id, user_id)
+    record_turn(conversation, user_message, result, usage)
+    session.commit()
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", None), "completion_tokens": getattr(usage, "completion_tokens", None),
+        "cache_hit": cache_hit,
+        **record_prompt_usage(usage, "propose"),
+    }
+
+
+@chat_bp.route('/api/propose', methods=['POST'])
+@jwt_required()
+def propose_outfit():
+    """
+    会話は conversation_id ごとにサーバー側で保持する（履歴・スロットを毎回送る必要はない）。
+    conversation_id を省略すると新しい会話を始め、応答の conversation_id で続きを送る。
+    """
+    try:
+        openai_client = services["openai_client"]
+    except Exception as e:
+        print(f"サービス初期化エラー: {e}")
+        return jsonify({"message": "OpenAIクライアントが初期化されていません。"}), 503
+
+    data = request.json
+    if not data.get('message'):
+        return jsonify({"message": "メッセージは必須です。"}), 400
+    user_id = int(get_jwt_identity())
+    try:
+        conversation_id, messages_for_api, compacted = _prepare_turn(data, user_id, openai_client)
+    except LookupError:
+        return jsonify({"message": "会話が見つかりません。"}), 404
 
     try:
         response = openai_client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=PROPOSE_MODEL,
             messages=messages_for_api,
-            response_format={"type": "json_object"}
+            response_format={"type": "json_object"},
+            # 会話の続きなので、同じ内容の発言でも前の応答を使い回さずに毎回生成する
+            cache=False,
         )
         ai_response_json = json.loads(response.choices[0].message.content)
+        usage = _save_turn(get_db_session(), conversation_id, user_id, data['message'], ai_response_json, response.usage, is_cache_hit(response))
+        ai_response_json["conversation_id"] = conversation_id
+        ai_response_json["_meta"] = {**usage, "compacted_messages": compacted}
         return jsonify(ai_response_json), 200
 
     except json.JSONDecodeError as e:
@@ -111,4 +199,101 @@ def propose_outfit():
         return jsonify({"message": "AIからの応答形式が正しくありません。"}), 500
     except Exception as e:
         print(f"提案の生成中にエラーが発生しました: {e}")
-        return jsonify({"message": "提案の生成中にエラーが発生しました。"}), 500
\ No newline at end of file
+        return jsonify({"message": "提案の生成中にエラーが発生しました。"}), 500
+
+
+@chat_bp.route('/api/conversations/<conversation_id>', methods=['GET'])
+@jwt_required()
+def get_conversation_state(conversation_id):
+    """会話の状態（スロット・要約・直近のやり取り）と、ターンごとのトークン数を返す。"""
+    conversation = get_conversation(get_db_session(), conversation_id, int(get_jwt_identity()))
+    if conversation is None:
+        return jsonify({"message": "会話が見つかりません。"}), 404
+    return jsonify({
+        "conversation_id": conversation.id,
+        "slots": conversation.slots or {},
+        "summary": conversation.summary,
+        "messages": [{"role": m["role"], "content": m["content"]} for m in conversation.messages or []],
+        "turns": turn_usage(conversation),
+    }), 200
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@chat_bp.route('/api/propose/stream', methods=['POST'])
+@jwt_required()
+def propose_outfit_stream():
+    """
+    /api/propose のストリーミング版（Server-Sent Events）。最初に `event: conversation` で会話IDを送り、
+    生成中のJSONから "text" の値を取り出して届いた分だけ `event: text` で送り、
+    生成が終わったら応答全体（suggestion_items・updated_slots 等）を `event: result` で送る。失敗時は `event: error`。
+    """
+    started = time.perf_counter()
+    try:
+        openai_client = services["openai_client"]
+    except Exception as e:
+        logger.error(f"サービス初期化エラー: {e}")
+        return jsonify({"message": "OpenAIクライアントが初期化されていません。"}), 503
+
+    data = request.json
+    if not data.get('message'):
+        return jsonify({"message": "メッセージは必須です。"}), 400
+    user_id = int(get_jwt_identity())
+    try:
+        conversation_id, messages_for_api, compacted = _prepare_turn(data, user_id, openai_client)
+    except LookupError:
+        return jsonify({"message": "会話が見つかりません。"}), 404
+
+    def generate():
+        extractor = JsonStringFieldExtractor("text")
+        content = []
+        first_byte = None
+        usage = None
+        # 生成中にも会話IDを知らせておく（途中で切れても続きを送れるように）
+        yield _sse("conversation", {"conversation_id": conversation_id})
+        try:
+            stream = openai_client.chat.completions.create(
+                model=PROPOSE_MODEL,
+                messages=messages_for_api,
+                response_format={"type": "json_object"},
+                stream=True,
+                stream_options={"include_usage": True},
+                cache=False,
+            )
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                content.append(delta)
+                text = extractor.feed(delta)
+                if text:
+                    if first_byte is None:
+                        first_byte = time.perf_counter() - started
+                        metrics.observe("propose_stream_ttfb_seconds", first_byte)
+                    yield _sse("text", {"text": text})
+            result = json.loads("".join(content))
+            # レスポンスを返し終えた後にも動くので、リクエストのセッションではなく専用のセッションで保存する
+            session = SessionLocal()
+            try:
+                saved_usage = _save_turn(session, conversation_id, user_id, data['message'], result, usage)
+            finally:
+                session.close()
+            yield _sse("result", {**result, "conversation_id": conversation_id, "_meta": {**saved_usage, "compacted_messages": compacted}})
+            metrics.incr("propose_stream_responses", status="ok")
+        except json.JSONDecodeError as e:
+            logger.error(f"JSONパースエラー: {e}\nレスポンス: {''.join(content)}")
+            metrics.incr("propose_stream_responses", status="error")
+            yield _sse("error", {"message": "AIからの応答形式が正しくありません。"})
+        except Exception as e:
+            logger.error(f"提案の生成中にエラーが発生しました: {e}")
+            metrics.incr("propose_stream_responses", status="error")
+            yield _sse("error", {"message": "提案の生成中にエラーが発生しました。"})
+        finally:
+            metrics.observe("propose_stream_seconds", time.perf_counter() - started)
+
+    # プロキシ（nginx）にバッファリングさせず、届いた分をすぐにクライアントへ流す
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -1,35 +1,44 @@
 import os
+import json
+import time
 import uuid
-import boto3
-import openai
-from botocore.client import Config
+import zipfile
+import mimetypes
 from botocore.exceptions import NoCredentialsError
 from flask import Blueprint, request, jsonify, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.utils import secure_filename
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.database import get_db_session
 from app.models import Cloth
+from sqlalchemy.orm import load_only
 
 # Pinecone関連のユーティリティをインポート
-from app.utils import initialize_services, upload_image_to_pinecone, search_items_for_user
+from app.utils import embed_texts
+from app.rerank import RERANK_STRATEGY, RERANK_STRATEGIES
+from app.search import find_outfit_matches
+from app.services import services
+from app.ingest import submit_cloth_ingest, upload_original, spool_to_tempfile, discard_tempfile, job_status, import_clothes_bulk, INDEX_PENDING, BULK_IMPORT_MAX_ITEMS
+from app.images import derivative_urls
+from app.pagination import parse_limit, parse_bool_arg, decode_cursor, paginate, NEXT_CURSOR_HEADER
+from app.versioning import current_etag, not_modified, with_etag, bump_version, WARDROBE, HISTORY, HISTORY_CLOTH_ATTRIBUTES
 from PIL import Image
-from io import BytesIO
 from loguru import logger # デバッグ用のロギングを有効にするため
 
 clothing_bp = Blueprint('clothing', __name__)
 
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+BULK_MAX_IMAGE_BYTES = int(os.getenv("BULK_MAX_IMAGE_BYTES", str(20 * 1024 * 1024))) # 一括登録の1画像あたりの上限
+BULK_MAX_TOTAL_BYTES = int(os.getenv("BULK_MAX_TOTAL_BYTES", str(200 * 1024 * 1024))) # 一括登録の1リクエスト（zipは展開後）の上限
 
-# ブループリントが作成された際に一度Pineconeサービスを初期化する
-# より大規模なアプリケーションでは、app.pyや専用のサービスレイヤーで初期化を検討してください
-try:
-    clip_model, clip_processor, pinecone_index, _ = initialize_services()
-    logger.info("clothing_bpでPineconeとCLIPサービスが初期化されました。")
-except Exception as e:
-    logger.error(f"clothing_bpでPineconeとCLIPサービスの初期化に失敗しました: {e}")
-    clip_model = None
-    clip_processor = None
-    pinecone_index = None
+
+class BulkPayloadTooLarge(ValueError):
+    """一括登録の画像・リクエストが大きすぎる（413を返す）。"""
+
+
+def _discard_bulk_files(files: list):
+    for _, path, _ in files:
+        discard_tempfile(path)
 
 def allowed_file(filename):
     """許可された拡張子のファイルかチェックする"""
@@ -41,9 +50,11 @@ def allowed_file(filename):
 def add_cloth():
     """
     服の情報を登録する。画像ファイルが添付されていれば、ユニークなファイル名を生成して
-    MinIOにアップロードし、そのURLをDBに保存し、Pineconeにも画像ベクトルを登録する。
+    MinIOにアップロードし、そのURLをDBに保存する。画像ベクトルの登録はバックグラウンドで行い、
+    202とジョブID（/api/clothes/jobs/<job_id> で状態を確認できる）を返す。
     """
     session = get_db_session()
+    image_path = None
     try:
         current_user_id = get_jwt_identity()
 
@@ -58,7 +69,6 @@ def add_cloth():
             return jsonify({"message": "服の名前とカテゴリは必須です"}), 400
 
         image_url = None
-        image_bytes = None
         
         if 'image' in request.files:
             file = request.files['image']
@@ -70,64 +80,15 @@ def add_cloth():
                 # UUIDを使ってユニークなファイル名を生成
                 unique_filename = f"{uuid.uuid4()}{extension}"
                 
-                # MinIOへの接続情報を取得
-                s3_endpoint = os.environ.get('S3_ENDPOINT_URL')
-                s3_key = os.environ.get('S3_ACCESS_KEY')
-                s3_secret = os.environ.get('S3_SECRET_KEY')
-                s3_bucket = os.environ.get('S3_BUCKET_NAME')
-
-                s3_client = boto3.client(
-                    's3',
-                    endpoint_url=s3_endpoint,
-                    aws_access_key_id=s3_key,
-                    aws_secret_access_key=s3_secret,
-                    config=Config(signature_version='s3v4')
-                )
-                
-                # ファイルの内容をメモリに読み込む
-                image_bytes = file.read()
-                file.seek(0) # upload_fileobjのためにファイルポインタを先頭に戻す
-
-                # ユニークなファイル名でMinIOにアップロード
-                s3_client.upload_fileobj(
-                    BytesIO(image_bytes), # BytesIOを使用してメモリからアップロード
-                    s3_bucket,
-                    unique_filename,
-                    ExtraArgs={'ContentType': file.content_type}
-                )
-                
+                # werkzeug が受け取ったストリームをそのままMinIOに送る（シークできない場合だけ一時ファイルを経由し、
+                # その一時ファイルはベクトル化ジョブが削除する）
+                image_path = upload_original(file, unique_filename)
+
                 # 公開URLもユニークなファイル名で生成
                 image_url = f"{unique_filename}"
                 logger.info(f"MinIOに画像をアップロードしました: {image_url}")
 
-                # Pineconeへのアップロード処理
-                if clip_model and clip_processor and pinecone_index and image_bytes:
-                    item_metadata = {
-                        "name": name,
-                        "category": category,
-                        "color": color,
-                        "material": material if material else "unknown", # materialが空の場合は"unknown"を設定
-                        "season": season if season else "unknown", # seasonが空の場合は"unknown"を設定
-                        "is_formal": is_formal if is_formal is not None else False, # is_formalが空の場合はFalseを設定
-                        "description": f"{color}の{material}製の{name} ({category})" # CLIP検索用の説明
-                    }
-                    pinecone_upload_result = upload_image_to_pinecone(
-                        image_bytes=image_bytes,
-                        user_id=current_user_id, # user_idを文字列で渡す
-                        item_metadata=item_metadata,
-                        index=pinecone_index,
-                        model=clip_model,
-                        processor=clip_processor,
-                        image_url=image_url
-                    )
-                    if pinecone_upload_result.get("success"):
-                        logger.success(f"項目ID {pinecone_upload_result.get('item_id')} の画像ベクトルがPineconeにアップロードされました")
-                    else:
-                        logger.error(f"Pineconeへの画像ベクトルのアップロードに失敗しました: {pinecone_upload_result.get('error')}")
-                else:
-                    logger.warning("Pineconeサービスが完全に初期化されていないか、画像データがありません。Pineconeへのアップロードをスキップします。")
-        
-        # Clothオブジェクトを作成
+        # Clothオブジェクトを作成してコミットし、ベクトル化はバックグラウンドで行う
         new_cloth = Cloth(
             user_id=int(current_user_id),
             name=name,
@@ -136,47 +97,223 @@ def add_cloth():
             material=material,
             season=season,
             is_formal=is_formal,
-            image_url=image_url
-            # vectorフィールドはmodels.pyにあるが、Pineconeを使用するためDBには保存しない（またはPineconeのIDを保存する）
-            # ここではvectorを直接DBに保存しないことを想定
+            image_url=image_url,
+            index_status=INDEX_PENDING if image_url else None
         )
-
         session.add(new_cloth)
         session.commit()
         session.refresh(new_cloth) # DBから最新の状態を読み込む
 
+        cloth_json = {
+            "id": new_cloth.id,
+            "name": new_cloth.name,
+            "image_url": new_cloth.image_url
+        }
+        if not image_url:
+            return jsonify({"message": "服が正常に追加されました", "cloth": cloth_json}), 201
+
+        submit_cloth_ingest(new_cloth.id, image_path)
+        image_path = None # 以降の削除はジョブ側の責務
         return jsonify({
-            "message": "服が正常に追加されました", 
-            "cloth": {
-                "id": new_cloth.id,
-                "name": new_cloth.name,
-                "image_url": new_cloth.image_url
-            }
-        }), 201
+            "message": "服が正常に追加されました。画像は検索できるようになるまで少し時間がかかります",
+            "cloth": cloth_json,
+            "job_id": new_cloth.id,
+            "status_url": f"/api/clothes/jobs/{new_cloth.id}"
+        }), 202
 
     except Exception as e:
         session.rollback()
         logger.error(f"add_clothでエラーが発生しました: {e}")
+        if image_path:
+            discard_tempfile(image_path)
         return jsonify({"message": f"エラーが発生しました: {e}"}), 500
 
 
+def _parse_bulk_metadata(raw) -> list:
+    """metadata（JSON配列）を読み込み、要素がすべてオブジェクトであることを確かめる。"""
+    metadata_list = json.loads(raw or '[]')
+    if not isinstance(metadata_list, list) or not all(isinstance(m, dict) for m in metadata_list):
+        raise ValueError("metadata はオブジェクトの配列で指定してください")
+    return metadata_list
+
+
+def _add_bulk_file(files: list, name: str, source, content_type: str, total: int) -> int:
+    """source を一時ファイルに書き出して files に追加し、これまでの合計バイト数を返す。上限を超えたら例外。"""
+    if len(files) >= BULK_IMPORT_MAX_ITEMS:
+        raise ValueError(f"一度に登録できるのは{BULK_IMPORT_MAX_ITEMS}件までです")
+    # 上限+1バイトまでしか書き出さないので、大きなファイルでもディスクを使い切らずに弾ける
+    path, size = spool_to_tempfile(source, os.path.splitext(name)[1].lower(), min(BULK_MAX_IMAGE_BYTES, BULK_MAX_TOTAL_BYTES - total))
+    files.append((name, path, content_type))
+    if size > BULK_MAX_IMAGE_BYTES:
+        raise BulkPayloadTooLarge(f"{name} が大きすぎます（上限 {BULK_MAX_IMAGE_BYTES} バイト）")
+    if total + size > BULK_MAX_TOTAL_BYTES:
+        raise BulkPayloadTooLarge(f"画像の合計が大きすぎます（上限 {BULK_MAX_TOTAL_BYTES} バイト）")
+    return total + size
+
+
+def _collect_bulk_items():
+    """
+    一括登録リクエストから (filename, path, content_type, metadata) のリストを作る。画像は1枚ずつ一時ファイルに書き出す。
+    - multipart: 'images' に複数ファイル、'metadata' にJSON配列（filename で対応付け、なければ順番通り）
+    - zip: 'archive' にzipファイル。メタデータは zip 内の metadata.json または 'metadata' フィールド
+    件数が BULK_IMPORT_MAX_ITEMS を超えたら ValueError、1画像が BULK_MAX_IMAGE_BYTES・合計が BULK_MAX_TOTAL_BYTES を
+    超えたら BulkPayloadTooLarge（それまでに書き出した一時ファイルは削除する）。
+    """
+    metadata_list = _parse_bulk_metadata(request.form.get('metadata'))
+    files = []
+    total = 0
+
+    try:
+        if 'archive' in request.files:
+            with zipfile.ZipFile(request.files['archive']) as archive:
+                for info in archive.infolist():
+                    name = os.path.basename(info.filename)
+                    if info.is_dir() or info.filename.startswith('__MACOSX/') or not name:
+                        continue
+                    if name == 'metadata.json':
+                        metadata_list = _parse_bulk_metadata(archive.read(info))
+                    elif allowed_file(name):
+                        with archive.open(info) as source:
+                            total = _add_bulk_file(files, name, source, mimetypes.guess_type(name)[0] or 'application/octet-stream', total)
+        else:
+            for file in request.files.getlist('images'):
+                if file and file.filename and allowed_file(file.filename):
+                    total = _add_bulk_file(files, file.filename, file.stream, file.content_type, total)
+    except Exception:
+        _discard_bulk_files(files)
+        raise
+
+    by_filename = {m.get('filename'): m for m in metadata_list if m.get('filename')}
+    items = []
+    for i, (filename, path, content_type) in enumerate(files):
+        meta = by_filename.get(filename) or (metadata_list[i] if i < len(metadata_list) and not metadata_list[i].get('filename') else {})
+        items.append({"filename": filename, "path": path, "content_type": content_type, "metadata": meta})
+    return items
+
+
+@clothing_bp.route('/api/clothes/bulk', methods=['POST'])
+@jwt_required()
+def add_clothes_bulk():
+    """
+    複数の服を画像付きで一括登録する（multipart または zip）。
+    画像は並列にデコードし、CLIPでバッチ単位にベクトル化してまとめて登録する。アイテムごとの結果を返す。
+    """
+    session = get_db_session()
+    try:
+        current_user_id = get_jwt_identity()
+        # フォームを解析する前に上限を設定する（multipart の解析でも werkzeug が一時ファイルに書き出すため）。
+        # Content-Length が上限を超えていれば読まずに、chunked なら読みながら RequestEntityTooLarge になる
+        request.max_content_length = BULK_MAX_TOTAL_BYTES
+        try:
+            items = _collect_bulk_items()
+        except RequestEntityTooLarge:
+            return jsonify({"message": f"リクエストが大きすぎます（上限 {BULK_MAX_TOTAL_BYTES} バイト）"}), 413
+        except BulkPayloadTooLarge as e:
+            return jsonify({"message": str(e)}), 413
+        except (ValueError, zipfile.BadZipFile) as e:
+            return jsonify({"message": f"リクエストの形式が正しくありません: {e}"}), 400
+
+        if not items:
+            return jsonify({"message": "登録できる画像が含まれていません"}), 400
+
+        results = import_clothes_bulk(session, int(current_user_id), items)
+        imported = sum(1 for r in results if r["success"])
+        return jsonify({
+            "message": f"{imported}件の服を登録しました",
+            "imported": imported,
+            "failed": len(results) - imported,
+            "results": results
+        }), 200
+    except Exception as e:
+        session.rollback()
+        logger.error(f"add_clothes_bulkでエラーが発生しました: {e}")
+        return jsonify({"message": f"エラーが発生しました: {e}"}), 500
+
+
+@clothing_bp.route('/api/clothes/jobs/<int:job_id>', methods=['GET'])
+@jwt_required()
+def get_ingest_job(job_id):
+    """画像のベクトル登録ジョブの状態を返す。ジョブIDは服のIDと同じ。"""
+    session = get_db_session()
+    try:
+        current_user_id = get_jwt_identity()
+        cloth = session.query(Cloth).filter_by(id=job_id, user_id=int(current_user_id)).first()
+        if not cloth or cloth.index_status is None:
+            return jsonify({"message": "Job not found"}), 404
+        return jsonify(job_status(cloth)), 200
+    except Exception as e:
+        session.rollback()
+        return jsonify({"message": f"An error occurred: {str(e)}"}), 500
+
+
+# 一覧APIで返せる列と、画像キーから作る派生フィールド（?fields= で絞り込める）
+CLOTH_LIST_COLUMNS = ("id", "name", "category", "color", "material", "season", "is_formal", "available", "preferred", "image_url", "index_status")
+CLOTH_LIST_DERIVED = {"thumbnail_url": ("image_url", "has_derivatives"), "medium_url": ("image_url", "has_derivatives")}
+CLOTH_BOOL_FILTERS = ("available", "preferred", "is_formal")
+
+def _parse_cloth_fields(value: str | None) -> list:
+    if not value:
+        return list(CLOTH_LIST_COLUMNS) + list(CLOTH_LIST_DERIVED)
+    fields = [f.strip() for f in value.split(",") if f.strip()]
+    unknown = [f for f in fields if f not in CLOTH_LIST_COLUMNS and f not in CLOTH_LIST_DERIVED]
+    if unknown:
+        raise ValueError(f"不明なフィールドです: {', '.join(unknown)}")
+    return fields
+
 @clothing_bp.route('/api/clothes/<int:user_id>', methods=['GET'])
 @jwt_required()
 def get_user_clothes(user_id):
+    """
+    ユーザーの服をID順に1ページずつ返す。次のページがあれば X-Next-Cursor ヘッダーにカーソルを入れる。
+    クエリパラメータ: limit, cursor, category, season, available, preferred, is_formal, fields（カンマ区切り）
+    """
     session = get_db_session()
     try:
         current_user_id = get_jwt_identity()
         if current_user_id != str(user_id):
             return jsonify({"message": "Forbidden: You can only view your own clothes"}), 403
 
-        clothes = session.query(Cloth).filter_by(user_id=user_id).all()
-        return jsonify([
-            {
-                "id": c.id, "name": c.name, "category": c.category, "color": c.color,
-                "material": c.material, "season": c.season, "is_formal": c.is_formal,
-                "image_url": c.image_url
-            } for c in clothes
-        ]), 200
+        try:
+            limit = parse_limit(request.args)
+            cursor = decode_cursor(request.args.get('cursor'), int)
+            fields = _parse_cloth_fields(request.args.get('fields'))
+            bool_filters = {name: parse_bool_arg(request.args, name) for name in CLOTH_BOOL_FILTERS}
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        # 服が変わっていなければ、行を読まずに 304 を返す
+        etag = current_etag(session, user_id, WARDROBE)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        # 必要な列だけを読む（ベクトルのJSONなど大きな列を一覧のたびに転送しない）
+        columns = {"id"} | {c for f in fields for c in CLOTH_LIST_DERIVED.get(f, (f,))}
+        query = session.query(Cloth).options(load_only(*[getattr(Cloth, c) for c in columns])).filter(Cloth.user_id == user_id)
+        if request.args.get('category'):
+            query = query.filter(Cloth.category == request.args['category'])
+        if request.args.get('season'):
+            # season は '春,夏' のようなカンマ区切りなので部分一致で絞り込む
+            query = query.filter(Cloth.season.contains(request.args['season'], autoescape=True))
+        for name, value in bool_filters.items():
+            if value is not None:
+                query = query.filter(getattr(Cloth, name) == value)
+        if cursor:
+            query = query.filter(Cloth.id > cursor[0])
+
+        clothes, next_cursor = paginate(query.order_by(Cloth.id), limit, lambda c: (c.id,))
+        items = []
+        for c in clothes:
+            item = {f: getattr(c, f) for f in fields if f in CLOTH_LIST_COLUMNS}
+            if any(f in CLOTH_LIST_DERIVED for f in fields):
+                urls = derivative_urls(c.image_url, c.has_derivatives)
+                item.update({f: urls[f] for f in fields if f in CLOTH_LIST_DERIVED})
+            items.append(item)
+
+        response = with_etag(jsonify(items), etag)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return response, 200
     except Exception as e:
         session.rollback()
         logger.error(f"get_user_clothesでエラーが発生しました: {str(e)}")
@@ -190,118 +327,49 @@ def search_outfit():
     """
     クエリに基づいて最適な服の組み合わせを検索する。
     1. 各カテゴリ（トップス、ボトムス、シューズ）でベクトル検索を実行し、候補を複数取得する。
-    2. LLM（OpenAI API）を使い、候補の中からクエリに最も一致するアイテムを1つ選択させる。
-    3. 最も一致したアイテムをカテゴリごとに返す。
+    2. LLM（OpenAI API）を使い、候補の中からクエリに最も一致するアイテムを1つ選択させる（既定では全カテゴリを1回の呼び出しで）。
+       "rerank": "local" の場合はLLMを使わず、類似度とメタデータのスコアで選ぶ。
+    3. 最も一致したアイテムをカテゴリごとに返す。計測値は _meta に入れる。
     """
     data = request.get_json()
     if not data:
         return jsonify({"message": "リクエストボディが空です"}), 400
 
     current_user_id = get_jwt_identity()
+    # 候補の選び方はリクエストごとに指定できる（省略時は RERANK_STRATEGY）
+    strategy = data.get("rerank") or RERANK_STRATEGY
+    if strategy not in RERANK_STRATEGIES:
+        return jsonify({"message": f"rerank は {', '.join(RERANK_STRATEGIES)} のいずれかを指定してください"}), 400
     
-    # OpenAIクライアントの初期化
+    # 共有サービスの取得（初回のみロードが走る）
     try:
-        openai_api_key = os.getenv("OPENAI_API_KEY")
-        if not openai_api_key:
-            logger.error("OPENAI_API_KEY環境変数が設定されていません。")
-            return jsonify({"message": "サーバーエラー: OpenAI APIキーが設定されていません"}), 500
-        openai_client = openai.OpenAI(api_key=openai_api_key)
+        openai_client = services["openai_client"]
+        clip_model, clip_processor, vector_store = services["model"], services["processor"], services["vector_store"]
     except Exception as e:
-        logger.error(f"OpenAIクライアントの初期化に失敗しました: {e}")
+        logger.error(f"サービスの初期化に失敗しました: {e}")
         return jsonify({"message": f"サーバーエラー: {e}"}), 500
 
-    best_matches = {}
-    # 'tops', 'bottoms', 'shoes' の各カテゴリに対して処理を実行
-    for category in ['tops', 'bottoms', 'shoes']:
-        query = data.get(category)
-        if not query:
-            continue
-
-        # 1. Pineconeでベクトル検索を実行し、候補を取得 (top_k=3)
-        try:
-            search_results = search_items_for_user(
-                query=query,
-                user_id=current_user_id,
-                index=pinecone_index,
-                model=clip_model,
-                processor=clip_processor,
-                top_k=5,  # LLMに評価させるため、複数の候補を取得
-                category=category
-            )
-            logger.info(search_results)
-
-            if not search_results:
-                best_matches[category] = None
-                continue
-
-        except Exception as e:
-            logger.error(f"'{category}'のベクトル検索中にエラーが発生しました: {e}")
-            best_matches[category] = {"error": "検索中にエラーが発生しました"}
-            continue
-
-        # 2. LLMに最も一致するアイテムを選択させる
-        try:
-            # LLMへの入力（プロンプト）を作成
-            candidates_for_prompt = []
-            for i, item in enumerate(search_results):
-                # search_items_for_userが返すitemオブジェクトに 'id' が含まれている必要があります
-                item_id = item.get('id') 
-                meta = item.get('metadata', {})
-                candidates_for_prompt.append(
-                    f"候補{i+1} (ID: {item_id}):\n"
-                    f"  - 説明: {meta.get('description', '説明なし')}\n"
-                )
-            
-            prompt_text = (
-                f"あなたはプロのスタイリストです。ユーザーの要望に最も合う服を、以下の候補リストから1つだけ選んでください。\n\n"
-                f"## ユーザーの要望\n"
-                f"「{query}」\n\n"
-                f"## 服の候補リスト\n"
-                f"{''.join(candidates_for_prompt)}\n"
-                f"-----\n\n"
-                f"## あなたのタスク\n"
-                f"上記リストの中から最も要望に合う服の「ID」を一つだけ選び、そのIDの文字列を**完全にコピーして**回答してください。"
-                f"説明やID以外の言葉は一切含めないでください。"
-            )
-            logger.info(f"LLMへのプロンプト: {prompt_text}")
-
-            # OpenAI APIを呼び出し
-            response = openai_client.chat.completions.create(
-                model="gpt-4o",  # または "gpt-4" など高性能なモデルを推奨
-                messages=[{"role": "user", "content": prompt_text}],
-                max_tokens=60, # IDのみを返すため、トークン数は少なく設定
-                temperature=0, # 再現性を高めるために0に設定
-            )
-            logger.info(f"LLMの応答: {response.choices[0].message.content.strip()}")
-            
-            best_item_id = response.choices[0].message.content.strip()
-            logger.success(f"LLMが選択したID ({category}): {best_item_id}")
-
-            # 3. 選択されたIDを元に、元の検索結果から完全な情報を取得
-            best_item = next((item for item in search_results if item.get('id') == best_item_id), None)
+    queries = {category: data.get(category) for category in ['tops', 'bottoms', 'shoes'] if data.get(category)}
+    started = time.perf_counter()
 
-            # LLMがIDを正しく返さなかった場合のフォールバックとして、ベクトル検索のスコアが最も高いものを採用
-            if not best_item:
-                logger.warning(f"LLMが返したID '{best_item_id}' が候補に存在しません。ベクトル検索の最上位の結果を返します。")
-                best_item = search_results[0]
-            
-            # フロントエンドに返す情報を整形
-            best_matches[category] = [{
-                'image_url': best_item['metadata'].get('image_url'),
-                'score': best_item['score'],
-                'metadata': best_item['metadata']
-            }]
-
-        except Exception as e:
-            logger.error(f"OpenAI APIの呼び出し中にエラーが発生しました: {e}")
-            # エラーが発生した場合は、ベクトル検索の最上位の結果をフォールバックとして返す
-            best_item = search_results[0]
-            best_matches[category] = [{
-                'image_url': best_item['metadata'].get('image_url'),
-                'score': best_item['score'],
-                'metadata': best_item['metadata'],
-                'error': 'LLMによる評価中にエラーが発生しました。'
-            }]
+    # 全カテゴリのクエリを1回の順伝播でまとめてベクトル化する
+    try:
+        query_vectors = dict(zip(queries, embed_texts(list(queries.values()), clip_model, clip_processor)))
+    except Exception as e:
+        logger.error(f"クエリのベクトル化中にエラーが発生しました: {e}")
+        return jsonify({category: {"error": "検索中にエラーが発生しました"} for category in queries}), 200
+    embed_ms = (time.perf_counter() - started) * 1000
+
+    # 'tops', 'bottoms', 'shoes' のベクトル検索をカテゴリごとに並列に実行し、LLMで1つずつ選ぶ。
+    # 一部のカテゴリが失敗・タイムアウトしても、他のカテゴリの結果は返す
+    best_matches, meta = find_outfit_matches(queries, query_vectors, current_user_id, vector_store, openai_client, strategy=strategy)
+    # フロントエンドはカテゴリのキーだけを見るので、計測値は _meta に入れる
+    best_matches["_meta"] = {
+        **{k: round(v, 1) if isinstance(v, float) else v for k, v in meta.items() if k != "categories"},
+        "embed_ms": round(embed_ms, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        "categories": {category: {k: round(v, 1) if isinstance(v, float) else v for k, v in t.items()} for category, t in meta["categories"].items()},
+    }
 
     return jsonify(best_matches), 200
 @clothing_bp.route('/api/clothes/<int:user_id>/<int:clothes_id>', methods=['DELETE'])
@@ -316,7 +384,14 @@ def delete_user_clothes(user_id, clothes_id):
         deleted = session.query(Cloth).filter(Cloth.id == clothes_id, Cloth.user_id == user_id).delete(synchronize_session=False)
         if not deleted:
             return jsonify({"message": "Cloth not found"}), 404
+        bump_version(session, user_id, WARDROBE, HISTORY)
         session.commit()
+
+        # ベクトルストアからも削除する（失敗しても削除自体は成功として扱う）
+        try:
+            services["vector_store"].delete(ids=[str(clothes_id)], namespace=str(user_id))
+        except Exception as e:
+            logger.warning(f"ベクトルストアからの削除に失敗しました: {e}")
         return jsonify({"message": "Cloth deleted successfully", "cloth_id": clothes_id}), 200
     except Exception as e:
         session.rollback()
@@ -333,7 +408,10 @@ def update_user_clothes(user_id, clothes_id):
 
         data = request.json
 
-        session.query(Cloth).filter(Cloth.id == clothes_id, Cloth.user_id == user_id).update(data)
+        updated_rows = session.query(Cloth).filter(Cloth.id == clothes_id, Cloth.user_id == user_id).update(data)
+        if updated_rows:
+            # 履歴に表示される列が変わった場合は履歴のETagも変える
+            bump_version(session, user_id, WARDROBE, *([HISTORY] if set(data) & set(HISTORY_CLOTH_ATTRIBUTES) else []))
         session.commit()
 
         updated = session.query(Cloth).filter_by(id=clothes_id, user_id=user_id).first()
@@ -3,6 +3,10 @@ from app.database import get_db_session
 from app.models import Cloth, UserPreference, OutfitSuggestion, User
 from app.utils import generate_outfit_queries_with_openai, get_weather_info, embed_text
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.pagination import parse_limit, decode_cursor, paginate, NEXT_CURSOR_HEADER
+from app.versioning import current_etag, not_modified, with_etag, PREFERENCES, HISTORY
+from sqlalchemy import or_, and_
+from sqlalchemy.orm import joinedload
 from datetime import datetime
 
 suggestion_bp = Blueprint('suggestion', __name__)
@@ -34,7 +38,9 @@ def suggest_outfits():
             return jsonify({"message": "利用可能な服が登録されていません。"}), 400
 
         # (プロンプト生成ロジックは変更なし)
-        weather_info = get_weather_info(location, target_date_str)
+        # 予報は「何日後か」で引くので日付から変換する（予報リストはキャッシュされる）
+        days_from_now = max((target_date - datetime.now().date()).days + 1, 1)
+        weather_info = get_weather_info(location, days_from_now)
         clothes_descriptions = [f"ID:{c.id}, Name:{c.name} ({c.color}, {c.category})" for c in user_clothes]
         user_pref_str = ""
         if user_pref:
@@ -96,29 +102,35 @@ def user_preferences(user_id): # 関数名をuser_preferencesに変更し、GET/
     try:
         # JWTから認証済みユーザーのIDを取得し、認可チェック
         current_user_id = get_jwt_identity()
-        if current_user_id != user_id:
+        if current_user_id != str(user_id): # JWTのidentityは文字列
             return jsonify({"message": "Forbidden: You can only view/update your own preferences"}), 403
 
+        if request.method == 'GET':
+            etag = current_etag(session, user_id, PREFERENCES)
+            cached = not_modified(etag)
+            if cached is not None:
+                return cached
+
         preference = session.query(UserPreference).filter_by(user_id=user_id).first()
 
         if request.method == 'GET':
             if not preference:
                 # 設定がない場合はデフォルトまたは空の状態で返す
-                return jsonify({
+                return with_etag(jsonify({
                     "user_id": user_id,
                     "personal_color": None,
                     "body_shape": None,
                     "disliked_colors": None,
                     "disliked_styles": None
-                }), 200
+                }), etag), 200
             else:
-                return jsonify({
+                return with_etag(jsonify({
                     "user_id": preference.user_id,
                     "personal_color": preference.personal_color,
                     "body_shape": preference.body_shape,
                     "disliked_colors": preference.disliked_colors,
                     "disliked_styles": preference.disliked_styles
-                }), 200
+                }), etag), 200
 
         elif request.method == 'PUT':
             if not preference:
@@ -139,28 +151,74 @@ def user_preferences(user_id): # 関数名をuser_preferencesに変更し、GET/
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
     
 
+# 履歴に含める服の列（ベクトルなどは読まない）
+HISTORY_CLOTH_COLUMNS = (Cloth.id, Cloth.name, Cloth.color, Cloth.image_url)
+
+def _history_cloth(cloth):
+    return {"id": cloth.id, "name": cloth.name, "color": cloth.color, "image_url": cloth.image_url} if cloth else None
+
+def _parse_date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"{name} は YYYY-MM-DD 形式で指定してください")
+
 @suggestion_bp.route('/api/suggestions', methods=['GET'])
 @jwt_required()
 def get_past_suggestions():
-    """過去のコーデ提案履歴を取得する"""
+    """
+    過去のコーデ提案履歴を新しい順に1ページずつ取得する。服は同じクエリでJOINして読むので、件数によらずSQLは1回。
+    クエリパラメータ: from, to（YYYY-MM-DD、両端を含む）, limit, cursor（X-Next-Cursor ヘッダーの値）
+    """
     session = get_db_session()
     try:
         user_id = get_jwt_identity()
-        
-        # ユーザーの過去の提案を日付の降順で取得
-        suggestions = session.query(OutfitSuggestion).filter_by(user_id=user_id).order_by(OutfitSuggestion.suggested_date.desc()).all()
-        
-        results = []
-        for s in suggestions:
-            results.append({
-                "suggestion_id": s.id,
-                "suggested_date": s.suggested_date.isoformat(),
-                "top": {"id": s.top.id, "name": s.top.name, "color": s.top.color, "image_url": s.top.image_url} if s.top else None,
-                "bottom": {"id": s.bottom.id, "name": s.bottom.name, "color": s.bottom.color, "image_url": s.bottom.image_url} if s.bottom else None,
-                "shoes": {"id": s.shoes.id, "name": s.shoes.name, "color": s.shoes.color, "image_url": s.shoes.image_url} if s.shoes else None,
-            })
-            
-        return jsonify(results), 200
+
+        try:
+            date_from = _parse_date_arg('from')
+            date_to = _parse_date_arg('to')
+            limit = parse_limit(request.args)
+            cursor = decode_cursor(request.args.get('cursor'), lambda v: datetime.strptime(v, '%Y-%m-%d').date(), int)
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+
+        etag = current_etag(session, user_id, HISTORY)
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+
+        query = session.query(OutfitSuggestion).options(
+            *[joinedload(rel).load_only(*HISTORY_CLOTH_COLUMNS) for rel in (OutfitSuggestion.top, OutfitSuggestion.bottom, OutfitSuggestion.shoes)]
+        ).filter(OutfitSuggestion.user_id == user_id)
+        if date_from:
+            query = query.filter(OutfitSuggestion.suggested_date >= date_from)
+        if date_to:
+            query = query.filter(OutfitSuggestion.suggested_date <= date_to)
+        if cursor:
+            # (suggested_date, id) の降順で、前のページの最後の行より後ろから読む
+            last_date, last_id = cursor
+            query = query.filter(or_(
+                OutfitSuggestion.suggested_date < last_date,
+                and_(OutfitSuggestion.suggested_date == last_date, OutfitSuggestion.id < last_id)
+            ))
+        query = query.order_by(OutfitSuggestion.suggested_date.desc(), OutfitSuggestion.id.desc())
+
+        suggestions, next_cursor = paginate(query, limit, lambda s: (s.suggested_date.isoformat(), s.id))
+        results = [{
+            "suggestion_id": s.id,
+            "suggested_date": s.suggested_date.isoformat(),
+            "top": _history_cloth(s.top),
+            "bottom": _history_cloth(s.bottom),
+            "shoes": _history_cloth(s.shoes),
+        } for s in suggestions]
+
+        response = with_etag(jsonify(results), etag)
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return response, 200
         
     except Exception as e:
         return jsonify({"message": f"An error occurred: {str(e)}"}), 500
@@ -1,10 +1,9 @@
-import os
-import boto3
-from botocore.client import Config
 from botocore.exceptions import NoCredentialsError
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required
 from werkzeug.utils import secure_filename
+from app.storage import get_bucket
+from app.ingest import upload_original, submit_derivatives
 
 upload_bp = Blueprint('upload', __name__)
 
@@ -26,30 +25,13 @@ def upload_image():
         return jsonify({"message": "ファイルが選択されていないか、許可されていない形式です"}), 400
 
     filename = secure_filename(file.filename)
-    
-    # MinIOへの接続情報を環境変数から取得
-    s3_endpoint = os.environ.get('S3_ENDPOINT_URL')
-    s3_key = os.environ.get('S3_ACCESS_KEY')
-    s3_secret = os.environ.get('S3_SECRET_KEY')
-    s3_bucket = os.environ.get('S3_BUCKET_NAME')
-
-    # Boto3 S3クライアントの初期化
-    s3_client = boto3.client(
-        's3',
-        endpoint_url=s3_endpoint,
-        aws_access_key_id=s3_key,
-        aws_secret_access_key=s3_secret,
-        config=Config(signature_version='s3v4')
-    )
+    s3_bucket = get_bucket()
 
     try:
-        # ファイルをMinIOにアップロード
-        s3_client.upload_fileobj(
-            file,
-            s3_bucket,
-            filename,
-            ExtraArgs={'ContentType': file.content_type}
-        )
+        # 受け取ったストリームをそのままMinIOにアップロードする（大きな画像はマルチパート）。
+        # 派生画像はバックグラウンドで MinIO の元画像（シークできず一時ファイルを経由した場合はその一時ファイル）から作る
+        image_path = upload_original(file, filename)
+        submit_derivatives(filename, image_path)
         
         # MinIO上のファイルURLを生成
         # localhost:9000はdocker-composeで公開しているポート
@@ -0,0 +1,157 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from loguru import logger
+
+from app.metrics import metrics
+from app.rerank import RERANK_STRATEGY, RERANK_STRATEGIES, select_one_with_llm, select_all_with_llm, select_all_locally, load_preferred_ids
+from app.utils import search_items_for_user
+
+# カテゴリごとのベクトル検索・選定を並列に実行するスレッド数（ワーカープロセスごと。全リクエストで共有）
+SEARCH_FANOUT_WORKERS = int(os.getenv("SEARCH_FANOUT_WORKERS", "8"))
+# 1カテゴリの検索・選定にかける時間の上限（秒）。超えたカテゴリはエラーとして返し、他のカテゴリの結果は返す
+SEARCH_CATEGORY_TIMEOUT = float(os.getenv("SEARCH_CATEGORY_TIMEOUT", "20"))
+SEARCH_TOP_K = 5
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """プロセスごとに1つのスレッドプールを返す（fork 前に作られたものは使わない）。"""
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="search")
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def format_match(item: dict, **extra) -> list:
+    """フロントエンドに返す形に整形する。"""
+    return [{
+        'image_url': item['metadata'].get('image_url'),
+        'score': item['score'],
+        'metadata': item['metadata'],
+        **extra
+    }]
+
+
+def _wait_all(futures: dict, started: float) -> dict:
+    """
+    futures（{future: category}）を SEARCH_CATEGORY_TIMEOUT 秒まで待ち、{category: (値, 例外)} を返す。
+    全カテゴリを同時に投入しているので、共通の期限まで待てばカテゴリごとのタイムアウトになる。
+    """
+    done, not_done = wait(futures, timeout=max(SEARCH_CATEGORY_TIMEOUT - (time.perf_counter() - started), 0))
+    outcomes = {}
+    for future, category in futures.items():
+        if future in not_done:
+            future.cancel()
+            outcomes[category] = (None, TimeoutError(f"{SEARCH_CATEGORY_TIMEOUT}秒以内に終わりませんでした"))
+        elif future.exception() is not None:
+            outcomes[category] = (None, future.exception())
+        else:
+            outcomes[category] = (future.result(), None)
+    return outcomes
+
+
+def _retrieve(category: str, query: str, query_vector: list, user_id: str, vector_store) -> tuple:
+    start = time.perf_counter()
+    matches = search_items_for_user(
+        query=query,
+        user_id=user_id,
+        index=vector_store,
+        model=None,
+        processor=None,
+        top_k=SEARCH_TOP_K, # 選定のため、複数の候補を取得
+        category=category,
+        query_vector=query_vector
+    )
+    return matches, (time.perf_counter() - start) * 1000
+
+
+def _select_one(openai_client, category: str, query: str, candidates: list) -> tuple:
+    start = time.perf_counter()
+    item, status = select_one_with_llm(openai_client, category, query, candidates, timeout=SEARCH_CATEGORY_TIMEOUT)
+    return item, status, (time.perf_counter() - start) * 1000
+
+
+def find_outfit_matches(queries: dict, query_vectors: dict, user_id: str, vector_store, openai_client, strategy: str = RERANK_STRATEGY) -> tuple:
+    """
+    1. カテゴリごとのベクトル検索を共有のスレッドプールで並列に実行する。
+    2. strategy に従って候補から1つずつ選ぶ（llm: カテゴリごとに並列にLLMを呼ぶ / llm_batch: 1回の呼び出しで全カテゴリ /
+       local: 類似度とメタデータのスコアで選ぶ）。
+    SEARCH_CATEGORY_TIMEOUT 秒以内に終わらなかったカテゴリはエラーにして、他のカテゴリの結果は返す。
+    選定に失敗したカテゴリはベクトル検索の最上位を返す。戻り値は ({category: 結果}, 計測値)。
+    """
+    if strategy not in RERANK_STRATEGIES:
+        raise ValueError(f"不明な選定方法です: {strategy}")
+    executor = get_executor()
+    results, categories = {}, {}
+    meta = {"strategy": strategy, "llm_calls": 0, "categories": categories}
+
+    # 1. ベクトル検索
+    started = time.perf_counter()
+    futures = {executor.submit(_retrieve, category, query, query_vectors[category], user_id, vector_store): category for category, query in queries.items()}
+    candidates = {}
+    for category, (value, error) in _wait_all(futures, started).items():
+        if error is not None:
+            logger.error(f"'{category}'のベクトル検索中にエラーが発生しました: {error}")
+            results[category] = {"error": "検索がタイムアウトしました" if isinstance(error, TimeoutError) else "検索中にエラーが発生しました"}
+            categories[category] = {"status": "timeout" if isinstance(error, TimeoutError) else "error"}
+            continue
+        matches, vector_ms = value
+        categories[category] = {"vector_ms": vector_ms}
+        if matches:
+            candidates[category] = matches
+        else:
+            results[category] = None
+            categories[category]["status"] = "empty"
+
+    # 2. 候補から1つずつ選ぶ
+    rerank_started = time.perf_counter()
+    if candidates and strategy == "local":
+        try:
+            preferred_ids = load_preferred_ids([item.get('id') for items in candidates.values() for item in items])
+        except Exception as e:
+            logger.warning(f"お気に入りの読み込みに失敗しました（お気に入りは考慮しません）: {e}")
+            preferred_ids = set()
+        for category, (item, status) in select_all_locally(queries, candidates, preferred_ids).items():
+            results[category] = format_match(item)
+            categories[category]["status"] = status
+        meta["rerank_ms"] = (time.perf_counter() - rerank_started) * 1000
+    elif candidates and strategy == "llm_batch":
+        meta["llm_calls"] = 1
+        try:
+            selections = select_all_with_llm(openai_client, queries, candidates, timeout=SEARCH_CATEGORY_TIMEOUT)
+            for category, (item, status) in selections.items():
+                results[category] = format_match(item)
+                categories[category]["status"] = status
+        except Exception as e:
+            logger.error(f"OpenAI APIの呼び出し中にエラーが発生しました: {e}")
+            for category, items in candidates.items():
+                results[category] = format_match(items[0], error='LLMによる評価中にエラーが発生しました。')
+                categories[category]["status"] = "fallback"
+        meta["rerank_ms"] = (time.perf_counter() - rerank_started) * 1000
+    elif candidates:
+        meta["llm_calls"] = len(candidates)
+        futures = {executor.submit(_select_one, openai_client, category, queries[category], items): category for category, items in candidates.items()}
+        for category, (value, error) in _wait_all(futures, rerank_started).items():
+            if error is not None:
+                logger.error(f"OpenAI APIの呼び出し中にエラーが発生しました: {error}")
+                # エラーが発生した場合は、ベクトル検索の最上位の結果をフォールバックとして返す
+                results[category] = format_match(candidates[category][0], error='LLMによる評価中にエラーが発生しました。')
+                categories[category]["status"] = "fallback"
+                continue
+            item, status, rerank_ms = value
+            results[category] = format_match(item)
+            categories[category].update(status=status, rerank_ms=rerank_ms)
+        meta["rerank_ms"] = (time.perf_counter() - rerank_started) * 1000
+
+    for category, timing in categories.items():
+        metrics.incr("search_categories", status=timing["status"])
+    metrics.observe("search_rerank_seconds", meta.get("rerank_ms", 0) / 1000, strategy=strategy)
+    return results, meta
@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+
+import openai
+import torch
+from loguru import logger
+from pinecone import Pinecone, ServerlessSpec
+from transformers import CLIPModel, CLIPProcessor
+
+from app.metrics import metrics
+
+MODEL_NAME = "openai/clip-vit-base-patch32"
+INDEX_NAME = "test"
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# openai: OpenAI API を使う / fake: app.fake_llm の固定応答を返す偽クライアントを使う（APIキー不要。動作確認・ベンチマーク用）
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+# スレッド型のワーカー（gthread）では複数のリクエストが同じCLIPモデル・プロセッサを使う。
+# fast tokenizer は同時に呼ぶと "Already borrowed" で失敗するので、トークナイズと順伝播はこのロックの中で行う。
+# 順伝播自体は torch が intra-op スレッドで並列化するため、直列化してもスループットはほぼ落ちない
+clip_lock = threading.Lock()
+
+
+class ServiceRegistry:
+    """
+    重いサービス（CLIPモデル、Pinecone、OpenAIクライアント等）を初回利用時に一度だけ生成して保持する。
+    fork_safe なサービスは gunicorn のマスタープロセスで事前ロードしておけば、
+    ワーカーは fork 後にコピーオンライトで同じ重みを共有する。
+    """
+
+    def __init__(self):
+        self._factories = {}
+        self._fork_safe = set()
+        self._instances = {}
+        self._load_times = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory, fork_safe: bool = False):
+        self._factories[name] = factory
+        if fork_safe:
+            self._fork_safe.add(name)
+
+    def get(self, name: str):
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Unknown service: {name}")
+                logger.info(f"Loading service '{name}'...")
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                elapsed = time.perf_counter() - start
+                self._load_times[name] = elapsed
+                metrics.observe("service_load_seconds", elapsed, component=name)
+                logger.info(f"Service '{name}' loaded in {elapsed:.2f}s")
+            return self._instances[name]
+
+    def __getitem__(self, name: str):
+        return self.get(name)
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def preload(self, names=None):
+        """指定したサービス（省略時は fork_safe なもの全て）を事前にロードする。"""
+        for name in names if names is not None else sorted(self._fork_safe):
+            self.get(name)
+
+    def reset(self, names=None):
+        """ロード済みのインスタンスを破棄する。fork 後にネットワーククライアントを作り直すために使う。"""
+        with self._lock:
+            for name in list(names if names is not None else self._instances):
+                self._instances.pop(name, None)
+                self._load_times.pop(name, None)
+
+    def reset_after_fork(self):
+        self.reset([name for name in self._instances if name not in self._fork_safe])
+
+    def load_times(self) -> dict:
+        return dict(self._load_times)
+
+    def status(self) -> dict:
+        return {
+            name: {"loaded": name in self._instances, "load_seconds": self._load_times.get(name)}
+            for name in self._factories
+        }
+
+
+# --- 各サービスのファクトリ ---
+def _load_model():
+    logger.info(f"Loading CLIP model '{MODEL_NAME}' on {DEVICE}")
+    return CLIPModel.from_pretrained(MODEL_NAME).to(DEVICE).eval()
+
+
+def _load_processor():
+    return CLIPProcessor.from_pretrained(MODEL_NAME)
+
+
+def _load_index():
+    pinecone_api_key = os.getenv("PINECONE_API_KEY")
+    if not pinecone_api_key:
+        raise ValueError("PINECONE_API_KEY environment variable not set")
+    pc = Pinecone(api_key=pinecone_api_key)
+
+    if INDEX_NAME not in pc.list_indexes().names():
+        embedding_dim = services["model"].config.projection_dim
+        logger.info(f"Creating index '{INDEX_NAME}' with dimension {embedding_dim}...")
+        pc.create_index(name=INDEX_NAME, dimension=embedding_dim, metric="cosine", spec=ServerlessSpec(cloud='aws', region='us-east-1'))
+    return pc.Index(INDEX_NAME)
+
+
+def _load_vector_store():
+    from app.vector_store import create_vector_store
+    return create_vector_store()
+
+
+def _load_openai_client():
+    from app.llm_cache import CachedOpenAIClient
+    if LLM_BACKEND == "fake":
+        from app.fake_llm import FakeOpenAIClient
+        logger.warning("LLM_BACKEND=fake: OpenAI APIの代わりに固定の応答を返す偽クライアントを使います")
+        return CachedOpenAIClient(FakeOpenAIClient())
+    openai_api_key = os.getenv("OPENAI_API_KEY")
+    if not openai_api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    # 同じプロンプトへの応答は app.llm_cache で使い回す（呼び出し側で cache=False を渡すと無効）
+    return CachedOpenAIClient(openai.OpenAI(api_key=openai_api_key))
+
+
+services = ServiceRegistry()
+services.register("model", _load_model, fork_safe=True)
+services.register("processor", _load_processor, fork_safe=True)
+services.register("index", _load_index)
+services.register("vector_store", _load_vector_store)
+services.register("openai_client", _load_openai_client)
@@ -0,0 +1,73 @@
+import os
+import threading
+import time
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.client import Config
+
+from app.metrics import metrics
+
+# この大きさを超える画像はマルチパートでアップロードする
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE", str(8 * 1024 * 1024)))
+S3_MAX_POOL_CONNECTIONS = int(os.getenv("S3_MAX_POOL_CONNECTIONS", "20"))
+
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=S3_MULTIPART_THRESHOLD,
+    multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+    max_concurrency=4,
+)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_s3_client():
+    """プロセス内で共有するS3(MinIO)クライアントを返す。boto3のクライアントはスレッドセーフ。"""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client = boto3.client(
+                    's3',
+                    endpoint_url=os.environ.get('S3_ENDPOINT_URL'),
+                    aws_access_key_id=os.environ.get('S3_ACCESS_KEY'),
+                    aws_secret_access_key=os.environ.get('S3_SECRET_KEY'),
+                    config=Config(signature_version='s3v4', max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+                )
+                _client_pid = os.getpid()
+    return _client
+
+
+def get_bucket() -> str:
+    return os.environ.get('S3_BUCKET_NAME')
+
+
+def upload_stream(fileobj, key: str, content_type: str | None = None) -> int:
+    """
+    ファイルオブジェクトを先頭から読みながらアップロードする（全体をメモリに載せない）。
+    S3_MULTIPART_THRESHOLD を超える場合は自動的にマルチパートになる。アップロードしたバイト数を返す。
+    """
+    transferred = 0
+
+    def _progress(chunk: int):
+        nonlocal transferred
+        transferred += chunk
+
+    extra_args = {'ContentType': content_type} if content_type else None
+    start = time.perf_counter()
+    try:
+        get_s3_client().upload_fileobj(fileobj, get_bucket(), key, ExtraArgs=extra_args, Config=TRANSFER_CONFIG, Callback=_progress)
+    except Exception:
+        metrics.incr("s3_uploads", status="error")
+        raise
+    elapsed = time.perf_counter() - start
+
+    metrics.incr("s3_uploads", status="ok")
+    metrics.incr("s3_upload_bytes", transferred)
+    metrics.observe("s3_upload_seconds", elapsed)
+    if elapsed > 0:
+        metrics.set_gauge("s3_upload_last_bytes_per_second", transferred / elapsed)
+    return transferred
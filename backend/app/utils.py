@@ -12,78 +12,100 @@ import dotenv
 
 import torch
 from transformers import CLIPModel, CLIPProcessor
-from pinecone import Pinecone, ServerlessSpec
+from pinecone import Pinecone
 
 # Load environment variables once at module level
 dotenv.load_dotenv()
 
 # --- グローバル設定 ---
-MODEL_NAME = "openai/clip-vit-base-patch32"
-INDEX_NAME = "test" # インデックス名をより具体的に変更
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# モデル名・デバイス等はサービスレジストリ側で一元管理する
+from app.services import services, clip_lock, MODEL_NAME, DEVICE
+from app.embedding_cache import embedding_cache, normalize_text
+from app.cache import TTLCache
+from app.metrics import metrics
+from app.http_client import http_client
+from app.images import CLIP_IMAGE_SIZE, prepare_clip_image, load_clip_image
 # WEATHER_API_KEYは必要に応じてos.getenvで直接取得するか、引数として渡す
 
+# 天気APIの設定（テスト時は app.weather_stub のURLに差し替えられる）
+WEATHER_API_BASE_URL = os.getenv("WEATHER_API_BASE_URL", "https://api.openweathermap.org")
+WEATHER_CACHE_TTL = float(os.getenv("WEATHER_CACHE_TTL", "1800"))
+WEATHER_FORECAST_DAYS = int(os.getenv("WEATHER_FORECAST_DAYS", "7")) # 1回の取得でキャッシュする日数
+
+# 座標は変わらないので期限なし、予報は日ごとのリスト全体を WEATHER_CACHE_TTL 秒キャッシュする
+geocode_cache = TTLCache(max_entries=256, ttl=None)
+forecast_cache = TTLCache(max_entries=256, ttl=WEATHER_CACHE_TTL)
+metrics.register_collector("weather_cache", lambda: {"geocode": geocode_cache.stats(), "forecast": forecast_cache.stats()})
+
 # --- サービス初期化 ---
 def initialize_services():
-    """Pinecone, CLIPモデル, OpenAIクライアント等を初期化する。"""
+    """Pinecone, CLIPモデル, OpenAIクライアント等を取得する。実体はプロセス内で一度だけロードされる。"""
     logger.info("--- 1. Initializing Services ---")
     logger.info(f"Using device: {DEVICE}")
+    return services["model"], services["processor"], services["index"], services["openai_client"]
 
-    # Pineconeクライアントの初期化
-    pinecone_api_key = os.getenv("PINECONE_API_KEY")
-    pinecone_environment = os.getenv("PINECONE_ENVIRONMENT", "us-west1-gcp") # Changed default region to match spec
-    
-    if not pinecone_api_key:
-        raise ValueError("PINECONE_API_KEY environment variable not set")
-    pc = Pinecone(api_key=pinecone_api_key)
-
-    # OpenAIクライアントの初期化
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if not openai_api_key:
-        raise ValueError("OPENAI_API_KEY environment variable not set")
-    openai_client = openai.OpenAI(api_key=openai_api_key)
-    logger.info("OpenAI client initialized.")
-    
-    # CLIPモデルとプロセッサのロード
-    logger.info("Loading CLIP model and processor...")
-    model = CLIPModel.from_pretrained(MODEL_NAME).to(DEVICE)
-    processor = CLIPProcessor.from_pretrained(MODEL_NAME)
-    
-    # Pineconeインデックスの作成または接続
-    embedding_dim = model.config.projection_dim
-    if INDEX_NAME not in pc.list_indexes().names():
-        logger.info(f"Creating index '{INDEX_NAME}' with dimension {embedding_dim}...")
-        pc.create_index(name=INDEX_NAME, dimension=embedding_dim, metric="cosine", spec=ServerlessSpec(cloud='aws', region='us-east-1'))
-        logger.info("Index created successfully.")
-    else:
-        logger.info(f"Index '{INDEX_NAME}' already exists.")
-        
-    index = pc.Index(INDEX_NAME)
-    logger.info(f"Initial index stats: {index.describe_index_stats()}")
-    
-    # 問題の行を削除: WEATHER_API_KEY = os.getenv("WEATHER_API_KEY", WEATHER_API_KEY)
+# --- 低レベルヘルパー関数 (ベクトル化・ファイル保存) ---
+def _clip_input_size(processor: CLIPProcessor) -> int:
+    crop_size = getattr(processor.image_processor, "crop_size", None) or {}
+    return crop_size.get("height", CLIP_IMAGE_SIZE)
+
+def _pixel_values(images: list[Image.Image], processor: CLIPProcessor):
+    """
+    画像を入力サイズに揃えてからテンソルにする。リサイズ・切り抜きは prepare_clip_image で済ませてあるので、
+    CLIPProcessor には正規化だけをさせる（フル解像度の画像を processor に渡さない）。
+    """
+    size = _clip_input_size(processor)
+    prepared = [prepare_clip_image(image, size) for image in images]
+    return processor(images=prepared, return_tensors="pt", do_resize=False, do_center_crop=False).to(DEVICE)
 
-    return model, processor, index, openai_client
+def _image_features(inputs, model: CLIPModel):
+    with clip_lock, torch.no_grad():
+        return model.get_image_features(**inputs)
 
-# --- 低レベルヘルパー関数 (ベクトル化・ファイル保存) ---
 def embed_image(image: Image.Image, model: CLIPModel, processor: CLIPProcessor) -> list | None:
     """PIL.Image オブジェクトをベクトル化する。"""
     try:
-        rgb_image = image.convert("RGB")
-        inputs = processor(images=rgb_image, return_tensors="pt").to(DEVICE)
-        with torch.no_grad():
-            image_features = model.get_image_features(**inputs)
+        inputs = _pixel_values([image], processor)
+        image_features = _image_features(inputs, model)
         return image_features[0].cpu().numpy().tolist()
     except Exception as e:
         logger.error(f"Failed to embed image: {e}")
         return None
 
+def embed_images(images: list[Image.Image], model: CLIPModel, processor: CLIPProcessor, batch_size: int = 16) -> list[list]:
+    """複数の PIL.Image を batch_size 枚ずつまとめてベクトル化する。"""
+    vectors = []
+    for start in range(0, len(images), batch_size):
+        inputs = _pixel_values(images[start:start + batch_size], processor)
+        image_features = _image_features(inputs, model)
+        vectors.extend(image_features.cpu().numpy().tolist())
+    return vectors
+
 def embed_text(text: str, model: CLIPModel, processor: CLIPProcessor) -> list:
     """テキストをベクトル化する。"""
-    inputs = processor(text=text, return_tensors="pt").to(DEVICE)
-    with torch.no_grad():
-        text_features = model.get_text_features(**inputs)
-    return text_features[0].cpu().numpy().tolist()
+    return embed_texts([text], model, processor)[0]
+
+def embed_texts(texts: list[str], model: CLIPModel, processor: CLIPProcessor, use_cache: bool = True) -> list[list]:
+    """
+    複数のテキストを1回のトークナイズ・順伝播でまとめてベクトル化する。
+    キャッシュ済みのテキストはモデルに渡さず、未キャッシュ分だけをベクトル化する。
+    """
+    if not texts:
+        return []
+    model_name = getattr(model, "name_or_path", None) or MODEL_NAME
+    vectors = embedding_cache.get_many(model_name, texts) if use_cache else [None] * len(texts)
+
+    # 同じ説明文が複数回含まれていても1回だけベクトル化する
+    missing = list(dict.fromkeys(normalize_text(t) for t, v in zip(texts, vectors) if v is None))
+    if missing:
+        with clip_lock, torch.no_grad():
+            inputs = processor(text=missing, return_tensors="pt", padding=True, truncation=True).to(DEVICE)
+            text_features = model.get_text_features(**inputs)
+        computed = dict(zip(missing, text_features.cpu().numpy().tolist()))
+        if use_cache:
+            embedding_cache.put_many(model_name, missing, list(computed.values()))
+        vectors = [v if v is not None else computed[normalize_text(t)] for t, v in zip(texts, vectors)]
+    return vectors
 
 def save_image_locally(image_bytes: bytes, user_id: str, item_id: str) -> str | None:
     """画像をローカルに保存し、URLパスを返す。"""
@@ -102,13 +124,16 @@ def save_image_locally(image_bytes: bytes, user_id: str, item_id: str) -> str |
         return None
 
 # --- 中レベルコア関数 (DB操作) ---
-def upload_image_to_pinecone(image_bytes: bytes, user_id: str, item_metadata: dict, index: Pinecone.Index, model: CLIPModel, processor: CLIPProcessor, image_url: str) -> dict:
-    """画像をローカルに保存し、そのURLとベクトルをPineconeに登録する。"""
+def upload_image_to_pinecone(image_bytes: bytes, user_id: str, item_metadata: dict, index: Pinecone.Index, model: CLIPModel, processor: CLIPProcessor, image_url: str, item_id: str | None = None) -> dict:
+    """
+    画像をベクトル化し、そのURLとベクトルをベクトルストア（Pinecone または LocalVectorStore）に登録する。
+    item_id を省略した場合はUUIDを採番する。戻り値の vector は Cloth.vector への保存に使う。
+    """
     logger.info(f"Starting image upload for user '{user_id}' with metadata: {item_metadata.get('description')}")
     try:
-        item_id = str(uuid.uuid4())
+        item_id = item_id or str(uuid.uuid4())
         
-        image = Image.open(BytesIO(image_bytes))
+        image = load_clip_image(BytesIO(image_bytes), _clip_input_size(processor))
         image_vector = embed_image(image, model, processor)
         if not image_vector: return {"success": False, "error": "Failed to vectorize image."}
 
@@ -116,14 +141,18 @@ def upload_image_to_pinecone(image_bytes: bytes, user_id: str, item_metadata: di
         vector_to_upsert = {"id": item_id, "values": image_vector, "metadata": final_metadata}
         
         index.upsert(vectors=[vector_to_upsert], namespace=user_id)
-        return {"success": True, "item_id": item_id, "user_id": user_id, "image_url": image_url}
+        return {"success": True, "item_id": item_id, "user_id": user_id, "image_url": image_url, "vector": image_vector}
     except Exception as e:
         logger.error(f"An unexpected error occurred during upload process: {e}")
         return {"success": False, "error": str(e)}
 
-def search_items_for_user(query: str, user_id: str, index: Pinecone.Index, model: CLIPModel, processor: CLIPProcessor, top_k: int, category:str) -> list:
-    """指定したユーザーのアイテムの中から、テキストクエリで検索する。"""
-    query_vector = embed_text(query, model, processor)
+def search_items_for_user(query: str, user_id: str, index: Pinecone.Index, model: CLIPModel, processor: CLIPProcessor, top_k: int, category:str, query_vector: list | None = None) -> list:
+    """
+    指定したユーザーのアイテムの中から、テキストクエリで検索する。
+    embed_texts でまとめてベクトル化済みの場合は query_vector を渡すとテキストの再ベクトル化を省略する。
+    """
+    if query_vector is None:
+        query_vector = embed_text(query, model, processor)
     logger.info(f"Searching for items for user '{user_id}' with query: '{query}'")
     result = index.query(
      vector=query_vector, 
@@ -168,20 +197,24 @@ def get_outfit_recommendations(user_id: str, context: dict, services: dict, top_
     logger.info(f"LLM's Suggestion: {outfit_idea}")
     final_recommendation = {"reason": outfit_idea.get("reason"), "candidates": {}}
 
-    for category in ["tops", "bottoms", "outerwear", "shoes"]:
-        query = outfit_idea.get(category)
-        if query:
-            logger.info(f"--- Searching for '{category}' with query: '{query}' ---")
-            search_results = search_items_for_user(
-                query=query,
-                user_id=user_id,
-                top_k=top_k_per_category,
-                # ★★★ 必要な引数だけを明示的に渡す ★★★
-                index=services["index"],
-                model=services["model"],
-                processor=services["processor"]
-            )
-            final_recommendation["candidates"][category] = search_results
+    # 全カテゴリのクエリを1回の順伝播でまとめてベクトル化する
+    queries = {category: outfit_idea.get(category) for category in ["tops", "bottoms", "outerwear", "shoes"] if outfit_idea.get(category)}
+    query_vectors = dict(zip(queries, embed_texts(list(queries.values()), services["model"], services["processor"])))
+
+    for category, query in queries.items():
+        logger.info(f"--- Searching for '{category}' with query: '{query}' ---")
+        search_results = search_items_for_user(
+            query=query,
+            user_id=user_id,
+            top_k=top_k_per_category,
+            category=category,
+            query_vector=query_vectors[category],
+            # ★★★ 必要な引数だけを明示的に渡す ★★★
+            index=services["index"],
+            model=services["model"],
+            processor=services["processor"]
+        )
+        final_recommendation["candidates"][category] = search_results
 
     logger.success("Outfit recommendation process completed.")
     return final_recommendation
@@ -212,7 +245,7 @@ def main():
     ]
     for item in items_to_upload:
         try:
-            response = requests.get(item["url"])
+            response = http_client.get(item["url"])
             response.raise_for_status()
             upload_image_to_pinecone(
                 image_bytes=response.content,
@@ -279,21 +312,40 @@ def get_weather_info(location: str, days_from_now: int) -> dict:
     lat = coordinate[0]
     lon = coordinate[1]
 
-    api = f"https://api.openweathermap.org/data/2.5/forecast/daily?lat={lat}&lon={lon}&cnt={days_from_now}&appid={weather_api_key}"
+    forecast = get_daily_forecast(lat, lon, days_from_now)
+    if not forecast or len(forecast) < days_from_now:
+        print(f"No weather data found for {location}.")
+        return {"temperature": None, "condition": "不明"}
+
+    return forecast[days_from_now - 1]
+
+def get_daily_forecast(lat: float, lon: float, days: int) -> list | None:
+    """
+    日ごとの予報リストを返す。WEATHER_FORECAST_DAYS 日分をまとめて取得してキャッシュするので、
+    同じ地点であれば days_from_now が違っても1回の取得で済む。
+    """
+    key = (round(lat, 4), round(lon, 4))
+    forecast = forecast_cache.get(key)
+    if forecast is not None and len(forecast) >= days:
+        return forecast
+
+    weather_api_key = os.getenv("WEATHER_API_KEY")
+    count = max(days, WEATHER_FORECAST_DAYS)
+    api = f"{WEATHER_API_BASE_URL}/data/2.5/forecast/daily?lat={lat}&lon={lon}&cnt={count}&appid={weather_api_key}"
 
     try:
-        response = requests.get(api)
+        response = http_client.get(api)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"Error fetching weather data: {e}")
-        return {"temperature": None, "condition": "不明"}
-    
+        return None
+
     data = response.json()
     if not data or "list" not in data:
-        print(f"No weather data found for {location}.")
-        return {"temperature": None, "condition": "不明"}
-    
-    return data["list"][days_from_now - 1]
+        return None
+
+    forecast_cache.set(key, data["list"])
+    return data["list"]
 
 def get_lat_and_lon(city: str, country: str) -> tuple: # weather_api_key は関数内で取得するように修正されているはず
     # WEATHER_API_KEY を再度取得 (utils.py の initialize_services 修正でグローバル変数を参照するのではなく、直接 os.getenv で取得するように変更済み)
@@ -302,6 +354,11 @@ def get_lat_and_lon(city: str, country: str) -> tuple: # weather_api_key は関
         logger.error("WEATHER_API_KEY environment variable not set. Cannot get coordinates.")
         return None
 
+    cache_key = (city.lower(), country.lower())
+    coordinate = geocode_cache.get(cache_key)
+    if coordinate is not None:
+        return coordinate
+
     country_iso = pycountry.countries.get(name=country)
     if not country_iso:
         matches = [c for c in pycountry.countries if country.lower() in c.name.lower()]
@@ -310,10 +367,10 @@ def get_lat_and_lon(city: str, country: str) -> tuple: # weather_api_key は関
         logger.warning(f"Could not find ISO code for country: {country}")
         return None
     
-    api = f"https://api.openweathermap.org/geo/1.0/direct?q={city},{country_iso.alpha_2}&limit=1&appid={weather_api_key}"
+    api = f"{WEATHER_API_BASE_URL}/geo/1.0/direct?q={city},{country_iso.alpha_2}&limit=1&appid={weather_api_key}"
     
     try:
-        response = requests.get(api)
+        response = http_client.get(api)
         response.raise_for_status() # HTTPエラーレスポンス (4xx, 5xx) の場合に例外を発生させる
     except requests.RequestException as e:
         logger.error(f"位置情報取得中にエラーが発生しました: {city}, {country}. エラー: {e}")
@@ -326,7 +383,9 @@ def get_lat_and_lon(city: str, country: str) -> tuple: # weather_api_key は関
         logger.warning(f"'{city}, {country}' の座標が見つからないか、予期せぬAPI応答でした: {data}")
         return None
     
-    return (data[0].get("lat"), data[0].get("lon"))
+    coordinate = (data[0].get("lat"), data[0].get("lon"))
+    geocode_cache.set(cache_key, coordinate)
+    return coordinate
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -5,7 +5,6 @@ import time
 from io import BytesIO
 
 import dotenv
-import requests
 import torch
 import pycountry
 from PIL import Image
@@ -14,6 +13,8 @@ from transformers import AutoModel, AutoProcessor
 from pinecone import Pinecone, ServerlessSpec, exceptions
 import openai
 
+from app.http_client import http_client
+
 # -------------------------------------------------
 #  Load environment variables
 # -------------------------------------------------
@@ -207,7 +208,7 @@ def get_weather_info(location: str, days_from_now: int = 1):
         f"&appid={api_key}"
     )
     try:
-        data = requests.get(url, timeout=10).json()
+        data = http_client.get(url).json()
         return data.get("list", [{}])[days_from_now - 1]
     except Exception:
         return {"temperature": None, "condition": "不明"}
@@ -225,7 +226,7 @@ def get_lat_and_lon(city: str, country: str):
         return None
     url = f"https://api.openweathermap.org/geo/1.0/direct?q={city},{ref.alpha_2}&limit=1&appid={api_key}"
     try:
-        data = requests.get(url, timeout=10).json()
+        data = http_client.get(url).json()
         if data:
             return data[0]["lat"], data[0]["lon"]
     except Exception:
@@ -252,7 +253,7 @@ def main():
         "url": "https://m.media-amazon.com/images/I/51UHCwlXC7L._UY900_.jpg",
         "metadata": {"category": "top", "description": "formal white button‑down shirt", "color": "white"},
     }
-    img_bytes = requests.get(sample["url"], timeout=15).content
+    img_bytes = http_client.get(sample["url"], timeout=15).content
     upload_image_to_pinecone(img_bytes, user_id, sample["metadata"], services)
     time.sleep(5)
 
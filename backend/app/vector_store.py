@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+
+import numpy as np
+from loguru import logger
+
+from app.metrics import metrics
+
+# 'pinecone'（デフォルト）または 'local'
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "pinecone").lower()
+# ローカルバックエンドがDBから名前空間を読み直すまでの秒数（他ワーカーでの追加分を取り込むため）
+LOCAL_VECTOR_STORE_TTL = float(os.getenv("LOCAL_VECTOR_STORE_TTL", "30"))
+
+
+class VectorStore:
+    """
+    ベクトルストアの共通インターフェース。Pinecone の Index と同じシグネチャにしてあるので、
+    Pinecone バックエンドでは Index オブジェクトをそのまま使う。
+    """
+
+    def upsert(self, vectors: list, namespace: str):
+        raise NotImplementedError
+
+    def query(self, vector: list, top_k: int, namespace: str, filter: dict | None = None, include_metadata: bool = True) -> dict:
+        raise NotImplementedError
+
+    def delete(self, ids: list, namespace: str):
+        raise NotImplementedError
+
+
+def _matches_filter(metadata: dict, filter: dict | None) -> bool:
+    """Pinecone のメタデータフィルタ（$eq, $ne, $in, $nin）のサブセットを評価する。"""
+    if not filter:
+        return True
+    for field, condition in filter.items():
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+    return True
+
+
+class _Namespace:
+    def __init__(self):
+        self.ids = []
+        self.vectors = []
+        self.metadata = []
+        self.positions = {}
+        self.matrix = None
+        self.masks = {}
+        self.loaded_at = time.monotonic()
+
+    def upsert(self, item_id: str, values, metadata: dict):
+        vector = np.asarray(values, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector = vector / norm
+        pos = self.positions.get(item_id)
+        if pos is not None:
+            self.vectors[pos] = vector
+            self.metadata[pos] = metadata
+        else:
+            self.positions[item_id] = len(self.ids)
+            self.ids.append(item_id)
+            self.vectors.append(vector)
+            self.metadata.append(metadata)
+        self.matrix = None
+        self.masks = {}
+
+    def delete(self, ids: list):
+        removed = set(ids)
+        keep = [i for i, item_id in enumerate(self.ids) if item_id not in removed]
+        self.ids = [self.ids[i] for i in keep]
+        self.vectors = [self.vectors[i] for i in keep]
+        self.metadata = [self.metadata[i] for i in keep]
+        self.positions = {item_id: i for i, item_id in enumerate(self.ids)}
+        self.matrix = None
+        self.masks = {}
+
+    def get_matrix(self) -> np.ndarray:
+        if self.matrix is None:
+            self.matrix = np.vstack(self.vectors) if self.vectors else np.zeros((0, 0), dtype=np.float32)
+        return self.matrix
+
+    def get_mask(self, filter: dict) -> np.ndarray:
+        # 同じフィルタ（カテゴリ指定など）は繰り返し使われるので、行列と同じ寿命でキャッシュする
+        key = repr(sorted(filter.items()))
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = np.fromiter((_matches_filter(m, filter) for m in self.metadata), dtype=bool, count=len(self.metadata))
+            self.masks[key] = mask
+        return mask
+
+
+class LocalVectorStore(VectorStore):
+    """
+    ユーザー（名前空間）ごとの NumPy 行列でコサイン類似度の完全探索を行うインプロセスのベクトルストア。
+    名前空間は初回アクセス時に loader（通常は Cloth.vector を読むDBローダー）から構築する。
+    """
+
+    def __init__(self, loader=None, ttl: float = LOCAL_VECTOR_STORE_TTL):
+        self._loader = loader
+        self._ttl = ttl
+        self._namespaces = {}
+        self._lock = threading.RLock()
+
+    def _get_namespace(self, namespace: str) -> _Namespace:
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is not None and (self._ttl <= 0 or time.monotonic() - ns.loaded_at < self._ttl):
+                return ns
+            ns = _Namespace()
+            if self._loader:
+                for item in self._loader(namespace):
+                    ns.upsert(item["id"], item["values"], item.get("metadata", {}))
+            self._namespaces[namespace] = ns
+            return ns
+
+    def upsert(self, vectors: list, namespace: str):
+        with self._lock:
+            ns = self._get_namespace(namespace)
+            for v in vectors:
+                ns.upsert(str(v["id"]), v["values"], v.get("metadata", {}))
+        return {"upserted_count": len(vectors)}
+
+    def query(self, vector: list, top_k: int, namespace: str, filter: dict | None = None, include_metadata: bool = True) -> dict:
+        start = time.perf_counter()
+        with self._lock:
+            ns = self._get_namespace(namespace)
+            matrix = ns.get_matrix()
+            ids, metadata = ns.ids, ns.metadata
+            mask = ns.get_mask(filter) if filter else None
+        if not ids:
+            return {"matches": []}
+
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm > 0:
+            query = query / norm
+        scores = matrix @ query
+
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            candidates = int(mask.sum())
+        else:
+            candidates = len(ids)
+
+        k = min(top_k, candidates)
+        if k <= 0:
+            return {"matches": []}
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        matches = [
+            {"id": ids[i], "score": float(scores[i]), "metadata": metadata[i] if include_metadata else {}}
+            for i in top
+        ]
+        metrics.observe("vector_query_seconds", time.perf_counter() - start, backend="local")
+        return {"matches": matches}
+
+    def delete(self, ids: list, namespace: str):
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is not None:
+                ns.delete([str(i) for i in ids])
+
+    def invalidate(self, namespace: str | None = None):
+        with self._lock:
+            if namespace is None:
+                self._namespaces.clear()
+            else:
+                self._namespaces.pop(namespace, None)
+
+
+def cloth_metadata(cloth) -> dict:
+    """Cloth 行からベクトルストア用のメタデータを組み立てる（add_cloth で登録する内容と同じ形）。"""
+    return {
+        "user_id": str(cloth.user_id),
+        "image_url": cloth.image_url,
+        "name": cloth.name,
+        "category": cloth.category,
+        "color": cloth.color,
+        "material": cloth.material if cloth.material else "unknown",
+        "season": cloth.season if cloth.season else "unknown",
+        "is_formal": cloth.is_formal if cloth.is_formal is not None else False,
+        "description": f"{cloth.color}の{cloth.material}製の{cloth.name} ({cloth.category})",
+    }
+
+
+def load_user_vectors(namespace: str) -> list:
+    """DB に保存済みの Cloth.vector からユーザーのベクトルを読み込む。"""
+    from app.database import SessionLocal
+    from app.models import Cloth
+
+    session = SessionLocal()
+    try:
+        clothes = session.query(Cloth).filter(Cloth.user_id == int(namespace), Cloth.vector.isnot(None)).all()
+        logger.info(f"Loaded {len(clothes)} vectors for namespace '{namespace}' from DB")
+        return [{"id": str(c.id), "values": c.vector, "metadata": cloth_metadata(c)} for c in clothes if c.vector]
+    finally:
+        session.close()
+
+
+def create_vector_store(backend: str = VECTOR_STORE_BACKEND):
+    """設定に応じたベクトルストアを生成する。"""
+    if backend == "local":
+        return LocalVectorStore(loader=load_user_vectors)
+    if backend == "pinecone":
+        from app.services import services
+        return services["index"]
+    raise ValueError(f"Unknown VECTOR_STORE_BACKEND: {backend}")
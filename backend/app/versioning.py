@@ -0,0 +1,97 @@
+import hashlib
+from collections import defaultdict
+
+from flask import request, Response
+from sqlalchemy import event, inspect, update, select
+from sqlalchemy.orm import Session
+
+from app.compression import CONTENT_CODINGS
+from app.models import User, Cloth, OutfitSuggestion, UserPreference
+
+# ユーザーごとのデータの種類と、そのバージョンを持つ users の列
+WARDROBE = "wardrobe"
+PREFERENCES = "preferences"
+HISTORY = "history"
+VERSION_COLUMNS = {
+    WARDROBE: User.__table__.c.wardrobe_version,
+    PREFERENCES: User.__table__.c.preferences_version,
+    HISTORY: User.__table__.c.history_version,
+}
+
+# 履歴のレスポンスに含まれる服の列（これが変わったら履歴のバージョンも上げる）
+HISTORY_CLOTH_ATTRIBUTES = ("name", "color", "image_url")
+
+
+def bump_version(session, user_id, *kinds):
+    """
+    ユーザーのデータのバージョンを上げる。session と同じトランザクションで更新されるので、
+    ロールバックされればバージョンも戻る。query().update()/delete() のようにフラッシュを通らない更新の後に呼ぶ。
+    """
+    for kind in kinds:
+        column = VERSION_COLUMNS[kind]
+        session.execute(update(User.__table__).where(User.__table__.c.id == int(user_id)).values({column: column + 1}))
+
+
+def _changed_kinds(session, obj) -> set:
+    if isinstance(obj, UserPreference):
+        return {PREFERENCES}
+    if isinstance(obj, OutfitSuggestion):
+        return {HISTORY}
+    if isinstance(obj, Cloth):
+        if obj in session.new:
+            return {WARDROBE}
+        if obj in session.deleted:
+            return {WARDROBE, HISTORY}
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in HISTORY_CLOTH_ATTRIBUTES):
+            return {WARDROBE, HISTORY}
+        return {WARDROBE}
+    return set()
+
+
+@event.listens_for(Session, "after_flush")
+def _bump_versions_after_flush(session, flush_context):
+    # after_flush の時点では new/dirty/deleted はまだフラッシュ前の状態を指している
+    user_ids = defaultdict(set)
+    for obj in list(session.new) + list(session.deleted) + [o for o in session.dirty if session.is_modified(o)]:
+        user_id = getattr(obj, "user_id", None)
+        if user_id is None:
+            continue
+        for kind in _changed_kinds(session, obj):
+            user_ids[kind].add(int(user_id))
+
+    connection = session.connection()
+    for kind, ids in user_ids.items():
+        column = VERSION_COLUMNS[kind]
+        connection.execute(update(User.__table__).where(User.__table__.c.id.in_(ids)).values({column: column + 1}))
+
+
+def current_etag(session, user_id, kind) -> str | None:
+    """
+    ユーザーのデータの強いETag。バージョンとクエリパラメータ（ページ・絞り込み条件）から作るので、
+    行を読み込んだりシリアライズしたりせずに計算できる。ユーザーが存在しなければ None。
+    """
+    version = session.execute(select(VERSION_COLUMNS[kind]).where(User.__table__.c.id == int(user_id))).scalar()
+    if version is None:
+        return None
+    args = hashlib.sha1(request.query_string).hexdigest()[:12]
+    return f"{kind}-{user_id}-{version}-{args}"
+
+
+def not_modified(etag: str | None):
+    """If-None-Match が etag と一致すれば 304 のレスポンスを、そうでなければ None を返す。"""
+    if etag is None:
+        return None
+    # 圧縮したレスポンスのETagには符号化の名前が付いている（app.compression）
+    for candidate in [etag] + [f"{etag}-{coding}" for coding in CONTENT_CODINGS]:
+        if request.if_none_match.contains(candidate):
+            return with_etag(Response(status=304), candidate)
+    return None
+
+
+def with_etag(response, etag: str | None):
+    if etag is not None:
+        response.set_etag(etag)
+        # ブラウザにはキャッシュさせるが、使う前に必ず If-None-Match で確認させる
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
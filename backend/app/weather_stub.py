@@ -0,0 +1,85 @@
+"""
+OpenWeatherMap の geocoding / daily forecast API を真似るローカルのスタブサーバー。
+外部APIキーなしで天気まわりの動作確認やベンチマークを行うために使う。
+
+    python -m app.weather_stub --port 8081
+    WEATHER_API_BASE_URL=http://localhost:8081 WEATHER_API_KEY=dummy flask run
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+CITIES = {
+    "kyoto": (35.0116, 135.7681),
+    "tokyo": (35.6895, 139.6917),
+    "osaka": (34.6937, 135.5023),
+}
+
+
+def _forecast_day(day: int) -> dict:
+    return {
+        "dt": int(time.time()) + day * 86400,
+        "temp": {"day": 293.15 + day, "min": 288.15 + day, "max": 298.15 + day},
+        "humidity": 60,
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+    }
+
+
+class WeatherStubHandler(BaseHTTPRequestHandler):
+    # サーバー全体でのリクエスト数（キャッシュのヒット確認に使う）
+    request_counts = {"geocode": 0, "forecast": 0}
+    latency = 0.0
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if self.latency:
+            time.sleep(self.latency)
+
+        if url.path == "/geo/1.0/direct":
+            self.request_counts["geocode"] += 1
+            city = params.get("q", [""])[0].split(",")[0].strip().lower()
+            body = [{"name": city, "lat": CITIES[city][0], "lon": CITIES[city][1]}] if city in CITIES else []
+        elif url.path == "/data/2.5/forecast/daily":
+            self.request_counts["forecast"] += 1
+            count = int(params.get("cnt", ["7"])[0])
+            body = {"cnt": count, "list": [_forecast_day(day) for day in range(count)]}
+        else:
+            self.send_error(404)
+            return
+
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(port: int = 0, latency: float = 0.0):
+    """スタブサーバーをバックグラウンドスレッドで起動し、(server, base_url) を返す。"""
+    handler = type("Handler", (WeatherStubHandler,), {"request_counts": {"geocode": 0, "forecast": 0}, "latency": latency})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="各レスポンスに加える遅延（秒）")
+    args = parser.parse_args()
+    handler = type("Handler", (WeatherStubHandler,), {"latency": args.latency})
+    server = ThreadingHTTPServer(("0.0.0.0", args.port), handler)
+    print(f"Weather stub listening on http://0.0.0.0:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+CLIPに渡すまでの画像前処理について、フル解像度でデコードして CLIPProcessor に縮小させる従来の方法と、
+draftモードで縮小デコードして224px角に揃えてから渡す方法の実時間・CPU時間・デコード後の画素バッファを比較する。
+
+    python -m benchmarks.bench_image_decode --rounds 20
+    python -m benchmarks.bench_image_decode photo1.jpg photo2.jpg
+"""
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from app.images import load_clip_image
+from app.services import services
+
+
+def _synthetic_photo(width: int = 4032, height: int = 3024) -> bytes:
+    """12MPのスマホ写真相当のJPEGを作る。"""
+    x, y = np.linspace(0, 1, width), np.linspace(0, 1, height)
+    pixels = np.stack([np.outer(np.sin(y * 7), np.cos(x * 5)), np.outer(y, x), np.outer(np.cos(y * 3), x)], axis=-1)
+    buffer = BytesIO()
+    Image.fromarray((pixels * 127 + 128).astype(np.uint8)).save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _measure(fn, rounds: int) -> tuple[float, float]:
+    fn()  # ウォームアップ
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - wall) / rounds, (time.process_time() - cpu) / rounds
+
+
+def _decoded_bytes(data: bytes, draft: bool) -> int:
+    with Image.open(BytesIO(data)) as image:
+        if draft:
+            image.draft("RGB", (224, 224))
+        width, height = image.size
+    return width * height * 3
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("images", nargs="*", help="計測に使う画像ファイル（省略時は12MP相当の画像を生成）")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    processor = services["processor"]
+    if args.images:
+        samples = []
+        for path in args.images:
+            with open(path, "rb") as fp:
+                samples.append(fp.read())
+    else:
+        samples = [_synthetic_photo()]
+
+    def baseline():
+        for data in samples:
+            processor(images=Image.open(BytesIO(data)).convert("RGB"), return_tensors="pt")
+
+    def fast_path():
+        for data in samples:
+            processor(images=load_clip_image(BytesIO(data)), return_tensors="pt", do_resize=False, do_center_crop=False)
+
+    results = [("full decode", _measure(baseline, args.rounds)), ("draft+resize", _measure(fast_path, args.rounds))]
+    for name, (wall, cpu) in results:
+        print(f"{name:>12}: wall={wall / len(samples) * 1000:7.2f}ms  cpu={cpu / len(samples) * 1000:7.2f}ms per image")
+    full = sum(_decoded_bytes(d, draft=False) for d in samples) / len(samples)
+    drafted = sum(_decoded_bytes(d, draft=True) for d in samples) / len(samples)
+    print(f"decoded pixel buffer: {full / 2**20:.1f}MiB -> {drafted / 2**20:.1f}MiB per image")
+    print(f"cpu time saved per image: {(1 - results[1][1][1] / results[0][1][1]) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+服の一覧（GET /api/clothes/<user_id> のレスポンス）を想定したペイロードについて、
+Flask標準の JSON プロバイダーと orjson のシリアライズ時間、および圧縮後のバイト数を比較する。
+
+    python -m benchmarks.bench_json_payload --items 200 1000 5000
+"""
+import argparse
+import gzip
+import time
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+from app.compression import COMPRESS_BROTLI_QUALITY, COMPRESS_GZIP_LEVEL, brotli
+from app.json_provider import OrjsonProvider, orjson
+
+CATEGORIES = ["トップス", "ボトムス", "アウター", "シューズ"]
+COLORS = ["白", "黒", "ネイビー", "ベージュ", "グレー"]
+
+
+def _wardrobe(items: int) -> list:
+    return [{
+        "id": i, "name": f"{COLORS[i % 5]}の{CATEGORIES[i % 4]} {i}", "category": CATEGORIES[i % 4], "color": COLORS[i % 5],
+        "material": "コットン", "season": "春,夏" if i % 2 else "秋,冬", "is_formal": i % 7 == 0,
+        "available": True, "preferred": i % 3 == 0, "index_status": "indexed",
+        "image_url": f"{i:08x}-4b1e-4a3c-9d2e-7f5a6b8c9d0e.jpg",
+        "thumbnail_url": f"{i:08x}-4b1e-4a3c-9d2e-7f5a6b8c9d0e_thumb.webp",
+        "medium_url": f"{i:08x}-4b1e-4a3c-9d2e-7f5a6b8c9d0e_medium.webp",
+    } for i in range(items)]
+
+
+def _measure(fn, rounds: int) -> float:
+    fn()  # ウォームアップ
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, nargs="+", default=[200, 1000, 5000])
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    providers = {"json": DefaultJSONProvider(app)}
+    if orjson:
+        providers["orjson"] = OrjsonProvider(app)
+    else:
+        print("orjson is not installed; only the stdlib provider is measured")
+
+    with app.app_context():
+        for items in args.items:
+            payload = _wardrobe(items)
+            print(f"--- {items} items")
+            for name, provider in providers.items():
+                seconds = _measure(lambda: provider.response(payload).get_data(), args.rounds)
+                body = provider.response(payload).get_data()
+                print(f"{name:>7}: serialize={seconds * 1000:7.2f}ms  raw={len(body):>8,}B")
+            body = providers.get("orjson", providers["json"]).response(payload).get_data()
+            encoders = {"gzip": lambda: gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL)}
+            if brotli:
+                encoders["br"] = lambda: brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+            for name, encode in encoders.items():
+                seconds = _measure(encode, args.rounds)
+                print(f"{name:>7}: compress={seconds * 1000:7.2f}ms  wire={len(encode()):>8,}B ({len(encode()) / len(body) * 100:.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+/api/search/outfit の候補選定について、ローカルのスコアリング（local）のレイテンシを測る。
+OPENAI_API_KEY が設定されていれば、同じ候補を llm_batch でも選ばせて、レイテンシと選んだ候補の一致率を比較する。
+
+    python -m benchmarks.bench_rerank --cases 50
+    OPENAI_API_KEY=sk-... python -m benchmarks.bench_rerank --cases 20
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date
+
+from app.rerank import select_all_locally, select_all_with_llm
+
+COLORS = ["白", "黒", "ネイビー", "ベージュ", "グレー", "赤", "カーキ", "ブラウン"]
+SEASONS = ["春,夏", "秋,冬", "春,秋", "夏", "冬", "unknown"]
+ITEMS = {
+    "tops": ["シャツ", "Tシャツ", "ニット", "ブラウス", "パーカー"],
+    "bottoms": ["スラックス", "デニム", "チノパン", "スカート", "ショートパンツ"],
+    "shoes": ["革靴", "スニーカー", "ローファー", "ブーツ", "サンダル"],
+}
+OCCASIONS = ["オフィスで着る", "休日にカジュアルに着る", "結婚式に着ていく", "", "ラフに過ごせる"]
+
+
+def _cases(count: int, top_k: int, seed: int) -> list:
+    """ベクトル検索の結果（スコアの高い順）と要望の組を作る。"""
+    rng = random.Random(seed)
+    cases = []
+    for _ in range(count):
+        queries, candidates = {}, {}
+        for category, names in ITEMS.items():
+            queries[category] = f"{rng.choice(OCCASIONS)}{rng.choice(COLORS)}の{rng.choice(names)}"
+            items = []
+            for rank in range(top_k):
+                color, name, material = rng.choice(COLORS), rng.choice(names), rng.choice(["コットン", "ウール", "レザー", "ポリエステル"])
+                items.append({
+                    "id": str(rng.randrange(1, 100000)),
+                    "score": round(0.32 - rank * rng.uniform(0.002, 0.01), 4),
+                    "metadata": {
+                        "color": color, "season": rng.choice(SEASONS), "is_formal": rng.random() < 0.3,
+                        "description": f"{color}の{material}製の{name} ({category})",
+                    },
+                })
+            candidates[category] = items
+        cases.append((queries, candidates, {item["id"] for items in candidates.values() for item in items if rng.random() < 0.2}))
+    return cases
+
+
+def _percentiles(values: list) -> str:
+    values = sorted(values)
+    pick = lambda p: values[min(len(values) - 1, int(len(values) * p))]
+    return f"p50={pick(0.5):9.3f}ms  p95={pick(0.95):9.3f}ms  mean={statistics.fmean(values):9.3f}ms"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cases = _cases(args.cases, args.top_k, args.seed)
+    today = date.today()
+
+    local_ms, local_picks = [], []
+    for queries, candidates, preferred_ids in cases:
+        start = time.perf_counter()
+        selections = select_all_locally(queries, candidates, preferred_ids, today)
+        local_ms.append((time.perf_counter() - start) * 1000)
+        local_picks.append({category: item["id"] for category, (item, _) in selections.items()})
+    print(f"    local: {_percentiles(local_ms)}  ({args.cases} cases x {len(ITEMS)} categories)")
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("OPENAI_API_KEY is not set; skipping the llm_batch comparison")
+        return
+
+    from openai import OpenAI
+    client = OpenAI()
+    llm_ms, agree, total, top1 = [], 0, 0, 0
+    for (queries, candidates, _), local in zip(cases, local_picks):
+        start = time.perf_counter()
+        selections = select_all_with_llm(client, queries, candidates, timeout=30)
+        llm_ms.append((time.perf_counter() - start) * 1000)
+        for category, (item, _) in selections.items():
+            total += 1
+            agree += item["id"] == local[category]
+            top1 += item["id"] == candidates[category][0]["id"]
+    print(f"llm_batch: {_percentiles(llm_ms)}")
+    print(f"agreement with llm_batch: local={agree / total * 100:.1f}%  vector top-1={top1 / total * 100:.1f}%  ({total} selections)")
+
+
+if __name__ == "__main__":
+    main()
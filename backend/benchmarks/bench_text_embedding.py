@@ -0,0 +1,43 @@
+"""
+/api/search/outfit 1回分のテキストベクトル化について、カテゴリごとの embed_text と
+一括の embed_texts の実時間・CPU時間を比較するベンチマーク。
+
+    python -m benchmarks.bench_text_embedding --rounds 50
+"""
+import argparse
+import time
+
+import torch
+
+from app.services import services
+from app.utils import embed_text, embed_texts
+
+QUERIES = ["white cotton t-shirt", "blue slim-fit jeans", "white leather sneakers"]
+
+
+def _measure(fn, rounds: int) -> tuple[float, float]:
+    fn()  # ウォームアップ
+    wall, cpu = time.perf_counter(), time.process_time()
+    for _ in range(rounds):
+        fn()
+    return (time.perf_counter() - wall) / rounds, (time.process_time() - cpu) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=50)
+    args = parser.parse_args()
+
+    model, processor = services["model"], services["processor"]
+    print(f"torch threads: {torch.get_num_threads()}")
+
+    sequential = _measure(lambda: [embed_text(q, model, processor) for q in QUERIES], args.rounds)
+    batched = _measure(lambda: embed_texts(QUERIES, model, processor), args.rounds)
+
+    for name, (wall, cpu) in [("sequential", sequential), ("batched", batched)]:
+        print(f"{name:>10}: wall={wall * 1000:7.2f}ms  cpu={cpu * 1000:7.2f}ms per request")
+    print(f"cpu time saved per request: {(1 - batched[1] / sequential[1]) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+ベクトルストアのクエリ遅延を計測するベンチマーク。
+
+    python -m benchmarks.bench_vector_store --items 500 --queries 1000
+    python -m benchmarks.bench_vector_store --pinecone   # Pinecone と比較する（PINECONE_API_KEY が必要）
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+from app.vector_store import LocalVectorStore
+
+CATEGORIES = ["tops", "bottoms", "shoes", "outerwear"]
+
+
+def _populate(store, namespace: str, items: int, dim: int, rng):
+    vectors = [
+        {
+            "id": str(i),
+            "values": rng.standard_normal(dim).tolist(),
+            "metadata": {"category": CATEGORIES[i % len(CATEGORIES)], "description": f"item {i}"},
+        }
+        for i in range(items)
+    ]
+    for start in range(0, len(vectors), 100):
+        store.upsert(vectors=vectors[start:start + 100], namespace=namespace)
+
+
+def _run(store, namespace: str, queries: int, dim: int, rng) -> list:
+    latencies = []
+    for i in range(queries):
+        vector = rng.standard_normal(dim).tolist()
+        start = time.perf_counter()
+        store.query(vector=vector, top_k=5, include_metadata=True, namespace=namespace,
+                    filter={"category": {"$eq": CATEGORIES[i % len(CATEGORIES)]}})
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(name: str, latencies: list):
+    latencies_us = sorted(l * 1e6 for l in latencies)
+    p95 = latencies_us[int(len(latencies_us) * 0.95) - 1]
+    print(f"{name:>10}: mean={statistics.mean(latencies_us):9.1f}us  p50={statistics.median(latencies_us):9.1f}us  p95={p95:9.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--pinecone", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    namespace = "bench-user"
+
+    local = LocalVectorStore(ttl=0)
+    _populate(local, namespace, args.items, args.dim, rng)
+    _report("local", _run(local, namespace, args.queries, args.dim, rng))
+
+    if args.pinecone:
+        from app.services import services
+        index = services["index"]
+        _populate(index, namespace, args.items, args.dim, rng)
+        time.sleep(10)  # インデックスへの反映を待つ
+        _report("pinecone", _run(index, namespace, min(args.queries, 100), args.dim, rng))
+        index.delete(delete_all=True, namespace=namespace)
+
+
+if __name__ == "__main__":
+    main()
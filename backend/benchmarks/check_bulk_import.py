@@ -0,0 +1,142 @@
+"""
+POST /api/clothes/bulk の入力チェックとトランザクションの範囲を確認する。
+- 大きすぎる画像・リクエスト（zipは展開後の合計）は413、件数の上限超え・オブジェクトでない metadata は400（500にならない）
+- CLIPのベクトル化・ベクトルストアへの登録の間はDB接続を持っていない
+- 画像の一時ファイルは、失敗したリクエストでも派生画像の生成後でも残らない
+MinIO・CLIP・ベクトルストアはこのスクリプト内の偽物に置き換える。失敗すると終了コード1。
+
+    python -m benchmarks.check_bulk_import
+"""
+import json
+import os
+import sys
+import tempfile
+import zipfile
+from io import BytesIO
+
+_db_path = os.path.join(tempfile.mkdtemp(), "bulk.sqlite3")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "check-bulk-import-secret-key-000000")
+os.environ["INGEST_TMP_DIR"] = _tmp_dir = tempfile.mkdtemp()
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from app import ingest  # noqa: E402
+from app.app import app  # noqa: E402
+from app.database import engine, SessionLocal  # noqa: E402
+from app.models import Base, User, Cloth  # noqa: E402
+from app.routes import clothing  # noqa: E402
+from app.services import services  # noqa: E402
+
+checked_out_during_embedding = []
+
+
+class FakeVectorStore:
+    def __init__(self):
+        self.vectors = []
+
+    def upsert(self, vectors, namespace):
+        checked_out_during_embedding.append(engine.pool.checkedout())
+        self.vectors.extend(vectors)
+
+
+def fake_embed_images(images, model, processor, batch_size):
+    checked_out_during_embedding.append(engine.pool.checkedout())
+    return [[0.1, 0.2, 0.3] for _ in images]
+
+
+def _png() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _zip(files) -> bytes:
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, body in files:
+            archive.writestr(name, body)
+    return buffer.getvalue()
+
+
+class SyncExecutor:
+    """派生画像のジョブをその場で実行する（一時ファイルが消えることを確かめるため）。"""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+def _post(client, headers, files, metadata, archive=False):
+    if archive:
+        data = {"archive": (BytesIO(_zip(files)), "clothes.zip"), "metadata": json.dumps(metadata)}
+    else:
+        data = {"images": [(BytesIO(body), name) for name, body in files], "metadata": json.dumps(metadata)}
+    return client.post("/api/clothes/bulk", data=data, headers=headers, content_type="multipart/form-data")
+
+
+def main() -> int:
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    session.add(User(id=1, username="user1", password_hash="x"))
+    session.commit()
+    session.close()
+
+    ingest.upload_stream = lambda fileobj, key, content_type=None: 0
+    ingest.embed_images = fake_embed_images
+    ingest.generate_derivatives = lambda image_key, source: {}
+    ingest.get_executor = SyncExecutor
+    vector_store = FakeVectorStore()
+    services._instances.update({"vector_store": vector_store, "model": object(), "processor": object()})
+    clothing.BULK_MAX_IMAGE_BYTES = 10_000
+    clothing.BULK_IMPORT_MAX_ITEMS = 3
+    clothing.BULK_MAX_TOTAL_BYTES = 20_000
+
+    client = app.test_client()
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+    png = _png()
+    meta = {"name": "シャツ", "category": "トップス", "color": "白"}
+
+    failures = []
+    cases = {
+        "oversized image": (413, [("big.png", b"0" * 10_001)], [meta], False),
+        "oversized request": (413, [(f"{i}.png", b"0" * 9_000) for i in range(3)], [meta] * 3, False),
+        "oversized archive contents": (413, [(f"{i}.png", b"0" * 9_000) for i in range(3)], [meta] * 3, True),
+        "too many images": (400, [(f"{i}.png", png) for i in range(4)], [meta] * 4, False),
+        "metadata is not an array": (400, [("a.png", png)], meta, False),
+        "metadata entry is not an object": (400, [("a.png", png)], ["シャツ"], False),
+    }
+    for name, (expected, files, metadata, archive) in cases.items():
+        status = _post(client, headers, files, metadata, archive).status_code
+        print(f"{name}: {status}")
+        if status != expected:
+            failures.append(f"{name}: expected {expected}, got {status}")
+
+    response = _post(client, headers, [("a.png", png), ("b.png", png)], [meta, meta])
+    body = response.get_json()
+    print(f"valid request: {response.status_code} {body.get('imported')} imported")
+    if response.status_code != 200 or body.get("imported") != 2 or not all(r.get("indexed") for r in body["results"]):
+        failures.append(f"valid request was not imported: {response.status_code} {body}")
+    if any(checked_out_during_embedding):
+        failures.append(f"a DB connection was held during embedding/upsert: {checked_out_during_embedding}")
+
+    session = SessionLocal()
+    statuses = [(c.index_status, c.vector is not None) for c in session.query(Cloth)]
+    wardrobe_version = session.get(User, 1).wardrobe_version
+    session.close()
+    if statuses != [(ingest.INDEX_INDEXED, True)] * 2:
+        failures.append(f"clothes were not marked as indexed: {statuses}")
+    if wardrobe_version < 2:
+        failures.append(f"wardrobe version was not bumped after indexing: {wardrobe_version}")
+    if os.listdir(_tmp_dir):
+        failures.append(f"temporary files were left behind: {os.listdir(_tmp_dir)}")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print("OK" if not failures else "")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
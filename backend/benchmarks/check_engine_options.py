@@ -0,0 +1,61 @@
+"""
+MySQL など SQLite 以外の DATABASE_URL でエンジンのプール設定が組み立てられることを確認する。
+_engine_options の結果で実際にエンジンを作り（接続先は一時的なSQLiteファイル）、プールの設定値を比べる。
+MySQLのドライバーが入っていれば、MySQLのURLで app.database をインポートできることも確かめる。失敗すると終了コード1。
+
+    python -m benchmarks.check_engine_options
+"""
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'engine.sqlite3')}")
+
+from sqlalchemy import create_engine  # noqa: E402
+
+from app import database  # noqa: E402
+
+MYSQL_URL = "mysql+mysqlconnector://outfit_user:outfit_password@db:3306/outfit_db"
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main() -> int:
+    failures = []
+
+    options = database._engine_options(MYSQL_URL)
+    expected = {
+        "poolclass": database.TimedQueuePool, "pool_size": database.DB_POOL_SIZE, "max_overflow": database.DB_MAX_OVERFLOW,
+        "pool_timeout": database.DB_POOL_TIMEOUT, "pool_recycle": database.DB_POOL_RECYCLE, "pool_pre_ping": database.DB_POOL_PRE_PING,
+    }
+    if options != expected:
+        failures.append(f"unexpected options for a MySQL URL: {options}")
+    if database._engine_options("sqlite:///x.sqlite3"):
+        failures.append("SQLite URLs should keep the default pool")
+
+    # SQLite のファイルDBは QueuePool でも動くので、同じ設定でエンジンを作ってプールの値を確かめる
+    engine = create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'pool.sqlite3')}", **options)
+    pool = engine.pool
+    if not isinstance(pool, database.TimedQueuePool) or pool.size() != database.DB_POOL_SIZE or pool._max_overflow != database.DB_MAX_OVERFLOW:
+        failures.append(f"engine pool does not match the options: {pool.status()}")
+    engine.dispose()
+
+    if importlib.util.find_spec("mysql") is not None:
+        result = subprocess.run(
+            [sys.executable, "-c", "import app.database as d; print(type(d.engine.pool).__name__)"],
+            cwd=BACKEND_DIR, env={**os.environ, "DATABASE_URL": MYSQL_URL}, capture_output=True, text=True,
+        )
+        if result.returncode != 0 or "TimedQueuePool" not in result.stdout:
+            failures.append(f"importing app.database with a MySQL URL failed:\n{result.stderr}")
+    else:
+        print("mysql-connector is not installed; skipping the import check with a MySQL URL")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print("OK" if not failures else "")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
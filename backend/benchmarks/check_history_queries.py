@@ -0,0 +1,65 @@
+"""
+GET /api/suggestions が履歴の件数によらず一定回数のSQLで返ることを確認する（N+1 の再発防止）。
+一時的なSQLiteのDBに履歴を作り、件数を変えて発行されたSQLの数を比べる。失敗すると終了コード1。
+
+    python -m benchmarks.check_history_queries
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+_db_path = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "check-history-queries-secret-key-0000")
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.database import engine, SessionLocal, count_queries  # noqa: E402
+from app.models import Base, User, Cloth, OutfitSuggestion  # noqa: E402
+
+
+def _seed(user_id: int, suggestions: int):
+    session = SessionLocal()
+    session.add(User(id=user_id, username=f"user{user_id}", password_hash="x"))
+    # 提案ごとに別の服を使う（同じ服だとセッションのキャッシュが効いて N+1 が見えなくなる）
+    clothes = [Cloth(user_id=user_id, name=f"cloth{i}", category="トップス", color="白", image_url=f"{i}.jpg") for i in range(suggestions * 3)]
+    session.add_all(clothes)
+    session.flush()
+    for i in range(suggestions):
+        session.add(OutfitSuggestion(
+            user_id=user_id, suggested_date=date(2025, 1, 1) + timedelta(days=i // 2),
+            top_id=clothes[3 * i].id, bottom_id=clothes[3 * i + 1].id, shoes_id=clothes[3 * i + 2].id if i % 4 else None
+        ))
+    session.commit()
+    session.close()
+
+
+def _count(client, user_id: int, query: str = "") -> tuple[int, list]:
+    with app.app_context():
+        token = create_access_token(identity=str(user_id))
+    with count_queries() as statements:
+        response = client.get(f"/api/suggestions{query}", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200, response.get_json()
+    return len(statements), response.get_json()
+
+
+def main() -> int:
+    Base.metadata.create_all(engine)
+    _seed(1, 5)
+    _seed(2, 150)
+    client = app.test_client()
+
+    small, _ = _count(client, 1)
+    large, rows = _count(client, 2, "?limit=150")
+    page, _ = _count(client, 2, "?from=2025-01-10&to=2025-02-10&limit=20")
+    print(f"queries: 5 suggestions={small}, 150 suggestions={large}, filtered page={page}")
+
+    ok = small == large == page and all(r["top"] and r["bottom"] for r in rows)
+    print("OK" if ok else "FAILED: query count depends on the number of suggestions")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
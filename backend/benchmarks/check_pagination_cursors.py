@@ -0,0 +1,71 @@
+"""
+GET /api/clothes/<user_id> と GET /api/suggestions が、不正なカーソル（形式は正しいが中身の型が違うものを含む）に
+500ではなく400を返し、正しいカーソルでは次のページを返すことを確認する。失敗すると終了コード1。
+
+    python -m benchmarks.check_pagination_cursors
+"""
+import os
+import sys
+import tempfile
+from datetime import date
+
+_db_path = os.path.join(tempfile.mkdtemp(), "cursors.sqlite3")
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_path}"
+os.environ.setdefault("JWT_SECRET_KEY", "check-pagination-cursors-secret-key-00")
+
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app.app import app  # noqa: E402
+from app.database import engine, SessionLocal  # noqa: E402
+from app.models import Base, User, Cloth, OutfitSuggestion  # noqa: E402
+from app.pagination import encode_cursor, NEXT_CURSOR_HEADER  # noqa: E402
+
+MALFORMED = {
+    "not base64": "!!!",
+    "not json": encode_cursor("x")[:-2] + "@@",
+    "object": "eyJhIjoxfQ",  # {"a":1}
+}
+CLOTHES_PAYLOADS = {"string id": ("abc",), "null id": (None,), "list id": ([1],), "too many values": (1, 2)}
+HISTORY_PAYLOADS = {"bad date": ("2025-13-01", 1), "numeric date": (20250101, 1), "string id": ("2025-01-01", "x"), "too few values": ("2025-01-01",)}
+
+
+def _seed():
+    session = SessionLocal()
+    session.add(User(id=1, username="user1", password_hash="x"))
+    clothes = [Cloth(user_id=1, name=f"cloth{i}", category="トップス", color="白") for i in range(3)]
+    session.add_all(clothes)
+    session.flush()
+    session.add_all([OutfitSuggestion(user_id=1, suggested_date=date(2025, 1, i + 1), top_id=clothes[0].id) for i in range(3)])
+    session.commit()
+    session.close()
+
+
+def main() -> int:
+    Base.metadata.create_all(engine)
+    _seed()
+    client = app.test_client()
+    with app.app_context():
+        headers = {"Authorization": f"Bearer {create_access_token(identity='1')}"}
+
+    failures = []
+    for url, payloads in (("/api/clothes/1", CLOTHES_PAYLOADS), ("/api/suggestions", HISTORY_PAYLOADS)):
+        cursors = {**MALFORMED, **{name: encode_cursor(*values) for name, values in payloads.items()}}
+        for name, cursor in cursors.items():
+            status = client.get(url, query_string={"cursor": cursor}, headers=headers).status_code
+            print(f"{url} cursor={name!r}: {status}")
+            if status != 400:
+                failures.append(f"{url} returned {status} for a {name} cursor")
+
+        first = client.get(url, query_string={"limit": 1}, headers=headers)
+        second = client.get(url, query_string={"limit": 1, "cursor": first.headers.get(NEXT_CURSOR_HEADER)}, headers=headers)
+        if second.status_code != 200 or second.get_json() == first.get_json():
+            failures.append(f"{url} did not return the next page for a valid cursor ({second.status_code})")
+
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    print("OK" if not failures else "")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
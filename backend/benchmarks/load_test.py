@@ -0,0 +1,218 @@
+"""
+同時接続数を指定してAPIに負荷をかけ、スループットとレイテンシを測る。
+
+    # 起動済みのサーバーに負荷をかける
+    python -m benchmarks.load_test --url http://localhost:5000/api/propose --token <JWT> --concurrency 16
+
+    # gunicorn をワーカークラスごとに起動して /api/propose を比較する。
+    # OpenAI と天気APIはローカルのスタブ（--llm-latency 秒で応答）に差し替えるので、APIキーは不要
+    python -m benchmarks.load_test --compare sync gthread --concurrency 16 --duration 10
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+
+from app.weather_stub import start_stub_server
+
+JWT_SECRET = "load-test-secret-key-0000000000000000"
+PROPOSE_BODY = {"message": "明日の京都で着る服を提案して", "slots": {}, "history": []}
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class _ChatCompletionStub(BaseHTTPRequestHandler):
+    """OpenAI の /v1/chat/completions を真似て、latency 秒待ってから固定の応答を返す。"""
+
+    latency = 0.5
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.latency)
+        content = json.dumps({"text": "白いシャツにベージュのパンツはいかがでしょう。", "type": "suggestion", "updated_slots": {}}, ensure_ascii=False)
+        payload = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 50, "total_tokens": 550},
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _start_llm_stub(latency: float) -> str:
+    handler = type("Handler", (_ChatCompletionStub,), {"latency": latency})
+    # 既定の listen バックログ（5）だと同時接続が多いときにSYNが再送され、スタブ側が詰まって見える
+    server_class = type("Server", (ThreadingHTTPServer,), {"request_queue_size": 128})
+    server = server_class(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def _access_token(user_id: str = "1", secret: str = JWT_SECRET) -> str:
+    app = Flask(__name__)
+    app.config["JWT_SECRET_KEY"] = secret
+    JWTManager(app)
+    with app.app_context():
+        return create_access_token(identity=user_id)
+
+
+def run_load(url: str, token: str | None, concurrency: int, duration: float, body: dict | None = None) -> dict:
+    """concurrency 本のスレッドで duration 秒間リクエストを送り続け、結果を集計する。"""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+    # keep-alive だと接続が特定のワーカーに偏るので、別々のユーザーを想定して毎回接続し直す
+    headers = {"Connection": "close", **({"Authorization": f"Bearer {token}"} if token else {})}
+
+    def _worker():
+        nonlocal errors
+        session = requests.Session()
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = session.post(url, json=body, headers=headers, timeout=60) if body is not None else session.get(url, headers=headers, timeout=60)
+                ok = 200 <= response.status_code < 300
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors += 1
+
+    threads = [threading.Thread(target=_worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    percentile = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] if latencies else float("nan")
+    return {
+        "requests": len(latencies), "errors": errors, "rps": len(latencies) / wall,
+        "p50": percentile(0.50), "p95": percentile(0.95), "p99": percentile(0.99),
+        "mean": statistics.fmean(latencies) if latencies else float("nan"),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(url: str, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not start: {url}")
+
+
+def _prepare_database(db_path: str, user_id: int = 1):
+    """/api/propose は会話（conversations）とユーザーの行を使うので、テーブルを作ってユーザーを1人入れておく。"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+
+    from app.models import Base, User
+
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(User(id=user_id, username=f"load-test-{user_id}", password_hash="x"))
+        session.commit()
+    engine.dispose()
+
+
+def compare(worker_classes: list, args):
+    llm_url = _start_llm_stub(args.llm_latency)
+    _, weather_url = start_stub_server()
+    db_path = os.path.join(tempfile.mkdtemp(), "load_test.sqlite3")
+    _prepare_database(db_path)
+    token = _access_token()
+    failed = []
+
+    for worker_class in worker_classes:
+        port = _free_port()
+        env = {
+            **os.environ,
+            "GUNICORN_WORKER_CLASS": worker_class, "GUNICORN_WORKERS": str(args.workers),
+            "PRELOAD_SERVICES": "false", "DATABASE_URL": f"sqlite:///{db_path}", "JWT_SECRET_KEY": JWT_SECRET,
+            "OPENAI_API_KEY": "dummy", "OPENAI_BASE_URL": llm_url,
+            "WEATHER_API_KEY": "dummy", "WEATHER_API_BASE_URL": weather_url,
+            # 全リクエストが同じ本文なので、応答キャッシュが効くとLLMの待ち時間を測れない
+            "LLM_CACHE_ENABLED": "false",
+        }
+        if args.threads:
+            env["GUNICORN_THREADS"] = str(args.threads)
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app.app:app"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        try:
+            _wait_until_up(f"http://127.0.0.1:{port}/api/metrics")
+            result = run_load(f"http://127.0.0.1:{port}/api/propose", token, args.concurrency, args.duration, PROPOSE_BODY)
+            _print(f"{worker_class} x{args.workers}", result)
+            if result["errors"] or not result["requests"]:
+                failed.append(worker_class)
+        finally:
+            server.terminate()
+            server.wait()
+    # 失敗したリクエストが混ざった結果は比較に使えないので、エラーとして終了する
+    if failed:
+        sys.exit(f"FAILED: non-2xx responses or no successful requests for {', '.join(failed)}; the numbers above are not valid")
+
+
+def _print(name: str, result: dict):
+    print(f"{name:>12}: {result['rps']:7.1f} req/s  ok={result['requests']:<6} errors={result['errors']:<4} "
+          f"p50={result['p50'] * 1000:7.1f}ms  p95={result['p95'] * 1000:7.1f}ms  p99={result['p99'] * 1000:7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="負荷をかけるURL（--compare を使わない場合）")
+    parser.add_argument("--token", help="Authorization に付けるJWT")
+    parser.add_argument("--propose", action="store_true", help="--url に /api/propose 用の本文をPOSTする")
+    parser.add_argument("--compare", nargs="+", metavar="WORKER_CLASS", help="gunicorn をワーカークラスごとに起動して比較する")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2, help="--compare で起動するワーカー数")
+    parser.add_argument("--threads", type=int, default=None, help="--compare で gthread に使うスレッド数")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="スタブのLLMの応答時間（秒）")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare, args)
+    elif args.url:
+        result = run_load(args.url, args.token, args.concurrency, args.duration, PROPOSE_BODY if args.propose else None)
+        _print("result", result)
+        if result["errors"] or not result["requests"]:
+            sys.exit("FAILED: non-2xx responses or no successful requests; the numbers above are not valid")
+    else:
+        parser.error("--url か --compare を指定してください")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,23 @@
 # Gunicorn config file
+import gc
+import os
 
 # Worker processes
-workers = 4
-worker_class = 'sync'
+# OpenAI や天気APIの応答待ちでワーカーが塞がらないよう、既定ではスレッド型（gthread）で動かす。
+#   gthread: 1ワーカーあたり GUNICORN_THREADS 本のスレッドでリクエストを同時に処理する
+#   gevent : 協調的マルチタスク（gevent が必要）。GUNICORN_WORKER_CONNECTIONS が同時接続数
+#   sync   : 従来どおり1ワーカー1リクエスト
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+threads = int(os.getenv("GUNICORN_THREADS", "8" if worker_class == "gthread" else "1"))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "100"))
+# LLMの応答は数十秒かかることがあるので、sync ワーカーの既定（30秒）より長くする
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+if worker_class == "gevent":
+    # アプリ（requests・ssl・SQLAlchemy）を読み込む前にパッチを当てる必要がある
+    from gevent import monkey
+    monkey.patch_all()
 
 # Logging
 accesslog = '-'
@@ -16,3 +31,34 @@ bind = '0.0.0.0:5000'
 # その他
 # デーモン化はしない（Dockerがプロセスを管理するため）
 daemon = False
+
+# CLIPモデル等をマスタープロセスで一度だけロードし、ワーカーとはコピーオンライトで共有する
+preload_services = os.getenv("PRELOAD_SERVICES", "true").lower() == "true"
+preload_app = preload_services
+
+
+def on_starting(server):
+    if not preload_services:
+        return
+    from app.services import services
+    services.preload()
+    server.log.info(f"Preloaded services: {services.load_times()}")
+    # 以降に確保されるオブジェクトとの混在を避け、fork後のページ書き換えを減らす
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # Pinecone / OpenAI のようなネットワーククライアントは fork 後にワーカー内で作り直す
+    from app.services import services
+    services.reset_after_fork()
+
+    # マスタープロセスで開いた接続を子プロセスで使わないよう、プールを作り直してから接続を温めておく。
+    # close=False なので、親プロセスが持っている接続を子プロセスから閉じてしまうことはない
+    from app.database import engine, warm_up_pool
+    engine.dispose(close=False)
+    try:
+        opened = warm_up_pool()
+        server.log.info(f"Worker {worker.pid}: warmed up {opened} DB connection(s)")
+    except Exception as e:
+        # DBがまだ起動していなくてもワーカーは立ち上げる（最初のリクエストで接続する）
+        server.log.warning(f"Worker {worker.pid}: DB warm-up failed: {e}")
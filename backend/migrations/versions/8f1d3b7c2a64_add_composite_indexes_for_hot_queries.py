@@ -0,0 +1,31 @@
+"""Add composite indexes for wardrobe and history queries
+
+Revision ID: 8f1d3b7c2a64
+Revises: 5c2e9a41f7b3
+Create Date: 2026-10-17 13:40:18.271904
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '8f1d3b7c2a64'
+down_revision = '5c2e9a41f7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_clothes_user_id_category', 'clothes', ['user_id', 'category'], unique=False)
+    op.create_index('ix_clothes_user_id_available', 'clothes', ['user_id', 'available'], unique=False)
+    op.create_index('ix_outfit_suggestions_user_id_date_id', 'outfit_suggestions', ['user_id', 'suggested_date', 'id'], unique=False)
+
+
+def downgrade():
+    # MySQLは外部キー用に自動で作った user_id のインデックスを、先頭が user_id の複合インデックスで置き換えてしまう。
+    # 複合インデックスを消す前に user_id 単独のインデックスを作っておかないと外部キー制約のためにDROPできない
+    op.create_index('ix_outfit_suggestions_user_id', 'outfit_suggestions', ['user_id'], unique=False)
+    op.drop_index('ix_outfit_suggestions_user_id_date_id', table_name='outfit_suggestions')
+    op.create_index('ix_clothes_user_id', 'clothes', ['user_id'], unique=False)
+    op.drop_index('ix_clothes_user_id_available', table_name='clothes')
+    op.drop_index('ix_clothes_user_id_category', table_name='clothes')
@@ -61,13 +61,17 @@ const api = {
       body: JSON.stringify({ username, password }),
     }).then(res => res.json()),
 
-  getClothes: async (userId: number) => {
-    const response = await fetchWithAuth(`/api/clothes/${userId}`);
+  // 服の一覧は1ページ分（limit 件）返る。続きは戻り値の nextCursor を cursor に渡して取得する（最後のページでは null）
+  getClothes: async (userId: number, params: { cursor?: string | null; limit?: number; [key: string]: string | number | null | undefined } = {}) => {
+    const query = new URLSearchParams(
+      Object.entries({ limit: 50, ...params }).filter(([, v]) => v != null).map(([k, v]) => [k, String(v)])
+    );
+    const response = await fetchWithAuth(`/api/clothes/${userId}?${query}`);
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({ message: 'サーバーエラー' }));
       throw new Error(errorData.message);
     }
-    return response.json();
+    return { clothes: await response.json(), nextCursor: response.headers.get('X-Next-Cursor') };
   },
 
   addCloth: async (clothData: { [key: string]: any }, imageFile: File | null) => {
@@ -91,8 +95,12 @@ const api = {
     return response.json();
   },
 
-  getPastSuggestions: async () => {
-    const response = await fetchWithAuth('/api/suggestions');
+  // 履歴は新しい順に1ページ分（最大50件）返る。続きは X-Next-Cursor の値を cursor に渡して取得する
+  getPastSuggestions: async (params: { from?: string; to?: string; cursor?: string; limit?: number } = {}) => {
+    const query = new URLSearchParams(
+      Object.entries(params).filter(([, v]) => v != null).map(([k, v]) => [k, String(v)])
+    );
+    const response = await fetchWithAuth(`/api/suggestions${query.toString() ? `?${query}` : ''}`);
     if (!response.ok) {
       const errorData = await response.json().catch(() => ({ message: 'サーバーエラー' }));
       throw new Error(errorData.message);
@@ -166,6 +174,40 @@ const api = {
     return response.json();
   },
 
+  // /api/propose のストリーミング版。本文（text）は届いた分だけ onText に渡し、最後に応答全体を返す。
+  // 履歴とスロットはサーバー側の会話（conversationId）に保存されているので、2回目以降は送らない
+  proposeOutfitStream: async (conversationId: string | null, slots: DialogueSlots, message: string, onText: (text: string) => void) => {
+    const response = await fetchWithAuth('/api/propose/stream', {
+      method: 'POST',
+      body: JSON.stringify(conversationId ? { conversation_id: conversationId, message } : { slots, message }),
+    });
+    if (!response.ok || !response.body) {
+      const errorData = await response.json().catch(() => ({ message: 'サーバーエラー' }));
+      throw new Error(errorData.message);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // イベントは空行で区切られる
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+        const block = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+        const event = block.match(/^event: (.*)$/m)?.[1];
+        const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] ?? '{}');
+        if (event === 'text') onText(data.text);
+        else if (event === 'result') return data;
+        else if (event === 'error') throw new Error(data.message);
+      }
+    }
+    throw new Error('応答が途中で終了しました。');
+  },
+
   fetchOutfitImages: async (payload: SuggestionItems) => {
     const response = await fetchWithAuth('/api/search/outfit', {
       method: 'POST',
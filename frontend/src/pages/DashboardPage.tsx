@@ -12,6 +12,7 @@ interface Cloth {
   preferred: boolean;
   available: boolean;
   image_url?: string; // 画像URLはオプショナル
+  thumbnail_url?: string | null; // 一覧表示用の縮小WebP（生成前は存在しないことがある）
 }
 
 // ★★★ MinIOのベースURLをコンポーネント内で定義 ★★★
@@ -23,6 +24,7 @@ const DashboardPage: React.FC = () => {
 
   // stateの定義
   const [clothes, setClothes] = useState<Cloth[]>([]);
+  const [clothesCursor, setClothesCursor] = useState<string | null>(null); // 服の一覧の次のページ（無ければ null）
   const [message, setMessage] = useState('');
 
   // 服登録フォーム用のstate
@@ -48,7 +50,8 @@ const DashboardPage: React.FC = () => {
       const fetchInitialData = async () => {
         try {
           const clothesResult = await api.getClothes(user.id);
-          if (Array.isArray(clothesResult)) setClothes(clothesResult);
+          if (Array.isArray(clothesResult.clothes)) setClothes(clothesResult.clothes);
+          setClothesCursor(clothesResult.nextCursor);
 
           const pastResult = await api.getPastSuggestions();
           if (Array.isArray(pastResult)) setOutfitSuggestions(pastResult);
@@ -88,7 +91,8 @@ const DashboardPage: React.FC = () => {
         setNewClothColor('');
         setSelectedImageFile(null);
         const updatedClothes = await api.getClothes(user.id);
-        if (Array.isArray(updatedClothes)) setClothes(updatedClothes);
+        if (Array.isArray(updatedClothes.clothes)) setClothes(updatedClothes.clothes);
+        setClothesCursor(updatedClothes.nextCursor);
       }
     } catch (error: any) {
       console.error("Failed to add cloth:", error);
@@ -96,6 +100,19 @@ const DashboardPage: React.FC = () => {
     }
   };
 
+  // 服の一覧の次のページを読み込んで後ろに追加する
+  const handleLoadMoreClothes = async () => {
+    if (!user || !clothesCursor) return;
+    try {
+      const result = await api.getClothes(user.id, { cursor: clothesCursor });
+      if (Array.isArray(result.clothes)) setClothes(prevClothes => [...prevClothes, ...result.clothes]);
+      setClothesCursor(result.nextCursor);
+    } catch (error) {
+      console.error("Failed to load more clothes:", error);
+      setMessage("服の読み込みに失敗しました。");
+    }
+  };
+
   // コーデ提案処理
   const handleSuggestOutfits = async (e: React.FormEvent) => {
     e.preventDefault();
@@ -239,9 +256,15 @@ const DashboardPage: React.FC = () => {
                   {/* ★ここを修正: ulのロジックをtableに適用 */}
                   {cloth.image_url && (
                     <img 
-                      src={`${MINIO_BASE_URL}${cloth.image_url}`} 
+                      src={`${MINIO_BASE_URL}${cloth.thumbnail_url ?? cloth.image_url}`} 
                       alt={cloth.name} 
+                      loading="lazy"
                       style={{height: '200px'}} 
+                      onError={(e) => {
+                        // サムネイルがまだ生成されていなければ元画像を表示する
+                        const original = `${MINIO_BASE_URL}${cloth.image_url}`;
+                        if (e.currentTarget.src !== original) e.currentTarget.src = original;
+                      }}
                     />
                   )}
                 </td>
@@ -253,6 +276,7 @@ const DashboardPage: React.FC = () => {
           </tbody>
         </table>
       )}
+      {clothesCursor && <button onClick={handleLoadMoreClothes}>もっと見る</button>}
 
       
       <h3>コーデ提案</h3>
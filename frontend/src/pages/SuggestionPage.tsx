@@ -17,6 +17,7 @@ interface AiResponse {
   next_question: string; // 質問を格納する専用フィールド
   suggestion_items?: SuggestionItems;
   updated_slots: DialogueSlots;
+  conversation_id: string;
 }
 
 const SuggestionPage: React.FC = () => {
@@ -24,6 +25,7 @@ const SuggestionPage: React.FC = () => {
   const navigate = useNavigate();
   const [history, setHistory] = useState<HistoryMessage[]>([]);
   const [slots, setSlots] = useState<DialogueSlots>({});
+  const [conversationId, setConversationId] = useState<string | null>(null);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(true);
   const [currentSuggestion, setCurrentSuggestion] = useState<SuggestionItems | null>(null);
@@ -48,13 +50,20 @@ const SuggestionPage: React.FC = () => {
     setHistory(newHistory);
 
     try {
-      const res: AiResponse = await api.proposeOutfit(slots, newHistory, userMessage);
+      // 返答の本文は生成された分から表示していく（最後に応答全体で置き換える）
+      let streamed = '';
+      setHistory(prev => [...prev, { role: 'assistant' as const, content: '' }]);
+      const res: AiResponse = await api.proposeOutfitStream(conversationId, slots, userMessage, (text) => {
+        streamed += text;
+        setHistory(prev => [...prev.slice(0, -1), { role: 'assistant' as const, content: streamed }]);
+      });
       
       // AIの返答(提案＋質問)を組み立てて履歴に追加
       const aiMessageContent = `${res.text}\n\n**次の質問:**\n${res.next_question}`;
-      setHistory(prev => [...prev, { role: 'assistant' as const, content: aiMessageContent }]);
+      setHistory(prev => [...prev.slice(0, -1), { role: 'assistant' as const, content: aiMessageContent }]);
       
       // 対話状態と提案アイテムを更新
+      setConversationId(res.conversation_id);
       setSlots(res.updated_slots);
       if (res.suggestion_items) {
         setCurrentSuggestion(res.suggestion_items);
@@ -66,7 +75,8 @@ const SuggestionPage: React.FC = () => {
       }
     } catch (error: any) {
       const errorMessage = error.message || 'エラーが発生しました。もう一度お試しください。';
-      setHistory(prev => [...prev, { role: 'assistant' as const, content: errorMessage }]);
+      // 途中まで表示した返答はエラーメッセージで置き換える
+      setHistory(prev => [...prev.slice(0, -1), { role: 'assistant' as const, content: errorMessage }]);
     } finally {
       setIsLoading(false);
     }